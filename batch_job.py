@@ -0,0 +1,15 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import List
+
+@dataclass
+class BatchJob:
+    """Handle for requests submitted to an offline (provider-side) batch endpoint.
+
+    batch_ids: provider batch ids, one per uploaded input file.
+    offsets: index of the first request of each batch in the original input.
+    size: total number of requests across all batches.
+    """
+    batch_ids: List[str] = field(default_factory=list)
+    offsets: List[int] = field(default_factory=list)
+    size: int = 0
@@ -2,19 +2,55 @@
 Public API surface for batchcal.
 """
 from batchclient import BatchClient, run_batch, run_one, require_json
+from streaming import ResponseStream, require_json_prefix
+from sync_client import SyncBatchClient
 from openai_provider import OpenAIProvider
 from msg import Msg, Role
 from llm_request import LLMRequest
 from llm_response import LLMResponse
 from usage import Usage
-from provider import Provider
-from token_bucket import RateLimiter, TokenBucketLimiter
+from provider import BatchJobProvider, Provider, StreamingProvider
+from provider_pool import PoolMember, ProviderPool
+from batch_job import BatchJob
+from token_bucket import RateLimiter, TokenBucketLimiter, WeightedRateLimiter
+from tpm_limiter import TPMLimiter
+from shared_limiter import SharedTokenBucketLimiter
+from sharded import run_batch_sharded
+from concurrency import AdaptiveConcurrency
+from scheduler import PriorityScheduler
+from rate_limit_info import RateLimitInfo
+from errors import (
+    LLMError,
+    RateLimitError,
+    RequestTimeoutError,
+    ServerError,
+    ClientError,
+    ResponseFormatError,
+    ValidationError,
+    CircuitOpenError,
+    StreamAbortedError,
+    DeadlineExceededError,
+)
+from retry import RetryPolicy, RetryBudget, CircuitBreaker
+from hedging import HedgePolicy
+from packing import Packer
+from validation import SchemaValidator, ValidationRunner
+from timing import RequestTiming
+from observers import MetricsObserver, Observer, SpanObserver
+from journal import Journal
+from cache import CachingProvider, ResponseCache, default_cacheable
 
 __all__ = [
     "BatchClient",
+    "SyncBatchClient",
     "run_batch",
     "run_one",
+    "run_batch_sharded",
     "require_json",
+    "require_json_prefix",
+    "SchemaValidator",
+    "ValidationRunner",
+    "ResponseStream",
     "OpenAIProvider",
     "Msg",
     "Role",
@@ -22,6 +58,40 @@ __all__ = [
     "LLMResponse",
     "Usage",
     "Provider",
+    "BatchJobProvider",
+    "StreamingProvider",
+    "ProviderPool",
+    "PoolMember",
+    "BatchJob",
     "RateLimiter",
     "TokenBucketLimiter",
+    "WeightedRateLimiter",
+    "TPMLimiter",
+    "SharedTokenBucketLimiter",
+    "AdaptiveConcurrency",
+    "PriorityScheduler",
+    "RateLimitInfo",
+    "LLMError",
+    "RateLimitError",
+    "RequestTimeoutError",
+    "ServerError",
+    "ClientError",
+    "ResponseFormatError",
+    "ValidationError",
+    "CircuitOpenError",
+    "StreamAbortedError",
+    "DeadlineExceededError",
+    "RetryPolicy",
+    "RetryBudget",
+    "CircuitBreaker",
+    "HedgePolicy",
+    "Packer",
+    "RequestTiming",
+    "Observer",
+    "MetricsObserver",
+    "SpanObserver",
+    "Journal",
+    "ResponseCache",
+    "CachingProvider",
+    "default_cacheable",
 ]
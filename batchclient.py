@@ -1,15 +1,31 @@
 from __future__ import annotations
 
 import asyncio
+import itertools
 import json
-from typing import Callable, Dict, List, Optional, Sequence
+import time
+from dataclasses import replace
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
-from provider import Provider
+from provider import BatchJobProvider, Provider, StreamingProvider
+from batch_job import BatchJob
 from llm_request import LLMRequest
 from llm_response import LLMResponse
 from msg import Msg
-from backoff import _compute_backoff
-from token_bucket import RateLimiter, TokenBucketLimiter
+from errors import CircuitOpenError, ClientError, DeadlineExceededError, LLMError, RateLimitError, StreamAbortedError, ValidationError
+from retry import CircuitBreaker, RetryBudget, RetryPolicy
+from token_bucket import RateLimiter, TokenBucketLimiter, WeightedRateLimiter
+from tpm_limiter import TPMLimiter
+from concurrency import AdaptiveConcurrency
+from scheduler import PriorityScheduler
+from journal import Journal
+from cache import ResponseCache, default_cacheable
+from hedging import HedgePolicy
+from observers import Observer
+from timing import RequestTiming
+from streaming import StreamValidator
+from packing import Packer
+from validation import ExecutorMode, ValidationRunner, Validator
 
 
 class BatchClient:
@@ -19,201 +35,515 @@ class BatchClient:
         *,
         max_concurrency: int = 8,
         qps: Optional[float] = None,
+        burst: Optional[float] = None,
+        tpm: Optional[float] = None,
         limiter: RateLimiter | None = None,
         max_retries: int = 3,
         timeout: float = 60.0,
-        validate: Optional[Callable[[LLMResponse], None]] = None,
+        validate: Optional[Validator] = None,
+        journal: Journal | str | None = None,
+        cache: ResponseCache | None = None,
+        cacheable: Callable[[LLMRequest], bool] = default_cacheable,
+        coalesce: bool = True,
+        adaptive: bool | AdaptiveConcurrency = False,
+        retry: RetryPolicy | None = None,
+        retry_budget: RetryBudget | None = None,
+        breaker: CircuitBreaker | None = None,
+        hedge: HedgePolicy | None = None,
+        observers: Sequence[Observer] = (),
+        stream: bool = False,
+        validate_stream: Optional[StreamValidator] = None,
+        validate_stream_every: int = 256,
+        pack: Packer | None = None,
+        validate_executor: ExecutorMode = None,
+        validate_max_pending: Optional[int] = None,
+        drop_expired: bool = True,
     ):
         self.provider = provider
-        self.sema = asyncio.Semaphore(max(1, int(max_concurrency)))
-        # Prefer explicit limiter if supplied; else build from qps; else None
-        self.rate_limiter: RateLimiter | None = limiter or (TokenBucketLimiter(qps) if qps else None)
-        self.max_retries = max_retries
+        self.max_concurrency = max(1, int(max_concurrency))
+        # adaptive=True starts at max_concurrency and lets 429s/latency/quota headers move the limit
+        if adaptive is True:
+            adaptive = AdaptiveConcurrency(self.max_concurrency)
+        self.adaptive: AdaptiveConcurrency | None = adaptive or None
+        # Slots go to higher priority first, then fair-share across batches; expired requests are dropped
+        self.sema = PriorityScheduler(self.adaptive or self.max_concurrency, drop_expired=drop_expired)
+        self._flow_ids = itertools.count()
+        # Prefer explicit limiter if supplied; else build from qps (and tpm); else None
+        if limiter is None and tpm:
+            limiter = TPMLimiter(rpm=qps * 60.0 if qps else None, tpm=tpm)
+        self.rate_limiter: RateLimiter | None = limiter or (TokenBucketLimiter(qps, burst) if qps else None)
+        self._weighted = isinstance(self.rate_limiter, WeightedRateLimiter)
+        self.retry = retry or RetryPolicy(max_retries)
+        self.max_retries = self.retry.max_retries
+        # Shared across every request of this client: bounds total retries during an outage
+        self.retry_budget = retry_budget
+        self.breaker = breaker
+        # Opt-in tail-latency hedging (duplicates are charged to the rate limiter and a hedge budget)
+        self.hedge = hedge
         self.timeout = timeout
         self.validate = validate
+        # async validators are awaited; sync ones may be offloaded to a thread/process pool
+        self._validator = ValidationRunner(validate, validate_executor, max_pending=validate_max_pending) if validate else None
+        # Streaming: record time-to-first-token and let validate_stream cut bad answers short
+        self.stream = stream or validate_stream is not None
+        self.validate_stream = validate_stream
+        # past the first few characters, check every N characters rather than every delta
+        self.validate_stream_every = max(1, int(validate_stream_every))
+        if self.stream and not isinstance(provider, StreamingProvider):
+            raise TypeError(f"provider {provider.name!r} does not support streaming")
+        # Let the provider keep one pooled connection alive per possible in-flight call,
+        # plus one per possible hedge so a hedge never queues behind a stalled primary
+        conns = self.adaptive.max_limit if self.adaptive else self.max_concurrency
+        hedge_provider = hedge.provider if hedge is not None and hedge.provider is not None else None
+        if hedge is not None and hedge_provider is None:
+            conns *= 2
+        for p in (provider, hedge_provider):
+            size_pool = getattr(p, "size_pool", None)
+            if size_pool is not None:
+                size_pool(conns)
+        # Checkpoint journal: finished responses survive crashes and are skipped on rerun
+        self.journal: Journal | None = Journal(journal) if isinstance(journal, str) else journal
+        # Response cache: hits skip the semaphore and the rate limiter entirely
+        self.cache = cache
+        self.cacheable = cacheable
+        # Single-flight: identical requests already in flight share one provider call
+        self.coalesce = coalesce
+        self.coalesced = 0
+        self._inflight: Dict[str, _Flight] = {}
+        # Micro-batching: small compatible prompts share one provider call
+        self.pack = pack
+        self._packs: Dict[Tuple, _Pack] = {}
+        self._pack_tasks: set = set()
+        # Metrics/tracing hooks; with none attached only the timing breakdown is recorded
+        self.observers: List[Observer] = list(observers)
 
     async def _one(self, req: LLMRequest) -> LLMResponse:
+        coalesce = self.coalesce and req.coalesce
+        if not coalesce:
+            # independent calls (e.g. samples): no sharing, and no cache or journal answers
+            return await self._dispatch(req)
+        cache = self.cache if self.cache is not None and self.cacheable(req) else None
+        key = req.cache_key()
+        hit = cache.get(key) if cache is not None else None
+        if hit is None and self.journal is not None:
+            hit = self.journal.get(key)
+        if hit is not None:
+            return hit
+        # only requests that wait in the same place and may wait as long share a call
+        flight_key = key if req.priority == 0 and req.deadline is None else f"{key}|{req.priority}|{req.deadline}"
+        return await self._shared(flight_key, key, req, cache)
+
+    async def _fetch(self, key: str, req: LLMRequest, cache: ResponseCache | None) -> LLMResponse:
+        resp = await self._dispatch(req)
+        if not resp.error:
+            if cache is not None:
+                cache.put(key, resp)
+            if self.journal is not None:
+                self.journal.record(key, resp)
+        return resp
+
+    async def _shared(self, key: str, cache_key: str, req: LLMRequest, cache: ResponseCache | None) -> LLMResponse:
+        flight = self._inflight.get(key)
+        leader = flight is None
+        if flight is None:
+            flight = self._inflight[key] = _Flight(asyncio.ensure_future(self._fetch(cache_key, req, cache)))
+            flight.task.add_done_callback(lambda _: self._land(key, flight))
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            resp = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            # the last interested caller went away: stop the shared call
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                self._land(key, flight)
+        # followers get their own copy so per-caller mutation (e.g. validation) cannot leak
+        return resp if leader else replace(resp)
+
+    def _land(self, key: str, flight: "_Flight") -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    async def _dispatch(self, req: LLMRequest) -> LLMResponse:
+        pack = self.pack
+        group_key = pack.key(req) if pack is not None else None
+        if group_key is None:
+            return await self._call(req)
+        loop = asyncio.get_running_loop()
+        group = self._packs.get(group_key)
+        size = pack.estimate(req)
+        if group is not None and group.tokens + size > pack.max_prompt_tokens:
+            self._flush_pack(group_key)
+            group = None
+        if group is None:
+            group = self._packs[group_key] = _Pack()
+            group.timer = loop.call_later(pack.linger, self._flush_pack, group_key)
+        fut = loop.create_future()
+        group.items.append((req, fut))
+        group.tokens += size
+        if len(group.items) >= pack.max_items:
+            self._flush_pack(group_key)
+        return await fut
+
+    def _flush_pack(self, group_key: Tuple) -> None:
+        group = self._packs.pop(group_key, None)
+        if group is None:
+            return
+        group.timer.cancel()
+        items = [(req, fut) for req, fut in group.items if not fut.cancelled()]
+        if items:
+            task = asyncio.ensure_future(self._send_pack(items))
+            self._pack_tasks.add(task)
+            task.add_done_callback(self._pack_tasks.discard)
+            futs = [fut for _, fut in items]
+
+            def abandon(_: asyncio.Future) -> None:
+                # nobody is waiting any more: stop calling the provider for them
+                if not task.done() and all(f.done() for f in futs):
+                    task.cancel()
+
+            for fut in futs:
+                fut.add_done_callback(abandon)
+
+    async def _send_pack(self, items: List[Tuple[LLMRequest, asyncio.Future]]) -> None:
+        pack = self.pack
+        assert pack is not None
+        try:
+            reqs = [req for req, _ in items]
+            if len(reqs) == 1:
+                parts: List[Optional[LLMResponse]] = [None]
+            else:
+                resp = await self._call(pack.build(reqs), validate=False)
+                pack.calls += 1
+                if isinstance(resp.exception, ClientError):
+                    # rejected as a pack (e.g. too long for the context): try the items one by one
+                    parts = [None] * len(reqs)
+                elif resp.error:
+                    # the pack as a whole failed after retries: every item shares the outcome
+                    parts = [replace(resp) for _ in reqs]
+                else:
+                    unpacked = pack.unpack(resp, reqs)
+                    checked = await asyncio.gather(*(self._validated(p) for p in unpacked if p is not None))
+                    it = iter(checked)
+                    parts = [None if p is None else next(it) for p in unpacked]
+                    for p in parts:
+                        if p is not None:
+                            p.timing = replace(resp.timing) if resp.timing is not None else None
+            redo = []
+            for (req, fut), part in zip(items, parts):
+                if fut.done():  # cancelled by its caller
+                    continue
+                if part is None or (part.error and isinstance(part.exception, ValidationError)):
+                    redo.append((req, fut))
+                else:
+                    pack.items += 1
+                    fut.set_result(part)
+            if len(reqs) > 1:
+                pack.redispatched += len(redo)
+            # unusable answers are re-sent on their own
+            results = await asyncio.gather(*(self._call(req) for req, _ in redo), return_exceptions=True)
+            for (_, fut), result in zip(redo, results):
+                if fut.done():
+                    continue
+                if isinstance(result, BaseException):
+                    fut.set_exception(result)
+                else:
+                    fut.set_result(result)
+        except BaseException as e:
+            for _, fut in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            raise
+
+    async def _call(self, req: LLMRequest, validate: bool = True) -> LLMResponse:
+        timing = RequestTiming()
+        observers = self.observers
+        for o in observers:
+            o.on_start(req)
+        start = time.perf_counter()
+        try:
+            resp = await self._retrying(req, timing, validate)
+        except asyncio.CancelledError:
+            if observers:
+                self._notify_end(req, self._failed(req, LLMError("cancelled")), timing, start)
+            raise
+        return self._notify_end(req, resp, timing, start)
+
+    def _notify_end(self, req: LLMRequest, resp: LLMResponse, timing: RequestTiming, start: float) -> LLMResponse:
+        timing.total = time.perf_counter() - start
+        resp.timing = timing
+        for o in self.observers:
+            o.on_end(req, resp)
+        return resp
+
+    async def _retrying(self, req: LLMRequest, timing: RequestTiming, validate: bool = True) -> LLMResponse:
         attempt = 1
+        if self.retry_budget is not None:
+            self.retry_budget.record_request()
         while True:
+            timing.attempts = attempt
             try:
-                async with self.sema:
-                    if self.rate_limiter:
-                        await self.rate_limiter.acquire()
-                    resp = await self.provider.acomplete(req, timeout=self.timeout)
-                if self.validate:
-                    try:
-                        self.validate(resp)
-                    except Exception as e:
-                        resp.error = f"validation_error: {e}"
-                if not resp.error:
-                    return resp
-                # if provider returned an error, decide whether to retry
-                if attempt > self.max_retries:
-                    return resp
+                resp = await self._attempt(req, timing, validate)
+            except CircuitOpenError as e:
+                resp = self._failed(req, e)
+                self._notify_attempt(req, attempt, resp)
+                return resp
             except Exception as e:
-                if attempt > self.max_retries:
-                    return LLMResponse(provider=self.provider.name, model=req.model, content="", raw={"error": str(e)}, error=str(e))
-            # backoff
-            await asyncio.sleep(_compute_backoff(attempt))
+                resp = self._failed(req, e)
+            self._notify_attempt(req, attempt, resp)
+            if not resp.error:
+                return resp
+            # if provider returned an error, decide whether to retry
+            exc = resp.exception
+            if not self.retry.should_retry(exc, attempt):
+                return resp
+            if self.retry_budget is not None and not self.retry_budget.try_spend():
+                return resp
+            delay = self.retry.delay(exc, attempt)
+            if req.deadline is not None and time.time() + delay >= req.deadline:
+                return resp
+            timing.backoff += delay
+            await asyncio.sleep(delay)
             attempt += 1
 
-    async def abatch(
+    def _notify_attempt(self, req: LLMRequest, attempt: int, resp: LLMResponse) -> None:
+        for o in self.observers:
+            o.on_attempt(req, attempt, resp)
+
+    async def _attempt(self, req: LLMRequest, timing: RequestTiming, validate: bool = True) -> LLMResponse:
+        """One provider call: breaker, concurrency slot, rate limit, then validation."""
+        breaker = self.breaker
+        t0 = time.perf_counter()
+        if breaker is not None:
+            await breaker.acquire()
+        try:
+            async with self.sema.slot(req):
+                t1 = time.perf_counter()
+                timing.queue_wait += t1 - t0
+                if self.sema.expired_now(req):
+                    self.sema.expired += 1
+                    raise DeadlineExceededError("deadline passed before dispatch")
+                reserved = await self._acquire(req)
+                start = time.perf_counter()
+                timing.limiter_wait += start - t1
+                try:
+                    resp = await self._send(req)
+                except BaseException as e:
+                    timing.network += time.perf_counter() - start
+                    if self.adaptive and isinstance(e, Exception):
+                        self.adaptive.record(None, time.perf_counter() - start)
+                    self._settle(req, reserved, None)
+                    raise
+                took = time.perf_counter() - start
+                # providers that report their own split (OpenAIProvider) separate decoding from the wire
+                parse = 0.0
+                if resp.timing is not None:
+                    parse = resp.timing.parse
+                    if resp.timing.ttft is not None:
+                        timing.ttft = resp.timing.ttft
+                timing.network += took - parse
+                timing.parse += parse
+                if self.adaptive:
+                    self.adaptive.record(resp, took)
+        except DeadlineExceededError:
+            if breaker is not None:
+                breaker.abort()  # never reached the provider
+            raise
+        except Exception as e:
+            if breaker is not None:
+                breaker.record(e)
+            raise
+        except BaseException:
+            if breaker is not None:
+                breaker.abort()
+            raise
+        if breaker is not None:
+            breaker.record(resp.exception if resp.error else None)
+        self._settle(req, reserved, resp)
+        if validate and self._validator is not None:
+            return await self._validated(resp, timing)
+        return resp
+
+    async def _send(self, req: LLMRequest) -> LLMResponse:
+        hedge = self.hedge
+        if hedge is None:
+            return await self._complete(self.provider, req)
+        hedge.budget.record_request()
+        start = time.monotonic()
+        delay = hedge.delay()
+        primary = asyncio.ensure_future(self._complete(self.provider, req))
+        tasks = [primary]
+        winner: Optional[asyncio.Future] = None
+        hedge_reserved: Optional[float] = None
+        try:
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+            if primary.done() or delay is None or not hedge.budget.available():
+                resp = await primary
+                hedge.record(time.monotonic() - start)
+                return resp
+            # a hedge costs a rate-limit slot like any call, unless the primary lands first
+            acquiring = asyncio.ensure_future(self._acquire(req))
+            try:
+                await asyncio.wait([primary, acquiring], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if not acquiring.done():
+                    acquiring.cancel()
+            if acquiring.done() and not acquiring.cancelled():
+                hedge_reserved = acquiring.result()
+                # the budget is only spent on hedges that are actually sent
+                if primary.done() or not hedge.budget.try_spend():
+                    self._refund(hedge_reserved)  # granted, but the hedge is not needed
+                    hedge_reserved = None
+                else:
+                    hedge.hedges += 1
+                    tasks.append(asyncio.ensure_future(self._complete(hedge.provider or self.provider, req)))
+            pending = set(tasks)
+            resp: Optional[LLMResponse] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        if not pending and resp is None:
+                            raise task.exception()  # type: ignore[misc]
+                        continue
+                    resp, winner = task.result(), task
+                    if not resp.error:
+                        if task is not primary:
+                            hedge.wins += 1
+                        hedge.record(time.monotonic() - start)
+                        return resp
+            assert resp is not None
+            return resp
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            if len(tasks) > 1:
+                # _attempt settles its reservation against the returned response; the
+                # hedge's reservation pays for the other call
+                loser = tasks[1] if winner is primary else primary
+                done_ok = loser.done() and not loser.cancelled() and loser.exception() is None
+                self._settle(req, hedge_reserved, loser.result() if done_ok else None)
+
+    async def _complete(self, provider: Provider, req: LLMRequest) -> LLMResponse:
+        if not self.stream or not isinstance(provider, StreamingProvider):
+            return await provider.acomplete(req, timeout=self.timeout)
+        validator, every = self.validate_stream, self.validate_stream_every
+        received = checked = 0
+        resp: Optional[LLMResponse] = None
+        async with provider.astream(req, timeout=self.timeout) as stream:
+            async for delta in stream:
+                if validator is None:
+                    continue
+                received += len(delta)
+                # every delta while the answer is short (prefix checks fail fast), then
+                # every `every` characters, so long answers are not rescanned per token
+                if received > every and received - checked < every:
+                    continue
+                checked = received
+                resp = self._stream_check(validator, provider, req, stream.text)
+                if resp is not None:
+                    break  # leaving the block closes the connection and stops the generation
+            else:
+                if validator is not None and checked < received:
+                    resp = self._stream_check(validator, provider, req, stream.text)
+                if resp is None:
+                    resp = stream.response or self._failed(req, LLMError("stream ended without a response"))
+        resp.timing = RequestTiming(ttft=stream.ttft)
+        return resp
+
+    def _stream_check(self, validator: StreamValidator, provider: Provider, req: LLMRequest, text: str) -> Optional[LLMResponse]:
+        """None if `text` passes, else the failed response for the aborted stream."""
+        try:
+            validator(text)
+        except Exception as e:
+            err = StreamAbortedError(str(e))
+            return LLMResponse(provider=provider.name, model=req.model, content=text, raw={}, error=f"validation_error: {e}", exception=err)
+        return None
+
+    def _failed(self, req: LLMRequest, e: Exception) -> LLMResponse:
+        return LLMResponse(
+            provider=self.provider.name,
+            model=req.model,
+            content="",
+            raw={"error": str(e)},
+            error=str(e),
+            exception=e if isinstance(e, LLMError) else None,
+        )
+
+    async def _acquire(self, req: LLMRequest) -> Optional[float]:
+        """Take a rate-limit slot; returns the reserved weight for weighted limiters."""
+        if self.rate_limiter is None:
+            return None
+        if not self._weighted:
+            await self.rate_limiter.acquire()
+            return None
+        reserved = self.rate_limiter.estimate(req)  # type: ignore[attr-defined]
+        await self.rate_limiter.acquire(reserved)
+        return reserved
+
+    def _refund(self, reserved: Optional[float]) -> None:
+        """Give back a rate-limit slot that was taken but never used (if the limiter can)."""
+        limiter = self.rate_limiter
+        n = reserved if reserved is not None else 1.0
+        # refund() returns every dimension (e.g. TPMLimiter's request slot too); release() is optional
+        refund = getattr(limiter, "refund", None) or getattr(limiter, "release", None)
+        if refund is not None:
+            refund(n)
+
+    def _settle(self, req: LLMRequest, reserved: Optional[float], resp: Optional[LLMResponse]) -> None:
+        """
+        Refund (or charge) the difference between the estimate and real usage. Without
+        usage: a rejected call (429/4xx) spent nothing, a failed, raised or cancelled one
+        at most its prompt, a cut-short stream its prompt plus the text received so far.
+        """
+        if reserved is None:
+            return
+        limiter = self.rate_limiter
+        if getattr(limiter, "release", None) is None:
+            return  # a limiter that cannot take tokens back keeps the estimate
+        if resp is not None and resp.usage.total_tokens is not None:
+            limiter.release(reserved - resp.usage.total_tokens)  # type: ignore[union-attr]
+            return
+        if resp is not None and not resp.error:
+            return  # no usage reported: the estimate stands
+        exc = resp.exception if resp is not None else None
+        if isinstance(exc, (RateLimitError, ClientError)):
+            spent = 0.0
+        elif isinstance(exc, StreamAbortedError):
+            spent = limiter.estimate(replace(req, max_output_tokens=len(resp.content) // 4 + 1))  # type: ignore[union-attr]
+        else:
+            spent = limiter.estimate(replace(req, max_output_tokens=0))  # type: ignore[union-attr]
+        limiter.release(max(0.0, reserved - spent))  # type: ignore[union-attr]
+
+    def _requests(
         self,
         prompts: Sequence[Sequence[Msg]],
-        *,
         model: str,
-        temperature: float = 0.7,
-        max_output_tokens: Optional[int] = None,
-        extra: Optional[Dict[str, any]] = None,
-    ) -> List[LLMResponse]:
+        temperature: float,
+        max_output_tokens: Optional[int],
+        extra: Optional[Dict[str, any]],
+    ) -> List[LLMRequest]:
         extra = extra or {}
-        reqs = [
+        return [
             LLMRequest(messages=list(msgs), model=model, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra)
             for msgs in prompts
         ]
-        return await asyncio.gather(*(self._one(r) for r in reqs))
-
-    async def acomplete(self, messages: Sequence[Msg], *, model: str, **kw) -> LLMResponse:
-        req = LLMRequest(messages=list(messages), model=model, **kw)
-        return await self._one(req)
 
-
-def run_batch(
-    provider: Provider,
-    prompts: Sequence[Sequence[Msg]],
-    *,
-    model: str,
-    temperature: float = 0.7,
-    max_output_tokens: Optional[int] = None,
-    max_concurrency: int = 8,
-    qps: Optional[float] = None,
-    max_retries: int = 3,
-    timeout: float = 60.0,
-    extra: Optional[Dict[str, any]] = None,
-) -> List[LLMResponse]:
-    client = BatchClient(provider, max_concurrency=max_concurrency, qps=qps, max_retries=max_retries, timeout=timeout)
-    return asyncio.run(client.abatch(prompts, model=model, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra))
-
-
-def run_one(provider: Provider, messages: Sequence[Msg], *, model: str, **kw) -> LLMResponse:
-    client = BatchClient(provider)
-    return asyncio.run(client.acomplete(messages, model=model, **kw))
-
-
-def require_json(resp: LLMResponse) -> None:
-    """Raise if response.content is not valid JSON."""
-    try:
-        json.loads(resp.content)
-    except Exception as e:
-        raise ValueError("response is not valid JSON") from e
-
-
-if __name__ == "__main__":
-    from openai_provider import OpenAIProvider
-
-    async def _demo():
-        prov = OpenAIProvider()
-        client = BatchClient(prov, max_concurrency=5, qps=2.0)
-        prompts = [[Msg.user(f"Respond with the number {i} squared only.")] for i in range(5)]
-        res = await client.abatch(prompts, model="gpt-4.1-mini")
-        for r in res:
-            print(r.content)
-
-    asyncio.run(_demo())
-            content = "".join(text_parts).strip()
-
-            usage = Usage(
-                input_tokens=(data.get("usage", {}) or {}).get("input_tokens"),
-                output_tokens=(data.get("usage", {}) or {}).get("output_tokens"),
-                total_tokens=(data.get("usage", {}) or {}).get("total_tokens"),
-            )
-            return LLMResponse(provider=self.name, model=req.model, content=content, raw=data, usage=usage)
-        except httpx.HTTPStatusError as e:
-            return LLMResponse(provider=self.name, model=req.model, content="", raw={"error": str(e), "body": getattr(e.response, "text", None)}, error=str(e))
-        except Exception as e:
-            return LLMResponse(provider=self.name, model=req.model, content="", raw={"error": str(e)}, error=str(e))
-
-############################################################
-# Retry & rate limit helpers
-############################################################
-
-def _compute_backoff(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
-    """Exponential backoff with jitter."""
-    exp = min(cap, base * (2 ** (attempt - 1)))
-    jitter = random.uniform(0, exp / 2)
-    return exp + jitter
-
-
-class _TokenBucket:
-    """Very simple token bucket for QPS limiting (coarse)."""
-    def __init__(self, qps: float):
-        self.qps = max(0.1, qps)
-        self.capacity = 1.0
-        self.tokens = self.capacity
-        self.last = time.monotonic()
-
-    async def acquire(self):
-        while True:
-            now = time.monotonic()
-            elapsed = now - self.last
-            self.last = now
-            self.tokens = min(self.capacity, self.tokens + elapsed * self.qps)
-            if self.tokens >= 1.0:
-                self.tokens -= 1.0
-                return
-            # sleep until a token is likely available
-            need = (1.0 - self.tokens) / self.qps
-            await asyncio.sleep(max(need, 0.001))
-
-
-############################################################
-# Batch client
-############################################################
-
-class BatchClient:
-    def __init__(
-        self,
-        provider: Provider,
-        *,
-        max_concurrency: int = 8,
-        qps: Optional[float] = None,
-        limiter: RateLimiter | None = None,
-        max_retries: int = 3,
-        timeout: float = 60.0,
-        validate: Optional[Callable[[LLMResponse], None]] = None,
-    ):
-        self.provider = provider
-        self.sema = asyncio.Semaphore(max(1, int(max_concurrency)))
-        # Prefer explicit limiter if supplied; else build from qps; else None
-        self.rate_limiter: RateLimiter | None = limiter or (TokenBucketLimiter(qps) if qps else None)
-        self.max_retries = max_retries
-        self.timeout = timeout
-        self.validate = validate
-
-    async def _one(self, req: LLMRequest) -> LLMResponse:
-        attempt = 1
-        while True:
+    async def _validated(self, resp: LLMResponse, timing: Optional[RequestTiming] = None) -> LLMResponse:
+        if self._validator is not None and not resp.error:
+            start = time.perf_counter()
             try:
-                async with self.sema:
-                    if self.rate_limiter:
-                        await self.rate_limiter.acquire()
-                    resp = await self.provider.acomplete(req, timeout=self.timeout)
-                if self.validate:
-                    try:
-                        self.validate(resp)
-                    except Exception as e:
-                        resp.error = f"validation_error: {e}"
-                if not resp.error:
-                    return resp
-                # if provider returned an error, decide whether to retry
-                if attempt > self.max_retries:
-                    return resp
+                await self._validator(resp)
             except Exception as e:
-                if attempt > self.max_retries:
-                    return LLMResponse(provider=self.provider.name, model=req.model, content="", raw={"error": str(e)}, error=str(e))
-            # backoff
-            await asyncio.sleep(_compute_backoff(attempt))
-            attempt += 1
+                resp.error = f"validation_error: {e}"
+                resp.exception = ValidationError(str(e))
+            if timing is not None:
+                timing.validate += time.perf_counter() - start
+        return resp
 
     async def abatch(
         self,
@@ -222,23 +552,212 @@ class BatchClient:
         model: str,
         temperature: float = 0.7,
         max_output_tokens: Optional[int] = None,
-        extra: Optional[Dict[str, Any]] = None,
+        extra: Optional[Dict[str, any]] = None,
+        offline: bool = False,
+        coalesce: bool = True,
+        priority: int = 0,
+        deadline: Optional[float] = None,
+        weight: float = 1.0,
     ) -> List[LLMResponse]:
+        """Run prompts concurrently; offline=True goes through the provider's batch-job endpoint instead."""
+        if offline:
+            job = await self.submit_batch(prompts, model=model, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra)
+            return await self.collect_batch(job)
+        out: List[Optional[LLMResponse]] = [None] * len(prompts)
+        stream = self.astream(
+            prompts,
+            model=model,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            extra=extra,
+            coalesce=coalesce,
+            priority=priority,
+            deadline=deadline,
+            weight=weight,
+        )
+        async for i, resp in stream:
+            out[i] = resp
+        return out  # type: ignore[return-value]
+
+    async def astream(
+        self,
+        prompts: Union[Iterable[Sequence[Msg]], AsyncIterable[Sequence[Msg]]],
+        *,
+        model: str,
+        temperature: float = 0.7,
+        max_output_tokens: Optional[int] = None,
+        extra: Optional[Dict[str, any]] = None,
+        ordered: bool = False,
+        window: Optional[int] = None,
+        reorder_buffer: Optional[int] = None,
+        coalesce: bool = True,
+        priority: int = 0,
+        deadline: Optional[float] = None,
+        weight: float = 1.0,
+    ) -> AsyncIterator[Tuple[int, LLMResponse]]:
+        """Yield (index, response) as requests finish, pulling prompts lazily from any (async) iterable.
+
+        At most max_concurrency + window requests exist at once (window defaults to max_concurrency;
+        with adaptive concurrency the current limit is used instead of max_concurrency; requests that
+        can be packed count as 1/pack.max_items each).
+        ordered=True yields in input order: finished results wait in a reorder buffer, and no new
+        prompts are pulled while it holds reorder_buffer entries (default 4x the in-flight cap).
+        coalesce=False sends duplicate prompts separately (e.g. intentional sampling).
+        Each call is its own fair-share flow: concurrent batches split the slots by `weight`,
+        higher `priority` goes first, and prompts not sent by `deadline` (time.time()) fail
+        with DeadlineExceededError.
+        """
         extra = extra or {}
-        reqs = [
-            LLMRequest(messages=list(msgs), model=model, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra)
-            for msgs in prompts
-        ]
-        return await asyncio.gather(*(self._one(r) for r in reqs))
+        flow = f"batch-{next(self._flow_ids)}"
+        self.sema.weights[flow] = weight
+        window = self.max_concurrency if window is None else max(0, window)
+        buf_cap = max(1, reorder_buffer if reorder_buffer is not None else 4 * (self.max_concurrency + window))
+        source = _aiter(prompts)
+        pending: Dict[asyncio.Task, int] = {}
+        buffered: Dict[int, LLMResponse] = {}
+        next_in = next_out = 0
+        exhausted = False
+        # slots in use: a request that can be packed takes 1/max_items of one, since
+        # each slot carries a whole pack; anything else takes a full slot
+        costs: Dict[asyncio.Task, float] = {}
+        load = 0.0
+        try:
+            while True:
+                cap = (self.adaptive.limit if self.adaptive else self.max_concurrency) + window
+                while not exhausted and load < cap and len(buffered) < buf_cap:
+                    try:
+                        msgs = await source.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    req = LLMRequest(
+                        messages=list(msgs),
+                        model=model,
+                        temperature=temperature,
+                        max_output_tokens=max_output_tokens,
+                        extra=extra,
+                        coalesce=coalesce,
+                        priority=priority,
+                        deadline=deadline,
+                        flow=flow,
+                    )
+                    task = asyncio.ensure_future(self._one(req))
+                    pending[task] = next_in
+                    packable = self.pack is not None and self.pack.key(req) is not None
+                    costs[task] = 1.0 / self.pack.max_items if packable else 1.0
+                    load += costs[task]
+                    next_in += 1
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    i = pending.pop(task)
+                    load -= costs.pop(task)
+                    if ordered:
+                        buffered[i] = task.result()
+                    else:
+                        yield i, task.result()
+                while next_out in buffered:
+                    yield next_out, buffered.pop(next_out)
+                    next_out += 1
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            await source.aclose()
+            self.sema.weights.pop(flow, None)
+            if self.journal is not None:
+                self.journal.flush()
+
+    async def submit_batch(
+        self,
+        prompts: Sequence[Sequence[Msg]],
+        *,
+        model: str,
+        temperature: float = 0.7,
+        max_output_tokens: Optional[int] = None,
+        extra: Optional[Dict[str, any]] = None,
+    ) -> BatchJob:
+        """Submit prompts as offline batch job(s); the returned handle can be collected later (even from another process)."""
+        if not isinstance(self.provider, BatchJobProvider):
+            raise TypeError(f"provider {self.provider.name!r} does not support offline batch jobs")
+        return await self.provider.submit_batch(self._requests(prompts, model, temperature, max_output_tokens, extra))
+
+    async def collect_batch(self, job: BatchJob) -> List[LLMResponse]:
+        """Wait for a submitted job and return responses in prompt order (validated, not retried)."""
+        if not isinstance(self.provider, BatchJobProvider):
+            raise TypeError(f"provider {self.provider.name!r} does not support offline batch jobs")
+        resps = await self.provider.collect_batch(job)
+        return list(await asyncio.gather(*(self._validated(r) for r in resps)))
 
     async def acomplete(self, messages: Sequence[Msg], *, model: str, **kw) -> LLMResponse:
         req = LLMRequest(messages=list(messages), model=model, **kw)
         return await self._one(req)
 
+    async def warmup(self, connections: Optional[int] = None) -> int:
+        """Pre-open provider connections (default: one per concurrency slot) before a batch."""
+        warmup = getattr(self.provider, "warmup", None)
+        if warmup is None:
+            return 0
+        if connections is None:
+            connections = self.adaptive.limit if self.adaptive else self.max_concurrency
+        return await warmup(connections)
+
+    async def aclose(self) -> None:
+        """
+        Cancel unsent and in-flight packs, flush the journal, stop an owned validation
+        pool and close the provider's connections.
+        """
+        for group in self._packs.values():
+            group.timer.cancel()
+            for _, fut in group.items:
+                fut.cancel()
+        self._packs.clear()
+        tasks = list(self._pack_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.journal is not None:
+            self.journal.flush()
+        if self._validator is not None:
+            self._validator.close()
+        aclose = getattr(self.provider, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    async def __aenter__(self) -> "BatchClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+
+class _Pack:
+    __slots__ = ("items", "tokens", "timer")
+
+    def __init__(self):
+        self.items: List[Tuple[LLMRequest, asyncio.Future]] = []
+        self.tokens = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+async def _aiter(items: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
 
-############################################################
-# Convenience sync wrappers
-############################################################
 
 def run_batch(
     provider: Provider,
@@ -249,22 +768,56 @@ def run_batch(
     max_output_tokens: Optional[int] = None,
     max_concurrency: int = 8,
     qps: Optional[float] = None,
+    burst: Optional[float] = None,
+    tpm: Optional[float] = None,
     max_retries: int = 3,
     timeout: float = 60.0,
-    extra: Optional[Dict[str, Any]] = None,
+    extra: Optional[Dict[str, any]] = None,
+    offline: bool = False,
+    journal: Optional[str] = None,
+    processes: int = 1,
 ) -> List[LLMResponse]:
-    client = BatchClient(provider, max_concurrency=max_concurrency, qps=qps, max_retries=max_retries, timeout=timeout)
-    return asyncio.run(client.abatch(prompts, model=model, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra))
+    if processes > 1 and not offline:
+        if journal is not None or tpm:
+            raise ValueError("journal and tpm are not supported with processes > 1")
+        from sharded import run_batch_sharded
+
+        return run_batch_sharded(
+            provider,
+            prompts,
+            model=model,
+            processes=processes,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            max_concurrency=max_concurrency,
+            qps=qps,
+            burst=burst,
+            max_retries=max_retries,
+            timeout=timeout,
+            extra=extra,
+        )
+    client = BatchClient(provider, max_concurrency=max_concurrency, qps=qps, burst=burst, tpm=tpm, max_retries=max_retries, timeout=timeout, journal=journal)
+
+    async def _batch() -> List[LLMResponse]:
+        # close the provider's pool before asyncio.run() closes the loop it belongs to
+        async with client:
+            return await client.abatch(prompts, model=model, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra, offline=offline)
+
+    if client.journal is not None:
+        with client.journal:
+            return asyncio.run(_batch())
+    return asyncio.run(_batch())
 
 
 def run_one(provider: Provider, messages: Sequence[Msg], *, model: str, **kw) -> LLMResponse:
-    client = BatchClient(provider)
-    return asyncio.run(client.acomplete(messages, model=model, **kw))
+    """One blocking call on a fresh event loop (and a fresh connection pool, closed on return)."""
+
+    async def _one() -> LLMResponse:
+        async with BatchClient(provider) as client:
+            return await client.acomplete(messages, model=model, **kw)
 
+    return asyncio.run(_one())
 
-############################################################
-# Example validation hook
-############################################################
 
 def require_json(resp: LLMResponse) -> None:
     """Raise if response.content is not valid JSON."""
@@ -274,11 +827,9 @@ def require_json(resp: LLMResponse) -> None:
         raise ValueError("response is not valid JSON") from e
 
 
-############################################################
-# If run directly, do a tiny smoke test (requires OPENAI_API_KEY)
-############################################################
-
 if __name__ == "__main__":
+    from openai_provider import OpenAIProvider
+
     async def _demo():
         prov = OpenAIProvider()
         client = BatchClient(prov, max_concurrency=5, qps=2.0)
@@ -286,4 +837,5 @@ if __name__ == "__main__":
         res = await client.abatch(prompts, model="gpt-4.1-mini")
         for r in res:
             print(r.content)
+
     asyncio.run(_demo())
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark: event-loop wakeups of the FIFO TokenBucketLimiter vs the old
+sleep-polling bucket under heavy fan-out.
+
+    python benchmarks/bench_limiter.py --waiters 2000 --qps 500
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from token_bucket import TokenBucketLimiter  # noqa: E402
+
+
+class PollingBucket:
+    """The pre-FIFO algorithm: every waiter sleeps and retries on its own."""
+    def __init__(self, qps: float, burst: float = 1.0):
+        self.qps = qps
+        self.capacity = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.wakeups = 0
+
+    async def acquire(self, n: float = 1.0) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.qps)
+            self.last = now
+            if self.tokens >= n:
+                self.tokens -= n
+                return
+            await asyncio.sleep(max((n - self.tokens) / self.qps, 0.001))
+            self.wakeups += 1
+
+
+async def _run(limiter, waiters: int) -> dict:
+    order = []
+
+    async def one(i: int) -> None:
+        await limiter.acquire()
+        order.append(i)
+
+    cpu0, t0 = time.process_time(), time.monotonic()
+    await asyncio.gather(*(one(i) for i in range(waiters)))
+    elapsed = time.monotonic() - t0
+    inversions = sum(1 for a, b in zip(order, order[1:]) if b < a)
+    return {
+        "limiter": type(limiter).__name__,
+        "grants": waiters,
+        "wakeups": limiter.wakeups,
+        "wall_s": round(elapsed, 3),
+        "cpu_s": round(time.process_time() - cpu0, 3),
+        "achieved_qps": round(waiters / elapsed, 1) if elapsed else None,
+        "fifo_inversions": inversions,
+    }
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--waiters", type=int, default=2000)
+    ap.add_argument("--qps", type=float, default=500.0)
+    args = ap.parse_args(argv)
+    for limiter in (TokenBucketLimiter(args.qps), PollingBucket(args.qps)):
+        print(json.dumps(asyncio.run(_run(limiter, args.waiters))))
+
+
+if __name__ == "__main__":
+    main()
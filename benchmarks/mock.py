@@ -0,0 +1,107 @@
+"""
+Local stand-ins for a provider: an in-process fake Provider and an ASGI mock of
+POST /responses for driving the real OpenAIProvider through httpx.ASGITransport.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import random
+import sys
+from typing import Callable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from errors import RateLimitError, ServerError  # noqa: E402
+from llm_response import LLMResponse  # noqa: E402
+from usage import Usage  # noqa: E402
+
+
+def latency_dist(spec: str) -> Callable[[], float]:
+    """
+    "0" | "fixed:0.05" | "uniform:0.01,0.2" | "exp:0.1" | "lognormal:-2.5,0.8"
+    """
+    kind, _, args = spec.partition(":")
+    if not args:
+        value = float(kind)
+        return lambda: value
+    nums = [float(x) for x in args.split(",")]
+    if kind == "fixed":
+        return lambda: nums[0]
+    if kind == "uniform":
+        return lambda: random.uniform(nums[0], nums[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1.0 / nums[0])
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(nums[0], nums[1])
+    raise ValueError(f"unknown latency distribution {spec!r}")
+
+
+class FakeProvider:
+    """In-process Provider with configurable latency, 5xx rate and 429 injection."""
+    name = "fake"
+
+    def __init__(self, latency: str = "0", error_rate: float = 0.0, rate_limit_rate: float = 0.0):
+        self.latency = latency_dist(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.calls = 0
+
+    async def acomplete(self, req, *, timeout: float = 60.0) -> LLMResponse:
+        self.calls += 1
+        delay = self.latency()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            await asyncio.sleep(0)
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            exc = RateLimitError("429 Too Many Requests", status_code=429, retry_after=0.01)
+            return LLMResponse(provider=self.name, model=req.model, content="", raw={}, error=str(exc), status_code=429, exception=exc)
+        if roll < self.rate_limit_rate + self.error_rate:
+            exc = ServerError("500 Internal Server Error", status_code=500)
+            return LLMResponse(provider=self.name, model=req.model, content="", raw={}, error=str(exc), status_code=500, exception=exc)
+        text = req.messages[-1].content
+        return LLMResponse(provider=self.name, model=req.model, content=text, raw={}, usage=Usage(len(text) // 4, 1, len(text) // 4 + 1))
+
+
+def mock_app(latency: str = "0", error_rate: float = 0.0, rate_limit_rate: float = 0.0):
+    """ASGI app answering POST /v1/responses like the Responses API."""
+    sample = latency_dist(latency)
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            msg = await receive()
+            body += msg.get("body", b"")
+            if not msg.get("more_body"):
+                break
+        delay = sample()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        roll = random.random()
+        headers = [(b"content-type", b"application/json")]
+        if roll < rate_limit_rate:
+            status, payload = 429, {"error": {"message": "rate limited"}}
+            headers.append((b"retry-after-ms", b"10"))
+        elif roll < rate_limit_rate + error_rate:
+            status, payload = 500, {"error": {"message": "boom"}}
+        else:
+            req = json.loads(body or b"{}")
+            text = (req.get("input") or [{"content": ""}])[-1]["content"]
+            status = 200
+            payload = {
+                "id": "resp_mock",
+                "model": req.get("model"),
+                "output": [{"type": "message", "content": [{"type": "output_text", "text": text}]}],
+                "usage": {"input_tokens": len(text) // 4, "output_tokens": 1, "total_tokens": len(text) // 4 + 1},
+            }
+        data = json.dumps(payload).encode()
+        headers.append((b"content-length", str(len(data)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": data})
+
+    return app
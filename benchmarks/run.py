@@ -0,0 +1,228 @@
+"""
+batchcal benchmark suite (no network).
+
+    python benchmarks/run.py                       # full run, JSON to stdout
+    python benchmarks/run.py --quick --out new.json
+    python benchmarks/run.py --compare old.json    # flag regressions vs a previous run
+
+Scenarios:
+    overhead      client-side cost per request against a zero-latency fake provider
+    http          end-to-end through OpenAIProvider + a local ASGI mock of /responses
+    limiter       achieved vs target QPS
+    errors        throughput and completion with 5xx / 429 injection
+    memory        peak traced memory while streaming many prompts
+    loop_lag      event-loop lag while a large batch is running
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx  # noqa: E402
+
+from batchclient import BatchClient  # noqa: E402
+from msg import Msg  # noqa: E402
+from openai_provider import OpenAIProvider  # noqa: E402
+from retry import RetryPolicy  # noqa: E402
+from mock import FakeProvider, mock_app  # noqa: E402
+
+# metric name -> True when higher is better (used by --compare)
+HIGHER_IS_BETTER = {
+    "items_per_s": True,
+    "us_per_request": False,
+    "cpu_us_per_request": False,
+    "qps_error_pct": False,
+    "success_rate": True,
+    "peak_mb": False,
+    "bytes_per_prompt": False,
+    "lag_p99_ms": False,
+    "lag_max_ms": False,
+}
+
+
+def _prompts(n: int):
+    for i in range(n):
+        yield [Msg.user(f"item {i}")]
+
+
+async def _drain(client: BatchClient, n: int, **kw) -> int:
+    ok = 0
+    async for _, resp in client.astream(_prompts(n), model="bench", coalesce=False, **kw):
+        ok += not resp.error
+    return ok
+
+
+def _timed(fn: Callable[[], Any]) -> Dict[str, float]:
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    result = fn()
+    return {"result": result, "wall": time.perf_counter() - t0, "cpu": time.process_time() - cpu0}
+
+
+def bench_overhead(n: int) -> Dict[str, Any]:
+    client = BatchClient(FakeProvider(), max_concurrency=64)
+    t = _timed(lambda: asyncio.run(_drain(client, n)))
+    return {
+        "requests": n,
+        "items_per_s": round(n / t["wall"], 1),
+        "us_per_request": round(t["wall"] / n * 1e6, 2),
+        "cpu_us_per_request": round(t["cpu"] / n * 1e6, 2),
+    }
+
+
+def bench_http(n: int, latency: str) -> Dict[str, Any]:
+    async def run() -> int:
+        prov = OpenAIProvider(api_key="bench", base_url="http://mock/v1", transport=httpx.ASGITransport(app=mock_app(latency)))
+        return await _drain(BatchClient(prov, max_concurrency=64), n)
+
+    t = _timed(lambda: asyncio.run(run()))
+    return {
+        "requests": n,
+        "latency": latency,
+        "items_per_s": round(n / t["wall"], 1),
+        "cpu_us_per_request": round(t["cpu"] / n * 1e6, 2),
+        "success_rate": round(t["result"] / n, 4),
+    }
+
+
+def bench_limiter(qps: float, seconds: float) -> Dict[str, Any]:
+    n = int(qps * seconds)
+    client = BatchClient(FakeProvider(), max_concurrency=256, qps=qps)
+    t = _timed(lambda: asyncio.run(_drain(client, n)))
+    # the first token is free, so n grants take (n - 1) / qps
+    achieved = (n - 1) / t["wall"]
+    return {
+        "target_qps": qps,
+        "achieved_qps": round(achieved, 2),
+        "qps_error_pct": round(abs(achieved - qps) / qps * 100, 2),
+    }
+
+
+def bench_errors(n: int, error_rate: float, rate_limit_rate: float) -> Dict[str, Any]:
+    prov = FakeProvider(latency="fixed:0.001", error_rate=error_rate, rate_limit_rate=rate_limit_rate)
+    client = BatchClient(prov, max_concurrency=64, retry=RetryPolicy(5, base=0.001, cap=0.01))
+    t = _timed(lambda: asyncio.run(_drain(client, n)))
+    return {
+        "requests": n,
+        "error_rate": error_rate,
+        "rate_limit_rate": rate_limit_rate,
+        "provider_calls": prov.calls,
+        "items_per_s": round(n / t["wall"], 1),
+        "success_rate": round(t["result"] / n, 4),
+    }
+
+
+def bench_memory(n: int) -> Dict[str, Any]:
+    client = BatchClient(FakeProvider(), max_concurrency=64)
+    tracemalloc.start()
+    try:
+        asyncio.run(_drain(client, n))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"prompts": n, "peak_mb": round(peak / 2**20, 2), "bytes_per_prompt": round(peak / n, 2)}
+
+
+def bench_loop_lag(n: int, latency: str, interval: float = 0.005) -> Dict[str, Any]:
+    async def run() -> List[float]:
+        lags: List[float] = []
+        done = asyncio.Event()
+
+        async def monitor() -> None:
+            while not done.is_set():
+                t0 = time.perf_counter()
+                await asyncio.sleep(interval)
+                lags.append(max(0.0, time.perf_counter() - t0 - interval))
+
+        mon = asyncio.ensure_future(monitor())
+        await _drain(BatchClient(FakeProvider(latency=latency), max_concurrency=256), n)
+        done.set()
+        await mon
+        return sorted(lags)
+
+    lags = asyncio.run(run()) or [0.0]
+    return {
+        "requests": n,
+        "latency": latency,
+        "lag_p99_ms": round(lags[min(len(lags) - 1, int(0.99 * len(lags)))] * 1e3, 3),
+        "lag_max_ms": round(lags[-1] * 1e3, 3),
+    }
+
+
+def _meta() -> Dict[str, Any]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        rev = ""
+    return {"python": platform.python_version(), "platform": platform.platform(), "git_rev": rev, "time": time.time()}
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], tolerance: float) -> List[str]:
+    """Human-readable regressions: metrics that got worse by more than `tolerance` (fraction)."""
+    out = []
+    for name, metrics in new["results"].items():
+        before = old.get("results", {}).get(name, {})
+        for metric, higher in HIGHER_IS_BETTER.items():
+            a, b = before.get(metric), metrics.get(metric)
+            if not isinstance(a, (int, float)) or not isinstance(b, (int, float)) or a == 0:
+                continue
+            change = (b - a) / abs(a)
+            if (higher and change < -tolerance) or (not higher and change > tolerance):
+                out.append(f"{name}.{metric}: {a} -> {b} ({change:+.1%})")
+    return out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--quick", action="store_true", help="small sizes, for CI smoke runs")
+    ap.add_argument("--only", default="", help="comma-separated scenario names")
+    ap.add_argument("--memory-prompts", type=int, default=None, help="prompts for the memory scenario (default 100k, 10k with --quick)")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--compare", help="previous results JSON to check for regressions")
+    ap.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression (default 10%%)")
+    args = ap.parse_args(argv)
+
+    q = args.quick
+    scenarios: Dict[str, Callable[[], Dict[str, Any]]] = {
+        "overhead": lambda: bench_overhead(5_000 if q else 50_000),
+        "http": lambda: bench_http(1_000 if q else 10_000, "uniform:0.001,0.01"),
+        "limiter": lambda: bench_limiter(200.0, 1.0 if q else 5.0),
+        "errors": lambda: bench_errors(2_000 if q else 20_000, 0.05, 0.10),
+        "memory": lambda: bench_memory(args.memory_prompts or (10_000 if q else 100_000)),
+        "loop_lag": lambda: bench_loop_lag(5_000 if q else 50_000, "exp:0.005"),
+    }
+    only = {s for s in args.only.split(",") if s}
+    results = {}
+    for name, fn in scenarios.items():
+        if only and name not in only:
+            continue
+        results[name] = fn()
+        print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+    report = {"meta": _meta(), "results": results}
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(json.load(fh), report, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Content-addressed response cache: bounded in-memory LRU tier plus optional disk tier.
+
+Keys are LLMRequest.cache_key() (model, messages, temperature, max_output_tokens, extra).
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Callable, Dict, Optional, Tuple
+
+from llm_request import LLMRequest
+from llm_response import LLMResponse
+from provider import Provider
+
+
+def default_cacheable(req: LLMRequest) -> bool:
+    """Only deterministic requests are safe to replay."""
+    return req.temperature == 0
+
+
+class ResponseCache:
+    """
+    max_entries: size of the in-memory LRU tier.
+    ttl: seconds an entry stays valid (None = forever), applies to both tiers.
+    disk_path: directory for the persistent tier (None = memory only).
+    max_disk_bytes: evict least recently used disk entries above this size (None = unbounded).
+    """
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        *,
+        ttl: Optional[float] = None,
+        disk_path: Optional[str] = None,
+        max_disk_bytes: Optional[int] = None,
+    ):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._mem: "OrderedDict[str, Tuple[Optional[float], LLMResponse]]" = OrderedDict()
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        if disk_path:
+            os.makedirs(disk_path, exist_ok=True)
+            self._scan_disk()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.disk_path, key[:2], key + ".json")  # type: ignore[arg-type]
+
+    def _scan_disk(self) -> None:
+        entries = []
+        for root, _, files in os.walk(self.disk_path):  # type: ignore[arg-type]
+            for name in files:
+                if name.endswith(".json"):
+                    st = os.stat(os.path.join(root, name))
+                    entries.append((st.st_mtime, name[:-5], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _expired(self, expires: Optional[float]) -> bool:
+        return expires is not None and time.time() >= expires
+
+    def get(self, key: str) -> Optional[LLMResponse]:
+        hit = self._mem.get(key)
+        if hit is not None:
+            if not self._expired(hit[0]):
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return replace(hit[1])
+            del self._mem[key]
+        if key in self._disk:
+            try:
+                with open(self._file(key), "r", encoding="utf-8") as fh:
+                    d = json.load(fh)
+            except (OSError, ValueError):
+                d = None
+            if d is not None and not self._expired(d.get("expires")):
+                resp = LLMResponse.from_dict(d["response"])
+                self._disk.move_to_end(key)
+                self._remember(key, d.get("expires"), resp)
+                self.hits += 1
+                self.disk_hits += 1
+                return replace(resp)
+            self._drop_disk(key)
+        self.misses += 1
+        return None
+
+    def put(self, key: str, resp: LLMResponse) -> None:
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        self._remember(key, expires, replace(resp))
+        if self.disk_path:
+            self._write_disk(key, expires, resp)
+
+    def _remember(self, key: str, expires: Optional[float], resp: LLMResponse) -> None:
+        self._mem[key] = (expires, resp)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def _write_disk(self, key: str, expires: Optional[float], resp: LLMResponse) -> None:
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({"expires": expires, "response": resp.to_dict()}, default=str).encode("utf-8")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+        self._disk_bytes += len(data) - self._disk.pop(key, 0)
+        self._disk[key] = len(data)
+        if self.max_disk_bytes is not None:
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                self._drop_disk(next(iter(self._disk)))
+                self.evictions += 1
+
+    def _drop_disk(self, key: str) -> None:
+        self._disk_bytes -= self._disk.pop(key, 0)
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "evictions": self.evictions,
+            "entries": len(self._mem),
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+class CachingProvider:
+    """Provider wrapper that serves cacheable requests from a ResponseCache."""
+    def __init__(
+        self,
+        provider: Provider,
+        cache: ResponseCache,
+        *,
+        cacheable: Callable[[LLMRequest], bool] = default_cacheable,
+    ):
+        self.provider = provider
+        self.cache = cache
+        self.cacheable = cacheable
+        self.name = provider.name
+
+    async def acomplete(self, req: LLMRequest, *, timeout: float = 60.0) -> LLMResponse:
+        if not self.cacheable(req):
+            return await self.provider.acomplete(req, timeout=timeout)
+        key = req.cache_key()
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit
+        resp = await self.provider.acomplete(req, timeout=timeout)
+        if not resp.error:
+            self.cache.put(key, resp)
+        return resp
@@ -0,0 +1,231 @@
+"""
+batchcal command line: stream a JSONL file of prompts through BatchClient into a JSONL file of results.
+
+    batchcal run prompts.jsonl -o results.jsonl --model gpt-4.1-mini --qps 10 --concurrency 32
+    batchcal run prompts.jsonl -o part0.jsonl --model gpt-4.1-mini --shard 0/4   # 4 instances split one file
+
+Input lines are {"messages": [{"role": ..., "content": ...}, ...]}, {"prompt": "..."} or a
+JSON string, optionally with an "id" that is copied to the output. Each output line is the
+LLMResponse plus "index" (0-based input line) and "id", written as soon as it finishes.
+Rerunning with the same --journal and --append sends and writes only the prompts the
+journal has no answer for (failed lines are retried, so the last row for an index wins).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from batchclient import BatchClient
+from compat import json_loads
+from journal import Journal
+from llm_request import LLMRequest
+from msg import Msg
+from provider import Provider
+
+_READ_BUFFER = 1 << 20
+_WRITE_BUFFER = 1 << 20
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """'i/N' -> (i, N) with 0 <= i < N."""
+    try:
+        i, n = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"--shard must look like i/N, not {value!r}") from None
+    if n < 1 or not 0 <= i < n:
+        raise argparse.ArgumentTypeError(f"--shard {value!r}: need 0 <= i < N")
+    return i, n
+
+
+def _messages(item: Any, system: Optional[str]) -> List[Msg]:
+    if isinstance(item, str):
+        msgs = [Msg.user(item)]
+    elif isinstance(item, dict) and "messages" in item:
+        msgs = [Msg(m["role"], m["content"]) for m in item["messages"]]
+    elif isinstance(item, dict) and "prompt" in item:
+        msgs = [Msg.user(item["prompt"])]
+    else:
+        raise ValueError('expected {"messages": [...]}, {"prompt": "..."} or a string')
+    if system is not None and not any(m.role == "system" for m in msgs):
+        msgs.insert(0, Msg.system(system))
+    return msgs
+
+
+class _Progress:
+    def __init__(self, out: IO[str], interval: float):
+        self.out = out
+        self.interval = interval
+        self.start = self.last = time.monotonic()
+        self.done = self.errors = self.skipped = self.resumed = 0
+
+    def tick(self, error: bool) -> bool:
+        """Count one result; True when a progress line was just printed."""
+        self.done += 1
+        self.errors += error
+        now = time.monotonic()
+        if self.interval > 0 and now - self.last >= self.interval:
+            self.last = now
+            self.report()
+            return True
+        return False
+
+    def report(self, final: bool = False) -> None:
+        took = max(1e-9, time.monotonic() - self.start)
+        label = "done" if final else "progress"
+        self.out.write(f"{label}: {self.done} results ({self.errors} errors, {self.skipped} bad lines, {self.resumed} resumed) in {took:.1f}s, {self.done / took:.1f}/s\n")
+        self.out.flush()
+
+
+async def run_file(
+    client: BatchClient,
+    src: IO[bytes],
+    dst: IO[str],
+    *,
+    model: str,
+    shard: Tuple[int, int] = (0, 1),
+    system: Optional[str] = None,
+    ordered: bool = False,
+    progress: Optional[_Progress] = None,
+    **request_kw: Any,
+) -> Dict[str, int]:
+    """
+    Send every line of `src` that belongs to `shard` (line number mod N == i) and append
+    results to `dst` as they complete. Memory stays flat: lines are read as the client
+    asks for more work, and only in-flight requests keep their line number and id.
+    Prompts the client's journal already holds are skipped (counted as "resumed").
+    """
+    shard_i, shard_n = shard
+    meta: Dict[int, Tuple[int, Any]] = {}
+    progress = progress or _Progress(sys.stderr, 0.0)
+    # prompts an earlier run already answered (and wrote a row for) are not sent or written again
+    resumed = client.journal.keys() if client.journal is not None else None
+    temperature = request_kw.get("temperature", 0.7)
+    max_output_tokens = request_kw.get("max_output_tokens")
+    extra = request_kw.get("extra") or {}
+
+    def write(record: Dict[str, Any]) -> None:
+        dst.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        dst.write("\n")
+
+    def prompts() -> Iterator[List[Msg]]:
+        pos = 0
+        for lineno, line in enumerate(src):
+            if lineno % shard_n != shard_i or not line.strip():
+                continue
+            try:
+                item = json_loads(line)
+                msgs = _messages(item, system)
+            except (ValueError, KeyError, TypeError) as e:
+                progress.skipped += 1
+                write({"index": lineno, "id": None, "error": f"bad input line: {e}"})
+                continue
+            if resumed:
+                key = LLMRequest(messages=msgs, model=model, temperature=temperature, max_output_tokens=max_output_tokens, extra=extra).cache_key()
+                if key in resumed:
+                    progress.resumed += 1
+                    continue
+            meta[pos] = (lineno, item.get("id") if isinstance(item, dict) else None)
+            pos += 1
+            yield msgs
+
+    async for pos, resp in client.astream(prompts(), model=model, ordered=ordered, **request_kw):
+        lineno, item_id = meta.pop(pos)
+        record = {"index": lineno, "id": item_id}
+        record.update(resp.to_dict())
+        write(record)
+        if progress.tick(bool(resp.error)):
+            dst.flush()  # results on disk keep up with the progress lines
+    return {"done": progress.done, "errors": progress.errors, "skipped": progress.skipped, "resumed": progress.resumed}
+
+
+def _parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="batchcal", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="stream a JSONL file of prompts through the API")
+    run.add_argument("input", help="JSONL prompts ('-' for stdin)")
+    run.add_argument("-o", "--output", default="-", help="JSONL results ('-' for stdout)")
+    run.add_argument("--append", action="store_true", help="add to an existing output file (e.g. when resuming with --journal)")
+    run.add_argument("--model", required=True)
+    run.add_argument("--temperature", type=float, default=0.7)
+    run.add_argument("--max-output-tokens", type=int, default=None)
+    run.add_argument("--system", default=None, help="system message for inputs that have none")
+    run.add_argument("--qps", type=float, default=None)
+    run.add_argument("--tpm", type=float, default=None, help="tokens per minute limit")
+    run.add_argument("--concurrency", type=int, default=8)
+    run.add_argument("--adaptive", action="store_true", help="let the concurrency limit adapt (up to 256)")
+    run.add_argument("--max-retries", type=int, default=3)
+    run.add_argument("--timeout", type=float, default=60.0)
+    run.add_argument("--shard", type=parse_shard, default=(0, 1), metavar="i/N", help="only lines with number %% N == i")
+    run.add_argument("--ordered", action="store_true", help="write results in input order (bounded reorder buffer)")
+    run.add_argument("--journal", default=None, help="checkpoint file; rerunning skips finished prompts")
+    run.add_argument("--base-url", default="https://api.openai.com/v1")
+    run.add_argument("--http2", action="store_true")
+    run.add_argument("--keep-raw", action="store_true", help="keep the full provider reply in each result")
+    run.add_argument("--progress-interval", type=float, default=5.0, help="seconds between progress lines (0 = off)")
+    return ap
+
+
+async def _run(args: argparse.Namespace, provider: Provider, src: IO[bytes], dst: IO[str]) -> Dict[str, int]:
+    progress = _Progress(sys.stderr, args.progress_interval)
+    journal = Journal(args.journal) if args.journal else None
+    try:
+        async with BatchClient(
+            provider,
+            max_concurrency=args.concurrency,
+            adaptive=args.adaptive,
+            qps=args.qps,
+            tpm=args.tpm,
+            max_retries=args.max_retries,
+            timeout=args.timeout,
+            journal=journal,
+        ) as client:
+            await client.warmup()
+            return await run_file(
+                client,
+                src,
+                dst,
+                model=args.model,
+                shard=args.shard,
+                system=args.system,
+                ordered=args.ordered,
+                progress=progress,
+                temperature=args.temperature,
+                max_output_tokens=args.max_output_tokens,
+            )
+    finally:
+        if journal is not None:
+            journal.close()
+        if args.progress_interval > 0:
+            progress.report(final=True)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = _parser()
+    args = ap.parse_args(argv)
+    if args.output != "-" and not args.append and os.path.exists(args.output) and os.path.getsize(args.output):
+        ap.error(f"{args.output} already has results; pass --append to add to it")
+    from openai_provider import OpenAIProvider
+
+    provider = OpenAIProvider(base_url=args.base_url, http2=args.http2, retain="full" if args.keep_raw else "none")
+    src = sys.stdin.buffer if args.input == "-" else open(args.input, "rb", buffering=_READ_BUFFER)
+    dst = sys.stdout if args.output == "-" else open(args.output, "a", buffering=_WRITE_BUFFER, encoding="utf-8")
+    try:
+        stats = asyncio.run(_run(args, provider, src, dst))
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        dst.flush()
+        if src is not sys.stdin.buffer:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    return 1 if stats["errors"] or stats["skipped"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,17 @@
+"""
+Version- and optional-dependency shims: slotted dataclasses and a fast JSON decoder.
+"""
+from __future__ import annotations
+import json
+import sys
+from typing import Any, Callable, Dict, Union
+
+# @dataclass(**SLOTS): no per-instance __dict__ on Python >= 3.10 (about half the size)
+SLOTS: Dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+try:  # pip install batchcal[fast]
+    import orjson as _orjson
+except ImportError:  # pragma: no cover - optional
+    _orjson = None
+
+json_loads: Callable[[Union[bytes, str]], Any] = _orjson.loads if _orjson is not None else json.loads
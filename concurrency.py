@@ -0,0 +1,125 @@
+"""
+Adaptive concurrency limit (AIMD with a latency gradient), used in place of a fixed semaphore.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from llm_response import LLMResponse
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit that converges on what the provider can actually take.
+
+    - additive increase (+1 per limit's worth of successes) while the limit is the bottleneck
+    - multiplicative decrease on 429 / 5xx / transport errors, at most once per round trip
+    - gentle decrease when smoothed latency exceeds latency_tolerance x the best latency seen
+    - pauses dispatch until x-ratelimit-reset-* when the provider reports an exhausted quota
+
+    Use as `async with limit:` (drop-in for asyncio.Semaphore) and report each call via record().
+    """
+    def __init__(
+        self,
+        initial: int = 8,
+        *,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        backoff: float = 0.7,
+        latency_tolerance: float = 2.0,
+        smoothing: float = 0.2,
+    ):
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._paused_until = 0.0
+        self._last_drop = 0.0
+        self._baseline: Optional[float] = None
+        self._ewma: Optional[float] = None
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    async def __aenter__(self) -> "AdaptiveConcurrency":
+        loop = asyncio.get_running_loop()
+        woken = False
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            if self.in_flight < self.limit and (woken or not self._waiters):
+                self.in_flight += 1
+                return self
+            fut = loop.create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut in self._waiters:
+                    self._waiters.remove(fut)
+                else:
+                    self._wake()  # hand the wakeup we consumed to the next waiter
+                raise
+            woken = True
+
+    async def __aexit__(self, *exc) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        free = self.limit - self.in_flight
+        while free > 0 and self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+    def _decrease(self, factor: float, now: float) -> None:
+        # one decrease per round trip: a burst of failures from the same window counts once
+        if now - self._last_drop < (self._ewma or 0.0):
+            return
+        self._last_drop = now
+        self._limit = max(float(self.min_limit), self._limit * factor)
+
+    def record(self, resp: Optional[LLMResponse], latency: float) -> None:
+        """Feed back one finished call (resp=None when the call raised)."""
+        now = time.monotonic()
+        info = resp.rate_limit if resp is not None else None
+        if info is not None:
+            exhausted = [
+                reset for remaining, reset in (
+                    (info.remaining_requests, info.reset_requests),
+                    (info.remaining_tokens, info.reset_tokens),
+                )
+                if remaining == 0 and reset
+            ]
+            if exhausted:
+                self._paused_until = max(self._paused_until, now + max(exhausted))
+        status = resp.status_code if resp is not None else None
+        if resp is None or status == 429 or (status is not None and status >= 500) or (resp.error and status is None):
+            self._decrease(self.backoff, now)
+            return
+        if resp.error:
+            return  # client errors say nothing about capacity
+        self._ewma = latency if self._ewma is None else self._ewma + self.smoothing * (latency - self._ewma)
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        else:
+            self._baseline += 0.01 * (latency - self._baseline)  # let the floor drift with the provider
+        if self._ewma > self.latency_tolerance * self._baseline:
+            self._decrease(0.9, now)
+            return
+        near_quota = info is not None and info.remaining_requests is not None and info.remaining_requests < self.limit
+        if self.in_flight >= self.limit - 1 and not near_quota:
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            self._wake()
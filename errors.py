@@ -0,0 +1,95 @@
+"""
+Typed provider errors. Providers attach one to LLMResponse.exception alongside the
+error string; BatchClient's retry policy and circuit breaker decide based on the type.
+"""
+from __future__ import annotations
+import email.utils
+import time
+from typing import Mapping, Optional
+
+
+class LLMError(Exception):
+    retryable = False
+
+    def __init__(self, message: str = "", *, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RateLimitError(LLMError):
+    """429: over quota, retry later (honor retry_after)."""
+    retryable = True
+
+
+class RequestTimeoutError(LLMError):
+    """No answer within the request timeout."""
+    retryable = True
+
+
+class ServerError(LLMError):
+    """5xx or an unreachable provider."""
+    retryable = True
+
+
+class ClientError(LLMError):
+    """4xx other than 429 (bad request, auth, not found): retrying cannot help."""
+    retryable = False
+
+
+class ResponseFormatError(LLMError):
+    """The provider answered, but the reply could not be decoded or parsed: not retried or failed over."""
+    retryable = False
+
+
+class ValidationError(LLMError):
+    """The answer arrived but the validate hook rejected it; a fresh sample may pass."""
+    retryable = True
+
+
+class StreamAbortedError(ValidationError):
+    """A streamed answer was cut off early because an incremental validator rejected it."""
+
+
+class CircuitOpenError(LLMError):
+    """Dispatch refused because the provider is considered down."""
+    retryable = False
+
+
+class DeadlineExceededError(LLMError):
+    """The request's deadline passed before it could be sent; no rate-limit token was spent."""
+    retryable = False
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Seconds from retry-after-ms / retry-after (delta seconds or HTTP date)."""
+    h = {k.lower(): v for k, v in headers.items()}
+    if h.get("retry-after-ms"):
+        try:
+            return max(0.0, float(h["retry-after-ms"]) / 1000.0)
+        except ValueError:
+            pass
+    value = h.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def error_for_status(status_code: int, message: str, retry_after: Optional[float] = None) -> LLMError:
+    if status_code == 429:
+        cls = RateLimitError
+    elif status_code == 408:
+        cls = RequestTimeoutError
+    elif status_code >= 500:
+        cls = ServerError
+    else:
+        cls = ClientError
+    return cls(message, status_code=status_code, retry_after=retry_after)
@@ -0,0 +1,64 @@
+"""
+Hedged requests: after a delay, race a duplicate of a slow call and keep the first good answer.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Deque, List, Optional
+
+from provider import Provider
+from retry import RetryBudget
+
+
+class HedgePolicy:
+    """
+    delay: fixed seconds before hedging; None = adaptive, the `percentile` of recent
+        latencies (clamped to [min_delay, max_delay]) once min_samples are known.
+    budget / min_hedges: hedges may be at most min_hedges + budget x requests, so an
+        incident (everything slow) cannot double the load.
+    provider: where hedges go (default: the client's provider), e.g. another pool member.
+    """
+    def __init__(
+        self,
+        delay: Optional[float] = None,
+        *,
+        percentile: float = 0.95,
+        min_delay: float = 0.05,
+        max_delay: Optional[float] = None,
+        min_samples: int = 20,
+        window: int = 1000,
+        budget: float = 0.05,
+        min_hedges: int = 3,
+        provider: Optional[Provider] = None,
+    ):
+        self.fixed_delay = delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.provider = provider
+        self.budget = RetryBudget(budget, min_retries=min_hedges)
+        self.hedges = 0
+        self.wins = 0  # hedges that answered first
+        self.window = max(1, window)
+        self._latencies: Deque[float] = deque()  # arrival order, for eviction
+        self._sorted: List[float] = []  # the same samples, kept sorted for delay()
+
+    def record(self, latency: float) -> None:
+        if len(self._latencies) >= self.window:
+            old = self._latencies.popleft()
+            del self._sorted[bisect_left(self._sorted, old)]
+        self._latencies.append(latency)
+        insort(self._sorted, latency)
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None to not hedge this request."""
+        if self.fixed_delay is not None:
+            return self.fixed_delay
+        if len(self._latencies) < self.min_samples:
+            return self.max_delay
+        ordered = self._sorted
+        value = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+        value = max(self.min_delay, value)
+        return min(value, self.max_delay) if self.max_delay is not None else value
@@ -0,0 +1,122 @@
+"""
+Append-only JSONL checkpoint journal for long batch runs.
+
+Each successful response is stored under LLMRequest.cache_key(); a rerun with the
+same journal returns stored results instead of calling the provider again.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from dataclasses import replace
+from typing import Dict, List, Optional, Set
+
+from llm_response import LLMResponse
+
+
+class Journal:
+    """
+    path: JSONL file (created if missing, appended to otherwise).
+    flush_every: buffered records that trigger a write.
+    flush_interval: seconds after which a record triggers a write even if the buffer is small.
+    fsync: fsync after each write (durable against power loss, not just process death).
+    keep_raw: also store LLMResponse.raw (large; off by default).
+    """
+    def __init__(
+        self,
+        path: str,
+        *,
+        flush_every: int = 256,
+        flush_interval: float = 1.0,
+        fsync: bool = True,
+        keep_raw: bool = False,
+    ):
+        self.path = path
+        self.flush_every = max(1, int(flush_every))
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.keep_raw = keep_raw
+        self._index: Dict[str, int] = {}
+        self._pending: Dict[str, LLMResponse] = {}
+        self._lines: List[bytes] = []
+        self._last_flush = time.monotonic()
+        end = self._load()
+        self._fh = open(path, "ab")
+        if self._fh.tell() != end:
+            # drop a torn trailing line left by a crash mid-write
+            self._fh.truncate(end)
+            self._fh.seek(end)
+        self._reader = open(path, "rb")
+
+    def _load(self) -> int:
+        """Index existing records by key -> byte offset; returns the end of the last complete line."""
+        if not os.path.exists(self.path):
+            return 0
+        offset = 0
+        with open(self.path, "rb") as fh:
+            for line in fh:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    self._index[json.loads(line)["key"]] = offset
+                except (ValueError, KeyError):
+                    pass
+                offset += len(line)
+        return offset
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._pending or key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index) + len(self._pending)
+
+    def keys(self) -> Set[str]:
+        """Keys of every recorded response (a snapshot)."""
+        return set(self._index) | set(self._pending)
+
+    def get(self, key: str) -> Optional[LLMResponse]:
+        if key in self._pending:
+            return replace(self._pending[key])  # callers may mutate their copy
+        offset = self._index.get(key)
+        if offset is None:
+            return None
+        self._reader.seek(offset)
+        return LLMResponse.from_dict(json.loads(self._reader.readline())["response"])
+
+    def record(self, key: str, resp: LLMResponse) -> None:
+        if key in self:
+            return
+        d = resp.to_dict()
+        if not self.keep_raw:
+            d["raw"] = {}
+        self._pending[key] = resp
+        self._lines.append((json.dumps({"key": key, "response": d}, separators=(",", ":"), default=str) + "\n").encode("utf-8"))
+        if len(self._lines) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._lines:
+            return
+        offset = self._fh.tell()
+        self._fh.write(b"".join(self._lines))
+        self._fh.flush()
+        if self.fsync:
+            os.fsync(self._fh.fileno())
+        for key, line in zip(self._pending, self._lines):
+            self._index[key] = offset
+            offset += len(line)
+        self._pending.clear()
+        self._lines.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self._fh.close()
+        self._reader.close()
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,12 +1,37 @@
 from __future__ import annotations
+import hashlib
+import json
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
+from compat import SLOTS
 from msg import Msg
 
-@dataclass
+@dataclass(**SLOTS)
 class LLMRequest:
     messages: List[Msg]
     model: str
     temperature: float = 0.7
     max_output_tokens: Optional[int] = None
     extra: Dict[str, Any] = field(default_factory=dict)
+    # client-side options, not sent to the provider and not part of cache_key()
+    coalesce: bool = True
+    priority: int = 0  # higher is served first
+    deadline: Optional[float] = None  # time.time() after which the answer is no longer wanted
+    flow: Optional[str] = None  # fair-share group (BatchClient gives each batch its own)
+
+    def cache_key(self) -> str:
+        """Stable content hash of everything that is sent to the provider."""
+        canon = json.dumps(
+            {
+                "model": self.model,
+                "messages": [[m.role, m.content] for m in self.messages],
+                "temperature": self.temperature,
+                "max_output_tokens": self.max_output_tokens,
+                "extra": self.extra,
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(canon.encode("utf-8")).hexdigest()
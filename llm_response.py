@@ -1,9 +1,13 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from typing import Any, Dict, Optional
+from compat import SLOTS
 from usage import Usage
+from rate_limit_info import RateLimitInfo
+from errors import LLMError
+from timing import RequestTiming
 
-@dataclass
+@dataclass(**SLOTS)
 class LLMResponse:
     provider: str
     model: str
@@ -11,3 +15,26 @@ class LLMResponse:
     raw: Dict[str, Any]
     usage: Usage = field(default_factory=Usage)
     error: Optional[str] = None
+    status_code: Optional[int] = None
+    rate_limit: Optional[RateLimitInfo] = None
+    exception: Optional[LLMError] = None
+    timing: Optional[RequestTiming] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d.pop("exception")  # the error string is the serializable form
+        return d
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "LLMResponse":
+        return cls(
+            provider=d["provider"],
+            model=d["model"],
+            content=d["content"],
+            raw=d.get("raw") or {},
+            usage=Usage(**(d.get("usage") or {})),
+            error=d.get("error"),
+            status_code=d.get("status_code"),
+            rate_limit=RateLimitInfo(**d["rate_limit"]) if d.get("rate_limit") else None,
+            timing=RequestTiming(**d["timing"]) if d.get("timing") else None,
+        )
@@ -1,10 +1,11 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from typing import Literal
+from compat import SLOTS
 
 Role = Literal["system", "user", "assistant"]
 
-@dataclass
+@dataclass(**SLOTS)
 class Msg:
     role: Role
     content: str
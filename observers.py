@@ -0,0 +1,191 @@
+"""
+Observer hooks for BatchClient: metrics (with a Prometheus text exporter) and tracing spans.
+"""
+from __future__ import annotations
+
+import math
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from llm_request import LLMRequest
+from llm_response import LLMResponse
+
+# seconds; the Prometheus client defaults stretched to LLM latencies
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# RequestTiming field -> histogram name
+_TIMINGS = {
+    "total": "batchcal_request_seconds",
+    "queue_wait": "batchcal_queue_wait_seconds",
+    "limiter_wait": "batchcal_limiter_wait_seconds",
+    "network": "batchcal_network_seconds",
+    "parse": "batchcal_parse_seconds",
+    "validate": "batchcal_validate_seconds",
+    "backoff": "batchcal_backoff_seconds",
+}
+
+
+class Observer:
+    """
+    Base class for BatchClient observers; override any subset of the hooks.
+    Hooks run inline on the event loop, so keep them cheap and non-blocking.
+    """
+    def on_start(self, req: LLMRequest) -> None:
+        """A request is about to be sent (cache/journal hits never get here)."""
+
+    def on_attempt(self, req: LLMRequest, attempt: int, resp: LLMResponse) -> None:
+        """One provider attempt finished (resp.error is set if it failed)."""
+
+    def on_end(self, req: LLMRequest, resp: LLMResponse) -> None:
+        """The request is final; resp.timing holds its breakdown."""
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n: int):
+        self.counts = [0] * n
+        self.sum = 0.0
+        self.count = 0
+
+
+class MetricsObserver(Observer):
+    """
+    In-process counters and latency histograms, labelled by provider and model.
+    `render_prometheus()` returns the text exposition format for a /metrics endpoint.
+    """
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.in_flight = 0
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], _Histogram] = {}
+
+    def _inc(self, name: str, labels: Tuple[Tuple[str, str], ...], by: float = 1.0) -> None:
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0.0) + by
+
+    def observe(self, name: str, labels: Tuple[Tuple[str, str], ...], value: float) -> None:
+        h = self.histograms.get((name, labels))
+        if h is None:
+            h = self.histograms[(name, labels)] = _Histogram(len(self.buckets) + 1)
+        h.counts[bisect_left(self.buckets, value)] += 1
+        h.sum += value
+        h.count += 1
+
+    def on_start(self, req: LLMRequest) -> None:
+        self.in_flight += 1
+
+    def on_attempt(self, req: LLMRequest, attempt: int, resp: LLMResponse) -> None:
+        labels = (("provider", resp.provider), ("model", req.model))
+        self._inc("batchcal_attempts_total", labels)
+        if resp.error:
+            kind = type(resp.exception).__name__ if resp.exception is not None else "Error"
+            self._inc("batchcal_errors_total", labels + (("type", kind),))
+
+    def on_end(self, req: LLMRequest, resp: LLMResponse) -> None:
+        self.in_flight -= 1
+        labels = (("provider", resp.provider), ("model", req.model))
+        self._inc("batchcal_requests_total", labels + (("outcome", "error" if resp.error else "ok"),))
+        if resp.usage.input_tokens:
+            self._inc("batchcal_tokens_total", labels + (("kind", "input"),), resp.usage.input_tokens)
+        if resp.usage.output_tokens:
+            self._inc("batchcal_tokens_total", labels + (("kind", "output"),), resp.usage.output_tokens)
+        t = resp.timing
+        if t is not None:
+            for field_name, metric in _TIMINGS.items():
+                self.observe(metric, labels, getattr(t, field_name))
+            if t.ttft is not None:
+                self.observe("batchcal_ttft_seconds", labels, t.ttft)
+
+    def counter(self, name: str, **labels: str) -> float:
+        """Sum of a counter over every label set that includes `labels`."""
+        want = set(labels.items())
+        return sum(v for (n, ls), v in self.counters.items() if n == name and want <= set(ls))
+
+    def render_prometheus(self) -> str:
+        out: List[str] = [
+            "# HELP batchcal_in_flight Requests currently being processed.",
+            "# TYPE batchcal_in_flight gauge",
+            f"batchcal_in_flight {self.in_flight}",
+        ]
+        for name in sorted({n for n, _ in self.counters}):
+            out.append(f"# TYPE {name} counter")
+            for (n, labels), v in sorted(self.counters.items()):
+                if n == name:
+                    out.append(f"{name}{_labels(labels)} {_num(v)}")
+        for name in sorted({n for n, _ in self.histograms}):
+            out.append(f"# TYPE {name} histogram")
+            for (n, labels), h in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, c in zip(self.buckets + (math.inf,), h.counts):
+                    cumulative += c
+                    out.append(f"{name}_bucket{_labels(labels + (('le', _num(bound)),))} {cumulative}")
+                out.append(f"{name}_sum{_labels(labels)} {_num(h.sum)}")
+                out.append(f"{name}_count{_labels(labels)} {h.count}")
+        return "\n".join(out) + "\n"
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels)
+    return "{" + body + "}"
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(int(v)) if float(v).is_integer() else repr(v)
+
+
+class SpanObserver(Observer):
+    """
+    One span per request through an OpenTelemetry-style tracer: anything with
+    `start_span(name, attributes=...)` returning spans that support
+    `set_attribute`, `add_event` and `end` (an `opentelemetry.trace.Tracer` works).
+    Attempts become span events; the timing breakdown becomes span attributes.
+    """
+    def __init__(self, tracer: Any, name: str = "batchcal.request"):
+        self.tracer = tracer
+        self.name = name
+        self._spans: Dict[int, Any] = {}
+
+    def on_start(self, req: LLMRequest) -> None:
+        self._spans[id(req)] = self.tracer.start_span(self.name, attributes={"llm.model": req.model})
+
+    def on_attempt(self, req: LLMRequest, attempt: int, resp: LLMResponse) -> None:
+        span = self._spans.get(id(req))
+        if span is None:
+            return
+        attrs: Dict[str, Any] = {"attempt": attempt}
+        if resp.status_code is not None:
+            attrs["http.status_code"] = resp.status_code
+        if resp.error:
+            attrs["error"] = resp.error
+        span.add_event("attempt", attributes=attrs)
+
+    def on_end(self, req: LLMRequest, resp: LLMResponse) -> None:
+        span: Optional[Any] = self._spans.pop(id(req), None)
+        if span is None:
+            return
+        span.set_attribute("llm.provider", resp.provider)
+        if resp.usage.total_tokens is not None:
+            span.set_attribute("llm.usage.total_tokens", resp.usage.total_tokens)
+        t = resp.timing
+        if t is not None:
+            for field_name in ("queue_wait", "limiter_wait", "network", "parse", "validate", "backoff", "total"):
+                span.set_attribute(f"batchcal.{field_name}_s", getattr(t, field_name))
+            span.set_attribute("batchcal.attempts", t.attempts)
+            if t.ttft is not None:
+                span.set_attribute("batchcal.ttft_s", t.ttft)
+        if resp.error:
+            span.set_attribute("error", True)
+            if resp.exception is not None and hasattr(span, "record_exception"):
+                span.record_exception(resp.exception)
+        span.end()
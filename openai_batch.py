@@ -0,0 +1,158 @@
+"""
+OpenAI Batch API helpers: JSONL upload, job creation, polling and result download.
+
+Used by OpenAIProvider.submit_batch / collect_batch.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import httpx
+
+from batch_job import BatchJob
+from compat import json_loads
+from llm_request import LLMRequest
+from llm_response import LLMResponse
+
+if TYPE_CHECKING:
+    from openai_provider import OpenAIProvider
+
+# Documented Batch API input file limits
+MAX_REQUESTS_PER_FILE = 50_000
+MAX_BYTES_PER_FILE = 200 * 1024 * 1024
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def _lines(provider: "OpenAIProvider", reqs: Sequence[LLMRequest]) -> Iterator[bytes]:
+    for i, req in enumerate(reqs):
+        line = {"custom_id": str(i), "method": "POST", "url": "/v1/responses", "body": provider._payload(req)}
+        yield (json.dumps(line, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _chunk(
+    lines: Iterator[bytes], max_requests: int, max_bytes: int
+) -> Iterator[Tuple[int, List[bytes]]]:
+    """Group encoded lines into (offset, lines) chunks that respect both per-file limits."""
+    offset, size = 0, 0
+    buf: List[bytes] = []
+    for line in lines:
+        if len(line) > max_bytes:
+            raise ValueError(f"request {offset + len(buf)} is larger than max_bytes_per_file")
+        if buf and (len(buf) >= max_requests or size + len(line) > max_bytes):
+            yield offset, buf
+            offset += len(buf)
+            buf, size = [], 0
+        buf.append(line)
+        size += len(line)
+    if buf:
+        yield offset, buf
+
+
+async def submit_batch(
+    provider: "OpenAIProvider",
+    reqs: Sequence[LLMRequest],
+    *,
+    max_requests_per_file: int = MAX_REQUESTS_PER_FILE,
+    max_bytes_per_file: int = MAX_BYTES_PER_FILE,
+    completion_window: str = "24h",
+) -> BatchJob:
+    client = provider._client
+    job = BatchJob(size=len(reqs))
+    try:
+        for offset, chunk in _chunk(_lines(provider, reqs), max_requests_per_file, max_bytes_per_file):
+            up = await client.post(
+                "/files",
+                data={"purpose": "batch"},
+                files={"file": (f"batchcal-{offset}.jsonl", b"".join(chunk), "application/jsonl")},
+            )
+            up.raise_for_status()
+            r = await client.post(
+                "/batches",
+                json={
+                    "input_file_id": up.json()["id"],
+                    "endpoint": "/v1/responses",
+                    "completion_window": completion_window,
+                },
+            )
+            r.raise_for_status()
+            job.batch_ids.append(r.json()["id"])
+            job.offsets.append(offset)
+    except BaseException:
+        # a half-submitted job cannot be collected: don't leave its parts running (and billing)
+        await _cancel(client, job.batch_ids)
+        raise
+    return job
+
+
+async def _cancel(client: httpx.AsyncClient, batch_ids: Sequence[str]) -> None:
+    """Best-effort cancel of already created batches."""
+    for batch_id in batch_ids:
+        try:
+            await client.post(f"/batches/{batch_id}/cancel")
+        except httpx.HTTPError:
+            pass
+
+
+async def _wait(
+    client: httpx.AsyncClient, batch_id: str, poll_interval: float, max_poll_interval: float, deadline: Optional[float]
+) -> Dict[str, Any]:
+    delay = poll_interval
+    while True:
+        r = await client.get(f"/batches/{batch_id}")
+        r.raise_for_status()
+        info = r.json()
+        if info.get("status") in TERMINAL_STATUSES:
+            return info
+        if deadline is not None and time.monotonic() + delay > deadline:
+            raise TimeoutError(f"batch {batch_id} not finished (status={info.get('status')})")
+        await asyncio.sleep(delay)
+        delay = min(max_poll_interval, delay * 2)
+
+
+async def _read_file(provider: "OpenAIProvider", file_id: str, out: List[Optional[LLMResponse]]) -> None:
+    async with provider._client.stream("GET", f"/files/{file_id}/content") as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.strip():
+                continue
+            item = json_loads(line)
+            idx = int(item["custom_id"])
+            resp = item.get("response") or {}
+            body = resp.get("body") or {}
+            model = body.get("model", "")
+            status = resp.get("status_code")
+            if item.get("error") or (status is not None and status >= 400):
+                err = item.get("error") or body.get("error") or {"status_code": status}
+                msg = str(err.get("message", err)) if isinstance(err, dict) else str(err)
+                out[idx] = LLMResponse(provider=provider.name, model=model, content="", raw=item, error=msg)
+            else:
+                out[idx] = provider._parse(model, body)
+
+
+async def collect_batch(
+    provider: "OpenAIProvider",
+    job: BatchJob,
+    *,
+    poll_interval: float = 5.0,
+    max_poll_interval: float = 60.0,
+    timeout: Optional[float] = None,
+) -> List[LLMResponse]:
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    out: List[Optional[LLMResponse]] = [None] * job.size
+    bounds = list(job.offsets[1:]) + [job.size]
+    for batch_id, start, end in zip(job.batch_ids, job.offsets, bounds):
+        info = await _wait(provider._client, batch_id, poll_interval, max_poll_interval, deadline)
+        for key in ("output_file_id", "error_file_id"):
+            file_id = info.get(key)
+            if file_id:
+                await _read_file(provider, file_id, out)
+        # expired/cancelled/failed jobs may leave some requests without any output line
+        for i in range(start, end):
+            if out[i] is None:
+                msg = f"missing from batch output (batch {batch_id} status: {info.get('status')})"
+                out[i] = LLMResponse(provider=provider.name, model="", content="", raw=info, error=msg)
+    return out  # type: ignore[return-value]
@@ -1,30 +1,185 @@
 from __future__ import annotations
+import asyncio
 import os
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Sequence, Union
 import httpx
 from provider import Provider
 from llm_request import LLMRequest
 from llm_response import LLMResponse
 from usage import Usage
+from rate_limit_info import RateLimitInfo
+from errors import RequestTimeoutError, ResponseFormatError, ServerError, error_for_status, parse_retry_after
+from batch_job import BatchJob
+from timing import RequestTiming
+from compat import json_loads
+from streaming import ResponseStream, decode, sse_events
+import openai_batch
+
+Retain = Literal["full", "fields", "none"]
+
+# what retain="fields" keeps of a successful reply (the text is already in .content)
+DEFAULT_RAW_FIELDS = ("id", "model", "status", "usage")
 
 class OpenAIProvider(Provider):
+    """
+    retain: how much of the decoded reply ends up in LLMResponse.raw:
+        "full" (everything), "fields" (only `raw_fields`) or "none" (an empty dict).
+        For large batches "fields"/"none" avoid holding every reply's JSON twice.
+    limits: connection pool limits. By default the pool is sized from the
+        concurrency of the BatchClient using this provider (see size_pool), so
+        every in-flight call can keep its connection alive between requests.
+    http2: multiplex requests over a few connections (needs `batchcal[http2]`).
+    keepalive_expiry: seconds an idle pooled connection is kept open.
+    transport: custom or shared transport; one `httpx.AsyncHTTPTransport` can be
+        shared by several providers (limits/http2 are then the transport's own,
+        and aclose() leaves it open for the other users).
+
+    The HTTP client is created on first use; use `async with provider:` or
+    `await provider.aclose()` to close its connections.
+    """
     name = "openai"
 
-    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://api.openai.com/v1"):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = "https://api.openai.com/v1",
+        *,
+        transport: httpx.AsyncBaseTransport | None = None,
+        retain: Retain = "full",
+        raw_fields: Sequence[str] = DEFAULT_RAW_FIELDS,
+        limits: httpx.Limits | None = None,
+        http2: bool = False,
+        keepalive_expiry: float = 30.0,
+    ):
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         if not self.api_key:
             raise RuntimeError("OPENAI_API_KEY not set")
+        if retain not in ("full", "fields", "none"):
+            raise ValueError(f"retain must be 'full', 'fields' or 'none', not {retain!r}")
+        if http2 and transport is None:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                raise ImportError("http2=True needs the h2 package: pip install batchcal[http2]") from None
         self.base_url = base_url.rstrip("/")
-        self._client = httpx.AsyncClient(
+        self.retain = retain
+        self.raw_fields = tuple(raw_fields)
+        self.limits = limits
+        self.http2 = http2
+        self.keepalive_expiry = keepalive_expiry
+        self._transport = transport
+        self._pool_size: Optional[int] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def _client(self) -> httpx.AsyncClient:
+        try:
+            loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if self._http is None or (loop is not None and self._http_loop not in (None, loop)):
+            # pooled connections belong to the loop that opened them; a provider reused
+            # across asyncio.run() calls gets a fresh client on the new loop
+            if self._http is not None:
+                self._retire(self._http, self._http_loop)
+            self._http = self._build_client()
+            self._http_loop = loop
+        elif self._http_loop is None:
+            self._http_loop = loop
+        return self._http
+
+    def _retire(self, http: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """
+        Close a client left behind on another loop. Only possible while that loop is
+        still open; after asyncio.run() has returned its sockets can no longer be closed
+        cleanly, so call aclose() (or use BatchClient as a context manager) before then.
+        """
+        if self._transport is not None or loop is None or loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(http.aclose(), loop)
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = self.limits
+        if limits is None and self._pool_size is not None:
+            limits = httpx.Limits(
+                max_connections=self._pool_size,
+                max_keepalive_connections=self._pool_size,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+        elif limits is None:
+            limits = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=self.keepalive_expiry)
+        # Content-Type is set per request (json= / files=) so uploads can use multipart
+        return httpx.AsyncClient(
             base_url=self.base_url,
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            },
+            headers={"Authorization": f"Bearer {self.api_key}"},
             timeout=None,
+            transport=self._transport,
+            limits=limits,
+            http2=self.http2,
         )
 
-    async def acomplete(self, req: LLMRequest, *, timeout: float = 60.0) -> LLMResponse:
+    def size_pool(self, concurrency: int) -> None:
+        """
+        Keep up to `concurrency` connections alive (BatchClient calls this with its
+        concurrency cap, doubled when it hedges). Several clients sharing a provider get
+        the largest size any of them asked for. Ignored when explicit limits were given
+        or the client already exists.
+        """
+        if self._http is None:
+            self._pool_size = max(self._pool_size or 0, int(concurrency), 1)
+
+    async def warmup(self, connections: int = 1) -> int:
+        """
+        Open up to `connections` pooled connections ahead of a batch, so connects and
+        TLS handshakes are not on the first requests' critical path. Uses a cheap
+        GET /models per connection; returns how many connections answered.
+        """
+        if self.http2:
+            connections = 1  # one multiplexed connection carries everything
+
+        async def _one() -> bool:
+            try:
+                await self._client.get("/models", timeout=10.0)
+                return True
+            except httpx.HTTPError:
+                return False
+
+        return sum(await asyncio.gather(*(_one() for _ in range(max(1, connections)))))
+
+    async def aclose(self) -> None:
+        http, loop = self._http, self._http_loop
+        self._http = self._http_loop = None
+        if http is None:
+            return
+        if self._transport is None and loop in (None, asyncio.get_running_loop()):
+            await http.aclose()
+        # a caller-supplied (possibly shared) transport is closed by its owner
+
+    async def __aenter__(self) -> "OpenAIProvider":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Picklable for worker processes: the receiver builds its own client and pool
+        # (a custom transport is not carried over).
+        return {
+            "api_key": self.api_key,
+            "base_url": self.base_url,
+            "retain": self.retain,
+            "raw_fields": self.raw_fields,
+            "limits": self.limits,
+            "http2": self.http2,
+            "keepalive_expiry": self.keepalive_expiry,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)
+
+    def _payload(self, req: LLMRequest) -> Dict[str, Any]:
         payload: Dict[str, Any] = {
             "model": req.model,
             "input": [{"role": m.role, "content": m.content} for m in req.messages],
@@ -33,24 +188,131 @@ class OpenAIProvider(Provider):
         if req.max_output_tokens is not None:
             payload["max_output_tokens"] = req.max_output_tokens
         payload.update(req.extra)
+        return payload
+
+    def _parse(self, model: str, data: Dict[str, Any]) -> LLMResponse:
+        text_parts: List[str] = []
+        for out in data.get("output", []):
+            if out.get("type") == "message":
+                for c in out["content"]:
+                    if c.get("type") == "output_text":
+                        text_parts.append(c.get("text", ""))
+        content = "".join(text_parts).strip()
+        usage = Usage(
+            input_tokens=(data.get("usage", {}) or {}).get("input_tokens"),
+            output_tokens=(data.get("usage", {}) or {}).get("output_tokens"),
+            total_tokens=(data.get("usage", {}) or {}).get("total_tokens"),
+        )
+        return LLMResponse(provider=self.name, model=model, content=content, raw=self._retained(data), usage=usage)
+
+    def _retained(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        if self.retain == "full":
+            return data
+        if self.retain == "none":
+            return {}
+        return {k: data[k] for k in self.raw_fields if k in data}
+
+    async def acomplete(self, req: LLMRequest, *, timeout: float = 60.0) -> LLMResponse:
+        payload = self._payload(req)
         try:
             r = await self._client.post("/responses", json=payload, timeout=timeout)
             r.raise_for_status()
-            data = r.json()
-            text_parts: List[str] = []
-            for out in data.get("output", []):
-                if out.get("type") == "message":
-                    for c in out["content"]:
-                        if c.get("type") == "output_text":
-                            text_parts.append(c.get("text", ""))
-            content = "".join(text_parts).strip()
-            usage = Usage(
-                input_tokens=(data.get("usage", {}) or {}).get("input_tokens"),
-                output_tokens=(data.get("usage", {}) or {}).get("output_tokens"),
-                total_tokens=(data.get("usage", {}) or {}).get("total_tokens"),
+            start = time.perf_counter()
+            resp = self._parse(req.model, json_loads(r.content))
+            # only the decode split is reported; BatchClient measures the call as a whole
+            resp.timing = RequestTiming(parse=time.perf_counter() - start)
+            resp.status_code = r.status_code
+            resp.rate_limit = RateLimitInfo.from_headers(r.headers)
+            return resp
+        except Exception as e:
+            return self._error(req, e)
+
+    def _error(self, req: LLMRequest, e: Exception) -> LLMResponse:
+        if isinstance(e, httpx.HTTPStatusError):
+            return LLMResponse(
+                provider=self.name,
+                model=req.model,
+                content="",
+                raw={"error": str(e), "body": getattr(e.response, "text", None)},
+                error=str(e),
+                status_code=e.response.status_code,
+                rate_limit=RateLimitInfo.from_headers(e.response.headers),
+                exception=error_for_status(e.response.status_code, str(e), parse_retry_after(e.response.headers)),
             )
-            return LLMResponse(provider=self.name, model=req.model, content=content, raw=data, usage=usage)
-        except httpx.HTTPStatusError as e:
-            return LLMResponse(provider=self.name, model=req.model, content="", raw={"error": str(e), "body": getattr(e.response, "text", None)}, error=str(e))
+        if isinstance(e, httpx.TimeoutException):
+            return LLMResponse(provider=self.name, model=req.model, content="", raw={"error": str(e)}, error=str(e) or "timeout", exception=RequestTimeoutError(str(e)))
+        if isinstance(e, httpx.TransportError):
+            # connection reset, DNS, protocol errors: the provider may be fine on the next try
+            return LLMResponse(provider=self.name, model=req.model, content="", raw={"error": str(e)}, error=str(e), exception=ServerError(str(e)))
+        # undecodable body or an unexpected reply shape: the same call would fail again
+        err = ResponseFormatError(f"{type(e).__name__}: {e}")
+        return LLMResponse(provider=self.name, model=req.model, content="", raw={"error": str(e)}, error=str(err), exception=err)
+
+    def astream(self, req: LLMRequest, *, timeout: float = 60.0) -> ResponseStream:
+        """Stream the answer as server-sent events; see ResponseStream."""
+        return ResponseStream(self._events(req, timeout))
+
+    async def _events(self, req: LLMRequest, timeout: float) -> AsyncIterator[Union[str, LLMResponse]]:
+        payload = self._payload(req)
+        payload["stream"] = True
+        try:
+            async with self._client.stream("POST", "/responses", json=payload, timeout=timeout) as r:
+                if r.status_code >= 400:
+                    await r.aread()
+                r.raise_for_status()
+                rate_limit = RateLimitInfo.from_headers(r.headers)
+                async for _, data in sse_events(r.aiter_lines()):
+                    if data == "[DONE]":
+                        break
+                    ev = decode(data)
+                    kind = ev.get("type", "")
+                    if kind == "response.output_text.delta":
+                        yield ev.get("delta", "")
+                    elif kind in ("response.completed", "response.incomplete"):
+                        resp = self._parse(req.model, ev.get("response") or {})
+                        resp.status_code = r.status_code
+                        resp.rate_limit = rate_limit
+                        yield resp
+                        return
+                    elif kind in ("response.failed", "error"):
+                        err = (ev.get("response") or {}).get("error") or ev
+                        msg = str(err.get("message") or err) if isinstance(err, dict) else str(err)
+                        yield LLMResponse(provider=self.name, model=req.model, content="", raw={"error": err}, error=msg, status_code=r.status_code, rate_limit=rate_limit, exception=ServerError(msg))
+                        return
+            raise httpx.RemoteProtocolError("stream ended before response.completed")
         except Exception as e:
-            return LLMResponse(provider=self.name, model=req.model, content="", raw={"error": str(e)}, error=str(e))
+            yield self._error(req, e)
+
+    async def submit_batch(
+        self,
+        reqs: Sequence[LLMRequest],
+        *,
+        max_requests_per_file: int = openai_batch.MAX_REQUESTS_PER_FILE,
+        max_bytes_per_file: int = openai_batch.MAX_BYTES_PER_FILE,
+        completion_window: str = "24h",
+    ) -> BatchJob:
+        """Upload reqs as one or more Batch API jobs (split on the per-file limits)."""
+        return await openai_batch.submit_batch(
+            self,
+            reqs,
+            max_requests_per_file=max_requests_per_file,
+            max_bytes_per_file=max_bytes_per_file,
+            completion_window=completion_window,
+        )
+
+    async def collect_batch(
+        self,
+        job: BatchJob,
+        *,
+        poll_interval: float = 5.0,
+        max_poll_interval: float = 60.0,
+        timeout: Optional[float] = None,
+    ) -> List[LLMResponse]:
+        """Poll until every job in `job` is finished; results are in submission order."""
+        return await openai_batch.collect_batch(
+            self,
+            job,
+            poll_interval=poll_interval,
+            max_poll_interval=max_poll_interval,
+            timeout=timeout,
+        )
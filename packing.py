@@ -0,0 +1,145 @@
+"""
+Micro-batching: pack several small compatible prompts into one provider call and split the answer.
+"""
+from __future__ import annotations
+
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from compat import json_loads
+from llm_request import LLMRequest
+from llm_response import LLMResponse
+from msg import Msg
+from usage import Usage
+
+CONTRACT = (
+    "You will receive {n} independent items as a JSON array of {{\"id\", \"input\"}} objects. "
+    "Handle each item on its own, as if it were the only input, following the instructions above. "
+    "Reply with only a JSON object that maps every item id (as a string) to that item's answer, "
+    "for example {{\"1\": \"...\", \"2\": \"...\"}}. No text outside the JSON object."
+)
+
+
+class Packer:
+    """
+    Packing policy for BatchClient(pack=...).
+
+    Requests are compatible when they share model, temperature, max_output_tokens,
+    extra and their system messages, and end in a single user message. Up to
+    `max_items` of them (and at most `max_prompt_tokens` of estimated input) are sent
+    as one call that asks for a JSON object keyed by item id. A pack is sent when it is
+    full or `linger` seconds after its first item arrived.
+
+    Items whose answer is missing, unparsable or rejected by `validate`, and every item
+    of a pack the provider rejects with a ClientError (e.g. too long), are re-sent on
+    their own. Usage is prorated: input by prompt length, output by answer length.
+    """
+    def __init__(
+        self,
+        max_items: int = 16,
+        *,
+        max_prompt_tokens: int = 4000,
+        linger: float = 0.02,
+        instructions: str = CONTRACT,
+        chars_per_token: float = 4.0,
+    ):
+        self.max_items = max(1, int(max_items))
+        self.max_prompt_tokens = max_prompt_tokens
+        self.linger = linger
+        self.instructions = instructions
+        self.chars_per_token = chars_per_token
+        self.calls = 0  # packed provider calls
+        self.items = 0  # items answered from a packed call
+        self.redispatched = 0  # items re-sent on their own
+
+    def key(self, req: LLMRequest) -> Optional[Tuple[Any, ...]]:
+        """Compatibility key, or None when the request cannot be packed."""
+        msgs = req.messages
+        if not msgs or msgs[-1].role != "user" or any(m.role != "system" for m in msgs[:-1]):
+            return None
+        extra = json.dumps(req.extra, sort_keys=True, default=str)
+        return (req.model, req.temperature, req.max_output_tokens, extra, tuple(m.content for m in msgs[:-1]))
+
+    def estimate(self, req: LLMRequest) -> int:
+        return math.ceil(len(req.messages[-1].content) / self.chars_per_token)
+
+    def build(self, reqs: Sequence[LLMRequest]) -> LLMRequest:
+        first = reqs[0]
+        system = "\n\n".join(m.content for m in first.messages[:-1])
+        contract = self.instructions.format(n=len(reqs))
+        items = [{"id": str(i + 1), "input": r.messages[-1].content} for i, r in enumerate(reqs)]
+        max_out = None
+        if first.max_output_tokens is not None:
+            # every item's allowance, plus the JSON framing around each answer
+            max_out = len(reqs) * (first.max_output_tokens + 8)
+        return LLMRequest(
+            messages=[Msg.system(f"{system}\n\n{contract}" if system else contract), Msg.user(json.dumps(items, ensure_ascii=False))],
+            model=first.model,
+            temperature=first.temperature,
+            max_output_tokens=max_out,
+            extra=first.extra,
+            coalesce=False,
+            # the pack is as urgent as its most urgent item
+            priority=max(r.priority for r in reqs),
+            deadline=min((r.deadline for r in reqs if r.deadline is not None), default=None),
+            flow=first.flow,
+        )
+
+    def unpack(self, resp: LLMResponse, reqs: Sequence[LLMRequest]) -> List[Optional[LLMResponse]]:
+        """Per-item responses in `reqs` order; None for items without a usable answer."""
+        answers = _answers(resp.content)
+        texts: List[Optional[str]] = []
+        for i in range(len(reqs)):
+            value = answers.get(str(i + 1))
+            if value is None:
+                texts.append(None)
+            else:
+                texts.append(value if isinstance(value, str) else json.dumps(value, ensure_ascii=False))
+        ins = _prorate(resp.usage.input_tokens, [len(r.messages[-1].content) + 1 for r in reqs])
+        outs = _prorate(resp.usage.output_tokens, [len(t or "") + 1 for t in texts])
+        out: List[Optional[LLMResponse]] = []
+        for i, text in enumerate(texts):
+            if text is None:
+                out.append(None)
+                continue
+            total = ins[i] + outs[i] if ins[i] is not None and outs[i] is not None else None
+            out.append(LLMResponse(
+                provider=resp.provider,
+                model=resp.model,
+                content=text,
+                raw={"packed": len(reqs), "index": i},
+                usage=Usage(ins[i], outs[i], total),
+                status_code=resp.status_code,
+                rate_limit=resp.rate_limit,
+            ))
+        return out
+
+
+def _answers(content: str) -> Dict[str, Any]:
+    text = content.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    try:
+        data = json_loads(text)
+    except (ValueError, TypeError):
+        return {}
+    if isinstance(data, dict):
+        return {str(k): v for k, v in data.items()}
+    if isinstance(data, list):  # [{"id": ..., "answer": ...}] is accepted too
+        return {str(d.get("id")): d.get("answer") for d in data if isinstance(d, dict)}
+    return {}
+
+
+def _prorate(total: Optional[int], weights: Sequence[int]) -> List[Optional[int]]:
+    """Split an integer total in proportion to weights (largest remainder, sums to total)."""
+    if total is None:
+        return [None] * len(weights)
+    scale = sum(weights)
+    shares = [total * w / scale for w in weights]
+    out = [int(s) for s in shares]
+    by_remainder = sorted(range(len(shares)), key=lambda i: shares[i] - out[i], reverse=True)
+    for i in by_remainder[: total - sum(out)]:
+        out[i] += 1
+    return out
@@ -1,8 +1,25 @@
 from __future__ import annotations
-from typing import Protocol
+from typing import TYPE_CHECKING, List, Protocol, Sequence, runtime_checkable
 from llm_request import LLMRequest
 from llm_response import LLMResponse
+from batch_job import BatchJob
+
+if TYPE_CHECKING:
+    from streaming import ResponseStream
 
 class Provider(Protocol):
     name: str
     async def acomplete(self, req: LLMRequest, *, timeout: float = 60.0) -> LLMResponse: ...
+
+@runtime_checkable
+class BatchJobProvider(Protocol):
+    """Provider with an offline batch endpoint (cheaper, separate quota, hours of latency)."""
+    name: str
+    async def submit_batch(self, reqs: Sequence[LLMRequest]) -> BatchJob: ...
+    async def collect_batch(self, job: BatchJob) -> List[LLMResponse]: ...
+
+@runtime_checkable
+class StreamingProvider(Protocol):
+    """Provider that can stream an answer token by token (see streaming.ResponseStream)."""
+    name: str
+    def astream(self, req: LLMRequest, *, timeout: float = 60.0) -> "ResponseStream": ...
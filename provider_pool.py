@@ -0,0 +1,175 @@
+"""
+Provider pool: spread requests over several providers/keys/endpoints with failover.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from typing import List, Optional, Sequence, Union
+
+from errors import RateLimitError, RequestTimeoutError, ServerError
+from llm_request import LLMRequest
+from llm_response import LLMResponse
+from provider import Provider
+from rate_limit_info import RateLimitInfo
+from token_bucket import RateLimiter, TokenBucketLimiter
+
+# Errors that say "this member, right now" rather than "this request"
+_FAILOVER = (RateLimitError, ServerError, RequestTimeoutError)
+
+
+def _fail_over(resp: LLMResponse) -> bool:
+    # untyped errors (custom providers) are treated as member trouble too
+    return isinstance(resp.exception, _FAILOVER) or bool(resp.error and resp.exception is None)
+
+
+class PoolMember:
+    """
+    One provider in a ProviderPool with its own quota.
+
+    weight: relative share of traffic when all members are healthy.
+    qps / burst / limiter: this member's rate limit.
+    max_concurrency: this member's in-flight cap.
+    cooldown: seconds a member is skipped after a rate-limit/server error without Retry-After.
+    """
+    def __init__(
+        self,
+        provider: Provider,
+        *,
+        weight: float = 1.0,
+        qps: Optional[float] = None,
+        burst: Optional[float] = None,
+        limiter: RateLimiter | None = None,
+        max_concurrency: int = 8,
+        cooldown: float = 5.0,
+        name: Optional[str] = None,
+    ):
+        self.provider = provider
+        self.name = name or provider.name
+        self.weight = weight
+        self.limiter: RateLimiter | None = limiter or (TokenBucketLimiter(qps, burst) if qps else None)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.sema = asyncio.Semaphore(self.max_concurrency)
+        size_pool = getattr(provider, "size_pool", None)
+        if size_pool is not None:
+            size_pool(self.max_concurrency)
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.latency: Optional[float] = None  # EWMA of successful calls
+        self.rate_limit: Optional[RateLimitInfo] = None
+        self.cooldown_until = 0.0
+
+    def score(self, now: float) -> float:
+        if now < self.cooldown_until:
+            return 0.0
+        s = self.weight * max(0.05, 1.0 - self.in_flight / self.max_concurrency)
+        info = self.rate_limit
+        if info is not None and info.limit_requests and info.remaining_requests is not None:
+            s *= max(0.05, info.remaining_requests / info.limit_requests)
+        if info is not None and info.limit_tokens and info.remaining_tokens is not None:
+            s *= max(0.05, info.remaining_tokens / info.limit_tokens)
+        if self.latency is not None:
+            s /= 0.05 + self.latency
+        return s
+
+    async def acomplete(self, req: LLMRequest, *, timeout: float = 60.0) -> LLMResponse:
+        async with self.sema:
+            self.in_flight += 1
+            try:
+                if self.limiter is not None:
+                    await self.limiter.acquire()
+                start = time.monotonic()
+                resp = await self.provider.acomplete(req, timeout=timeout)
+            finally:
+                self.in_flight -= 1
+        if resp.rate_limit is not None:
+            self.rate_limit = resp.rate_limit
+        if isinstance(resp.exception, _FAILOVER):
+            pause = resp.exception.retry_after if resp.exception.retry_after is not None else self.cooldown
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + pause)
+        elif not resp.error:
+            took = time.monotonic() - start
+            self.latency = took if self.latency is None else self.latency + 0.2 * (took - self.latency)
+        return resp
+
+
+class ProviderPool:
+    """
+    Provider that routes each request to one member, picked at random in proportion to
+    weight x free concurrency x remaining quota (x-ratelimit headers) / observed latency.
+    Rate-limit, server and timeout errors put the member in cooldown and the request is
+    retried on another member, so aggregate throughput is the sum of member quotas.
+    When every member is cooling down, no member is called before its cooldown ends.
+    """
+    name = "pool"
+
+    def __init__(self, members: Sequence[Union[PoolMember, Provider]], *, max_attempts: Optional[int] = None):
+        if not members:
+            raise ValueError("ProviderPool needs at least one member")
+        self.members: List[PoolMember] = [m if isinstance(m, PoolMember) else PoolMember(m) for m in members]
+        self.max_attempts = max_attempts or len(self.members)
+
+    @property
+    def max_concurrency(self) -> int:
+        """Sum of member caps; a sensible BatchClient max_concurrency for this pool."""
+        return sum(m.max_concurrency for m in self.members)
+
+    def size_pool(self, concurrency: int) -> None:
+        """No-op: each member's pool is sized from its own max_concurrency."""
+
+    async def warmup(self, connections: int = 1) -> int:
+        """Warm every member, up to its own concurrency cap."""
+        opened = 0
+        for m in self.members:
+            warmup = getattr(m.provider, "warmup", None)
+            if warmup is not None:
+                opened += await warmup(min(connections, m.max_concurrency))
+        return opened
+
+    async def aclose(self) -> None:
+        for m in self.members:
+            aclose = getattr(m.provider, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def _pick(self, exclude: List[PoolMember]) -> Optional[PoolMember]:
+        candidates = [m for m in self.members if m not in exclude]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        scores = [m.score(now) for m in candidates]
+        if not any(scores):
+            # everyone is cooling down: the caller waits for whoever recovers first
+            return min(candidates, key=lambda m: m.cooldown_until)
+        return random.choices(candidates, weights=scores)[0]
+
+    async def acomplete(self, req: LLMRequest, *, timeout: float = 60.0) -> LLMResponse:
+        tried: List[PoolMember] = []
+        resp: Optional[LLMResponse] = None
+        give_up = time.monotonic() + timeout
+        for _ in range(self.max_attempts):
+            member = self._pick(tried)
+            if member is None:
+                break
+            wait = member.cooldown_until - time.monotonic()
+            if wait > 0:
+                if resp is not None:
+                    return resp  # every member is limited: let the client's RetryPolicy back off
+                if time.monotonic() + wait > give_up:
+                    e = RateLimitError("every pool member is cooling down", retry_after=wait)
+                    return LLMResponse(provider=self.name, model=req.model, content="", raw={}, error=str(e), exception=e)
+                await asyncio.sleep(wait)
+            # failover attempts share the caller's timeout instead of each getting all of it
+            left = give_up - time.monotonic()
+            if left <= 0:
+                if resp is not None:
+                    return resp
+                e = RequestTimeoutError(f"no pool member answered within {timeout}s")
+                return LLMResponse(provider=self.name, model=req.model, content="", raw={}, error=str(e), exception=e)
+            tried.append(member)
+            resp = await member.acomplete(req, timeout=left)
+            if not _fail_over(resp):
+                return resp
+        assert resp is not None
+        return resp
@@ -0,0 +1,50 @@
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from typing import Mapping, Optional
+from compat import SLOTS
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def _seconds(value: Optional[str]) -> Optional[float]:
+    """Parse reset durations such as "1s", "6m0s" or "20ms"."""
+    if not value:
+        return None
+    parts = _DURATION.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(n) * _UNITS[u] for n, u in parts)
+
+def _int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+@dataclass(**SLOTS)
+class RateLimitInfo:
+    """Quota state reported by the provider (x-ratelimit-* headers); resets are in seconds."""
+    limit_requests: Optional[int] = None
+    limit_tokens: Optional[int] = None
+    remaining_requests: Optional[int] = None
+    remaining_tokens: Optional[int] = None
+    reset_requests: Optional[float] = None
+    reset_tokens: Optional[float] = None
+
+    @classmethod
+    def from_headers(cls, headers: Mapping[str, str]) -> Optional["RateLimitInfo"]:
+        h = {k.lower(): v for k, v in headers.items() if k.lower().startswith("x-ratelimit-")}
+        if not h:
+            return None
+        return cls(
+            limit_requests=_int(h.get("x-ratelimit-limit-requests")),
+            limit_tokens=_int(h.get("x-ratelimit-limit-tokens")),
+            remaining_requests=_int(h.get("x-ratelimit-remaining-requests")),
+            remaining_tokens=_int(h.get("x-ratelimit-remaining-tokens")),
+            reset_requests=_seconds(h.get("x-ratelimit-reset-requests")),
+            reset_tokens=_seconds(h.get("x-ratelimit-reset-tokens")),
+        )
@@ -0,0 +1,130 @@
+"""
+Retry policy, batch-wide retry budget and circuit breaker used by BatchClient.
+"""
+from __future__ import annotations
+import asyncio
+import time
+from typing import Optional, Tuple, Type
+
+from backoff import _compute_backoff
+from errors import CircuitOpenError, LLMError, RateLimitError, RequestTimeoutError, ServerError, ValidationError
+
+
+class RetryPolicy:
+    """
+    max_retries: retries after the first attempt.
+    base / cap: exponential backoff parameters (with jitter).
+    honor_retry_after: sleep for the server's Retry-After instead when it is given (capped at max_retry_after).
+    retry_on: error types worth retrying; untyped errors (exception=None) are always retried.
+    """
+    def __init__(
+        self,
+        max_retries: int = 3,
+        *,
+        base: float = 0.5,
+        cap: float = 8.0,
+        honor_retry_after: bool = True,
+        max_retry_after: float = 60.0,
+        retry_on: Tuple[Type[LLMError], ...] = (RateLimitError, RequestTimeoutError, ServerError, ValidationError),
+    ):
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+        self.honor_retry_after = honor_retry_after
+        self.max_retry_after = max_retry_after
+        self.retry_on = retry_on
+
+    def should_retry(self, exc: Optional[BaseException], attempt: int) -> bool:
+        if attempt > self.max_retries:
+            return False
+        if isinstance(exc, LLMError):
+            return isinstance(exc, self.retry_on)
+        return True
+
+    def delay(self, exc: Optional[BaseException], attempt: int) -> float:
+        retry_after = getattr(exc, "retry_after", None)
+        if self.honor_retry_after and retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return _compute_backoff(attempt, self.base, self.cap)
+
+
+class RetryBudget:
+    """
+    Caps retries across a whole client: at most min_retries + ratio x first attempts.
+    Keeps an outage from turning into max_retries x N doomed calls.
+    """
+    def __init__(self, ratio: float = 0.2, *, min_retries: int = 10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.requests = 0
+        self.retries = 0
+
+    def record_request(self) -> None:
+        self.requests += 1
+
+    def available(self) -> bool:
+        """Whether try_spend() would succeed right now (spends nothing)."""
+        return self.retries < self.min_retries + self.ratio * self.requests
+
+    def try_spend(self) -> bool:
+        if not self.available():
+            return False
+        self.retries += 1
+        return True
+
+
+def _is_outage(exc: Optional[BaseException]) -> bool:
+    if exc is None:
+        return False
+    if isinstance(exc, LLMError):
+        return isinstance(exc, (ServerError, RequestTimeoutError))
+    return True
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive outage errors (5xx, timeouts, transport failures).
+    While open, acquire() either pauses until recovery_time has passed or, with fail_fast,
+    raises CircuitOpenError. After recovery_time a single probe call is let through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, failure_threshold: int = 5, recovery_time: float = 30.0, *, fail_fast: bool = False):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recovery_time = recovery_time
+        self.fail_fast = fail_fast
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._probing or time.monotonic() >= self.opened_at + self.recovery_time:
+            return "half_open"
+        return "open"
+
+    async def acquire(self) -> None:
+        while self.opened_at is not None:
+            wait = self.opened_at + self.recovery_time - time.monotonic()
+            if wait <= 0 and not self._probing:
+                self._probing = True
+                return
+            if self.fail_fast:
+                raise CircuitOpenError("circuit open: provider is failing")
+            await asyncio.sleep(max(wait, min(1.0, self.recovery_time / 10)))
+
+    def record(self, exc: Optional[BaseException]) -> None:
+        """Report the outcome of a call let through by acquire() (exc=None on success)."""
+        if not _is_outage(exc):
+            self.failures = 0
+            self.opened_at = None
+        else:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+        self._probing = False
+
+    def abort(self) -> None:
+        """The call let through never completed (e.g. cancelled)."""
+        self._probing = False
@@ -0,0 +1,149 @@
+"""
+Priority/deadline-aware scheduling of concurrency slots, used in place of a plain semaphore.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from typing import Dict, List, Optional, Union
+
+from concurrency import AdaptiveConcurrency
+from errors import DeadlineExceededError
+from llm_request import LLMRequest
+
+
+class _FlowState:
+    __slots__ = ("tag", "queued")
+
+    def __init__(self):
+        self.tag = 0.0
+        self.queued = 0
+
+
+class PriorityScheduler:
+    """
+    Hands out concurrency slots by request priority, then weighted-fair across flows.
+
+    - a higher `req.priority` always takes the next free slot before lower ones
+    - within a priority, flows (e.g. two concurrent batches, or a batch and interactive
+      calls) share slots in proportion to their weight (start-time fair queuing), so a
+      new flow does not wait behind the whole backlog of an older one
+    - requests whose `req.deadline` (time.time()) has passed are failed with
+      DeadlineExceededError while queued and again right before dispatch, so they never
+      take a rate-limit token; with drop_expired=False they are served last instead
+
+    limit: a fixed slot count, or an AdaptiveConcurrency that supplies the limit (and its
+    quota pauses). Use `async with scheduler.slot(req):`.
+    """
+    def __init__(self, limit: Union[int, AdaptiveConcurrency] = 8, *, drop_expired: bool = True):
+        self.adaptive = limit if isinstance(limit, AdaptiveConcurrency) else None
+        self._fixed = 0 if self.adaptive else max(1, int(limit))
+        self.drop_expired = drop_expired
+        self.in_flight = 0
+        self.expired = 0
+        self.weights: Dict[Optional[str], float] = {}
+        self._flows: Dict[Optional[str], _FlowState] = {}
+        self._heap: List[list] = []
+        self._seq = itertools.count()
+        self._vtime = 0.0
+
+    @property
+    def limit(self) -> int:
+        return self.adaptive.limit if self.adaptive is not None else self._fixed
+
+    @property
+    def waiting(self) -> int:
+        return sum(f.queued for f in self._flows.values())
+
+    def expired_now(self, req: LLMRequest) -> bool:
+        return self.drop_expired and req.deadline is not None and time.time() >= req.deadline
+
+    def slot(self, req: LLMRequest) -> "_Slot":
+        return _Slot(self, req)
+
+    async def acquire(self, req: LLMRequest) -> None:
+        if self.expired_now(req):
+            self.expired += 1
+            raise DeadlineExceededError("deadline passed before dispatch")
+        if self.in_flight < self.limit and not self._heap:
+            self.in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        flow = self._flows.get(req.flow)
+        if flow is None:
+            flow = self._flows[req.flow] = _FlowState()
+        flow.tag = max(flow.tag, self._vtime) + 1.0 / self.weights.get(req.flow, 1.0)
+        flow.queued += 1
+        heapq.heappush(self._heap, [-req.priority, flow.tag, next(self._seq), fut, req])
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self.release()  # granted, but the caller went away before using it
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        heap = self._heap
+        while heap and self.in_flight < self.limit:
+            entry = heapq.heappop(heap)
+            neg_prio, tag, _, fut, req = entry
+            flow = self._flows.get(req.flow)
+            if fut.done():  # cancelled while queued
+                self._dequeued(req.flow, flow)
+                continue
+            if req.deadline is not None and neg_prio != math.inf and time.time() >= req.deadline:
+                if not self.drop_expired:
+                    entry[0] = math.inf  # demote behind everything else
+                    heapq.heappush(heap, entry)
+                    continue
+                self._dequeued(req.flow, flow)
+                self.expired += 1
+                fut.set_exception(DeadlineExceededError("deadline passed while queued"))
+                continue
+            self._dequeued(req.flow, flow)
+            self._vtime = max(self._vtime, tag)
+            self.in_flight += 1
+            fut.set_result(None)
+
+    def _dequeued(self, key: Optional[str], flow: Optional[_FlowState]) -> None:
+        if flow is None:
+            return
+        flow.queued -= 1
+        if flow.queued <= 0:
+            # an idle flow restarts at the current virtual time, so it keeps no credit
+            del self._flows[key]
+
+
+class _Slot:
+    __slots__ = ("scheduler", "req")
+
+    def __init__(self, scheduler: PriorityScheduler, req: LLMRequest):
+        self.scheduler = scheduler
+        self.req = req
+
+    async def __aenter__(self) -> None:
+        sched = self.scheduler
+        await sched.acquire(self.req)
+        if sched.adaptive is not None:
+            try:
+                # slot accounting and quota pauses stay with the adaptive limiter
+                await sched.adaptive.__aenter__()
+            except BaseException:
+                sched.release()
+                raise
+
+    async def __aexit__(self, *exc) -> None:
+        sched = self.scheduler
+        try:
+            if sched.adaptive is not None:
+                await sched.adaptive.__aexit__(*exc)
+        finally:
+            sched.release()
@@ -0,0 +1,131 @@
+"""
+Multi-process execution: one event loop and HTTP pool per worker, one global rate budget.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.util import Finalize
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from llm_response import LLMResponse
+from msg import Msg
+from provider import Provider
+from shared_limiter import SharedTokenBucketLimiter
+
+ProviderSource = Union[Provider, Callable[[], Provider]]
+
+
+def _make_provider(source: ProviderSource) -> Provider:
+    if hasattr(source, "acomplete"):
+        return source  # type: ignore[return-value]
+    return source()  # type: ignore[operator]
+
+
+# this worker process's event loop and client, built once by _init_worker
+_worker: Optional[Tuple[asyncio.AbstractEventLoop, Any]] = None
+
+
+def _concurrency_shares(total: int, workers: int) -> List[int]:
+    """Split `total` in-flight slots over `workers`; the first ones get the remainder."""
+    base, extra = divmod(total, workers)
+    shares = [base + (1 if i < extra else 0) for i in range(workers)]
+    assert sum(shares) == total and min(shares) >= 1, (total, workers)
+    return shares
+
+
+def _init_worker(source: ProviderSource, client_kw: Dict[str, Any], shares: List[int], started: Any) -> None:
+    global _worker
+    from batchclient import BatchClient
+
+    with started.get_lock():
+        index = started.value
+        started.value += 1
+    client_kw = dict(client_kw, max_concurrency=shares[index % len(shares)])
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def _make() -> BatchClient:
+        return BatchClient(_make_provider(source), **client_kw)
+
+    _worker = (loop, loop.run_until_complete(_make()))
+    # pool workers leave through multiprocessing's exit hooks, not atexit
+    Finalize(None, _close_worker, exitpriority=10)
+
+
+def _close_worker() -> None:
+    global _worker
+    if _worker is None:
+        return
+    loop, client = _worker
+    _worker = None
+    try:
+        loop.run_until_complete(client.aclose())
+    finally:
+        loop.close()
+
+
+def _run_shard(prompts: Sequence[Sequence[Msg]], batch_kw: Dict[str, Any]) -> List[LLMResponse]:
+    assert _worker is not None, "_run_shard runs in workers started with _init_worker"
+    loop, client = _worker
+    return loop.run_until_complete(client.abatch(prompts, **batch_kw))
+
+
+def run_batch_sharded(
+    provider: ProviderSource,
+    prompts: Sequence[Sequence[Msg]],
+    *,
+    model: str,
+    processes: Optional[int] = None,
+    chunks_per_process: int = 4,
+    temperature: float = 0.7,
+    max_output_tokens: Optional[int] = None,
+    max_concurrency: int = 8,
+    qps: Optional[float] = None,
+    burst: Optional[float] = None,
+    max_retries: int = 3,
+    timeout: float = 60.0,
+    extra: Optional[Dict[str, Any]] = None,
+) -> List[LLMResponse]:
+    """
+    Split prompts into contiguous shards and run them in worker processes; results come
+    back in input order. Each worker builds its provider, event loop and BatchClient once,
+    reuses them (and their connection pool) for all of its shards, and closes them on exit.
+
+    provider: a picklable Provider (OpenAIProvider is) or a zero-argument factory.
+    processes: worker count (default: CPU count).
+    chunks_per_process: shards per worker, so a slow shard does not idle the other workers.
+    max_concurrency: total in-flight requests, split across workers (the first ones get
+        the remainder; never more workers than slots).
+    qps / burst: one global budget, shared by all workers through a SharedTokenBucketLimiter.
+    """
+    processes = max(1, processes or os.cpu_count() or 1)
+    if not prompts:
+        return []
+    n_chunks = min(len(prompts), processes * max(1, chunks_per_process))
+    size = math.ceil(len(prompts) / n_chunks)
+    shards = [prompts[i:i + size] for i in range(0, len(prompts), size)]
+    batch_kw = {"model": model, "temperature": temperature, "max_output_tokens": max_output_tokens, "extra": extra}
+    # every worker needs at least one slot, and together they get exactly max_concurrency
+    workers = min(processes, len(shards), max(1, max_concurrency))
+    shares = _concurrency_shares(max(1, max_concurrency), workers)
+    client_kw: Dict[str, Any] = {
+        "max_retries": max_retries,
+        "timeout": timeout,
+    }
+    with tempfile.TemporaryDirectory(prefix="batchcal-") as tmp:
+        if qps:
+            client_kw["limiter"] = SharedTokenBucketLimiter(os.path.join(tmp, "bucket"), qps, burst)
+        started = multiprocessing.Value("i", 0)  # hands each worker its index into shares
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(provider, client_kw, shares, started)) as pool:
+            futures = [pool.submit(_run_shard, shard, batch_kw) for shard in shards]
+            out: List[LLMResponse] = []
+            for fut in futures:
+                out.extend(fut.result())
+        if qps:
+            client_kw["limiter"].close()
+    return out
@@ -0,0 +1,96 @@
+"""
+Token bucket shared by every process on a host through a small mmap'd file.
+"""
+from __future__ import annotations
+
+import asyncio
+import mmap
+import os
+import struct
+import time
+from typing import Optional
+
+try:  # POSIX only
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+_MAGIC = b"BCTB"
+_LAYOUT = struct.Struct("<4sdd")  # magic, tokens, last refill (CLOCK_MONOTONIC seconds)
+
+
+class SharedTokenBucketLimiter:
+    """
+    Drop-in RateLimiter whose bucket lives in `path`: all processes (and limiter
+    instances) opening the same file draw from one budget, so N workers together
+    stay at `qps` instead of N x qps.
+
+    Each acquire takes the file lock once, reserves its tokens (the bucket may go
+    negative, which queues later callers behind it) and then sleeps outside the lock
+    for exactly as long as its reservation needs. Relies on CLOCK_MONOTONIC being
+    shared by all processes of the host (true on Linux and macOS).
+
+    Instances are picklable: the file is reopened in the receiving process.
+    """
+    def __init__(self, path: str, qps: float, burst: Optional[float] = None):
+        if fcntl is None:
+            raise RuntimeError("SharedTokenBucketLimiter requires a POSIX platform (fcntl)")
+        self.path = path
+        self.qps = max(0.1, qps)
+        self.burst = burst
+        self.capacity = float(burst) if burst is not None else 1.0
+        self._open()
+
+    def _open(self) -> None:
+        self._pid = os.getpid()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < _LAYOUT.size:
+                os.ftruncate(self._fd, _LAYOUT.size)
+            self._mm = mmap.mmap(self._fd, _LAYOUT.size)
+            magic, _, _ = _LAYOUT.unpack_from(self._mm)
+            if magic != _MAGIC:
+                _LAYOUT.pack_into(self._mm, 0, _MAGIC, self.capacity, time.monotonic())
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _update(self, n: float) -> float:
+        """Atomically refill and take n tokens (n < 0 refunds); returns the seconds to wait."""
+        if self._pid != os.getpid():
+            # forked: flock is per open file description, so the child needs its own
+            self._open()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            _, tokens, last = _LAYOUT.unpack_from(self._mm)
+            now = time.monotonic()
+            tokens = min(self.capacity, tokens + max(0.0, now - last) * self.qps)
+            need = min(n, self.capacity)
+            wait = max(0.0, (need - tokens) / self.qps) if n > 0 else 0.0
+            tokens = min(self.capacity, tokens - n) if n < 0 else tokens - n
+            _LAYOUT.pack_into(self._mm, 0, _MAGIC, tokens, now)
+            return wait
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    async def acquire(self, n: float = 1.0) -> None:
+        wait = self._update(float(n))
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self._update(-float(n))
+                raise
+
+    def release(self, n: float = 1.0) -> None:
+        self._update(-float(n))
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+    def __getstate__(self):
+        return {"path": self.path, "qps": self.qps, "burst": self.burst}
+
+    def __setstate__(self, state) -> None:
+        self.__init__(state["path"], state["qps"], state["burst"])
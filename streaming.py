@@ -0,0 +1,109 @@
+"""
+Streaming responses: server-sent event parsing, a token iterator with time-to-first-token,
+and incremental validators that can reject an answer before it has finished generating.
+"""
+from __future__ import annotations
+
+import time
+from typing import AsyncIterator, Callable, List, Optional, Tuple, Union
+
+from compat import json_loads
+from llm_response import LLMResponse
+
+# Called with the text received so far (after every delta for short answers, then every
+# BatchClient(validate_stream_every=...) characters); raise to abort the generation.
+StreamValidator = Callable[[str], None]
+
+
+async def sse_events(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[str, str]]:
+    """(event, data) pairs from a text/event-stream body given line by line."""
+    event, data = "", []  # type: Tuple[str, List[str]]
+    async for line in lines:
+        if not line:
+            if data:
+                yield event or "message", "\n".join(data)
+            event, data = "", []
+        elif line.startswith(":"):
+            continue  # comment / keep-alive
+        else:
+            name, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if name == "event":
+                event = value
+            elif name == "data":
+                data.append(value)
+    if data:
+        yield event or "message", "\n".join(data)
+
+
+class ResponseStream:
+    """
+    Async iterator over the text deltas of one streamed answer.
+
+        async with provider.astream(req) as stream:
+            async for delta in stream:
+                ...
+        stream.response  # the assembled LLMResponse (content, usage, error)
+
+    `text` is everything received so far and `ttft` the seconds until the first delta.
+    Leaving the block early (break, exception, aclose()) closes the connection, which
+    stops the generation on the server.
+    """
+    def __init__(self, items: AsyncIterator[Union[str, LLMResponse]]):
+        self._items = items
+        self._parts: List[str] = []
+        self._start: Optional[float] = None
+        self.ttft: Optional[float] = None
+        self.response: Optional[LLMResponse] = None
+
+    @property
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts[:] = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def __aiter__(self) -> "ResponseStream":
+        return self
+
+    async def __anext__(self) -> str:
+        if self._start is None:
+            self._start = time.perf_counter()
+        while True:
+            item = await self._items.__anext__()
+            if isinstance(item, LLMResponse):
+                self.response = item
+                if not item.content and not item.error:
+                    item.content = self.text.strip()
+                continue
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self._start
+            self._parts.append(item)
+            return item
+
+    async def aclose(self) -> None:
+        await self._items.aclose()  # type: ignore[attr-defined]
+
+    async def __aenter__(self) -> "ResponseStream":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+
+def require_json_prefix(text: str) -> None:
+    """Incremental counterpart of require_json: the answer must open a JSON object or array."""
+    # only the first non-space character matters: stop there instead of copying the text
+    for i, ch in enumerate(text):
+        if not ch.isspace():
+            if ch not in "{[":
+                raise ValueError(f"response does not start with JSON: {text[i:i + 20]!r}")
+            return
+
+
+def decode(data: str) -> dict:
+    """Decode one SSE data payload; malformed payloads become an "error" event."""
+    try:
+        return json_loads(data)
+    except (ValueError, TypeError) as e:
+        return {"type": "error", "message": f"bad event payload: {e}"}
+
@@ -0,0 +1,89 @@
+"""
+Blocking facade over BatchClient for synchronous code, backed by one long-lived event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, List, Optional, Sequence, TypeVar
+
+from batchclient import BatchClient
+from llm_response import LLMResponse
+from msg import Msg
+from provider import Provider
+
+T = TypeVar("T")
+
+
+class SyncBatchClient:
+    """
+    Runs a BatchClient on an event loop in a background thread, so repeated calls
+    reuse the same client, connection pool, rate limiter and breaker state instead of
+    paying for a new loop (and new connections) per call like run_one/run_batch.
+
+    Safe to call from any number of threads. `submit` returns a
+    concurrent.futures.Future; `complete` and `batch` block for the result.
+    Keyword arguments are passed to BatchClient.
+
+        with SyncBatchClient(OpenAIProvider(), qps=10, max_concurrency=32) as client:
+            resp = client.complete([Msg.user("Ping")], model="gpt-4.1-mini")
+    """
+    def __init__(self, provider: Provider, **client_kw: Any):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="batchcal-loop", daemon=True)
+        self._thread.start()
+        self._closed = False
+        self._lock = threading.Lock()
+
+        async def _make() -> BatchClient:
+            # built on the loop thread: asyncio primitives bind to the running loop
+            return BatchClient(provider, **client_kw)
+
+        self.client: BatchClient = self._call(_make()).result()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _call(self, coro: Coroutine[Any, Any, T]) -> "Future[T]":
+        if self._closed:
+            coro.close()
+            raise RuntimeError("SyncBatchClient is closed")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def submit(self, messages: Sequence[Msg], *, model: str, **kw: Any) -> "Future[LLMResponse]":
+        """Queue one request without blocking; kw go to LLMRequest (temperature, ...)."""
+        return self._call(self.client.acomplete(messages, model=model, **kw))
+
+    def complete(self, messages: Sequence[Msg], *, model: str, timeout: Optional[float] = None, **kw: Any) -> LLMResponse:
+        """Blocking single call; `timeout` bounds the wait, the request keeps its own timeout."""
+        return self.submit(messages, model=model, **kw).result(timeout)
+
+    def batch(self, prompts: Sequence[Sequence[Msg]], *, model: str, **kw: Any) -> List[LLMResponse]:
+        """Blocking BatchClient.abatch (results in prompt order)."""
+        return self._call(self.client.abatch(prompts, model=model, **kw)).result()
+
+    def warmup(self, connections: Optional[int] = None) -> int:
+        return self._call(self.client.warmup(connections)).result()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Close the client's connections and stop the loop thread (idempotent)."""
+        with self._lock:
+            if self._closed:
+                return
+            fut = self._call(self.client.aclose())
+            self._closed = True
+        try:
+            fut.result(timeout)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            if not self._thread.is_alive():
+                self._loop.close()
+
+    def __enter__(self) -> "SyncBatchClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
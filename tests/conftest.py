@@ -7,12 +7,17 @@ def _fake_key(monkeypatch):
     monkeypatch.setenv("OPENAI_API_KEY", "test-key")
 
 class _MockResponse:
-    def __init__(self, payload, status=200):
+    def __init__(self, payload, status=200, headers=None):
         self._payload = payload
         self.status_code = status
         self.text = ""
+        self.headers = headers or {}
     def json(self):
         return self._payload
+    @property
+    def content(self):
+        import json
+        return json.dumps(self._payload).encode()
     def raise_for_status(self):
         if self.status_code >= 400:
             from httpx import HTTPStatusError, Request, Response
@@ -0,0 +1,54 @@
+import asyncio
+import time
+import pytest
+from msg import Msg
+from llm_response import LLMResponse
+from batchclient import BatchClient
+from concurrency import AdaptiveConcurrency
+from rate_limit_info import RateLimitInfo
+
+
+class _Capacity:
+    """Fake provider that answers 429 above a fixed number of concurrent calls."""
+    name = "fake"
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.in_flight = 0
+
+    async def acomplete(self, req, *, timeout=60.0):
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(0.002)
+            if self.in_flight > self.capacity:
+                return LLMResponse(provider=self.name, model=req.model, content="", raw={}, error="429", status_code=429)
+            return LLMResponse(provider=self.name, model=req.model, content="ok", raw={}, status_code=200)
+        finally:
+            self.in_flight -= 1
+
+
+def test_rate_limit_headers_parse():
+    info = RateLimitInfo.from_headers({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1m6.5s", "X-RateLimit-Reset-Tokens": "20ms"})
+    assert info.remaining_requests == 0 and info.reset_requests == 66.5 and info.reset_tokens == 0.02
+
+
+@pytest.mark.asyncio
+async def test_limit_converges_below_capacity():
+    limit = AdaptiveConcurrency(32, max_limit=64)
+    client = BatchClient(_Capacity(6), adaptive=limit, max_retries=10)
+    prompts = [[Msg.user(str(i))] for i in range(400)]
+    resps = await client.abatch(prompts, model="m", coalesce=False)
+    assert all(r.content == "ok" for r in resps)
+    assert 1 <= limit.limit <= 12
+
+
+@pytest.mark.asyncio
+async def test_exhausted_quota_pauses_dispatch():
+    limit = AdaptiveConcurrency(4)
+    resp = LLMResponse(provider="p", model="m", content="ok", raw={}, status_code=200,
+                       rate_limit=RateLimitInfo(remaining_requests=0, reset_requests=0.1))
+    limit.record(resp, 0.01)
+    start = time.monotonic()
+    async with limit:
+        pass
+    assert time.monotonic() - start >= 0.09
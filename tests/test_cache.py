@@ -0,0 +1,50 @@
+import time
+import pytest
+from openai_provider import OpenAIProvider
+from msg import Msg
+from batchclient import BatchClient
+from cache import ResponseCache
+from llm_request import LLMRequest
+from llm_response import LLMResponse
+
+
+def _resp(text):
+    return LLMResponse(provider="p", model="m", content=text, raw={})
+
+
+def test_lru_ttl_and_disk_tier(tmp_path):
+    cache = ResponseCache(2, ttl=0.05, disk_path=str(tmp_path))
+    for k in ("a", "b", "c"):
+        cache.put(k, _resp(k))
+    assert cache.stats()["entries"] == 2 and cache.evictions == 1
+    # "a" fell out of memory but is still on disk
+    assert cache.get("a").content == "a" and cache.disk_hits == 1
+    assert ResponseCache(disk_path=str(tmp_path)).get("b").content == "b"
+    time.sleep(0.06)
+    assert cache.get("c") is None and cache.misses == 1
+
+
+def test_disk_size_eviction(tmp_path):
+    cache = ResponseCache(1, disk_path=str(tmp_path), max_disk_bytes=400)
+    for i in range(10):
+        cache.put(f"k{i}", _resp("x" * 50))
+    assert cache.stats()["disk_bytes"] <= 400
+    assert cache.get("k9") is not None
+
+
+@pytest.mark.asyncio
+async def test_client_cache_hits_skip_provider(patch_openai_post):
+    prov = OpenAIProvider()
+    calls = patch_openai_post(prov)
+    cache = ResponseCache()
+    client = BatchClient(prov, cache=cache, qps=0.1)
+    prompts = [[Msg.user("same")]] * 3
+    await client.acomplete(prompts[0], model="gpt-4.1-mini", temperature=0)
+    start = time.monotonic()
+    # qps=0.1 would make any limiter hit wait ~10s; hits must not touch it
+    resps = await client.abatch(prompts, model="gpt-4.1-mini", temperature=0)
+    assert time.monotonic() - start < 1.0
+    assert calls["count"] == 1 and cache.hits == 3
+    assert all(r.content == "Hello World" for r in resps)
+    key = LLMRequest(messages=[Msg.user("same")], model="gpt-4.1-mini", temperature=0).cache_key()
+    assert cache.get(key) is not None
@@ -0,0 +1,84 @@
+import asyncio
+import io
+import json
+import pytest
+from llm_response import LLMResponse
+from batchclient import BatchClient
+from usage import Usage
+import cli
+
+
+class _Echo:
+    name = "echo"
+
+    async def acomplete(self, req, *, timeout=60.0):
+        await asyncio.sleep(0.001)
+        return LLMResponse(provider=self.name, model=req.model, content=req.messages[-1].content.upper(), raw={}, usage=Usage(1, 1, 2))
+
+
+def _input():
+    lines = [
+        json.dumps({"id": "a", "prompt": "one"}),
+        json.dumps({"messages": [{"role": "user", "content": "two"}]}),
+        "",
+        "{not json",
+        json.dumps("three"),
+        json.dumps({"id": 7, "prompt": "four"}),
+    ]
+    return io.BytesIO(("\n".join(lines) + "\n").encode())
+
+
+@pytest.mark.asyncio
+async def test_run_file_streams_results_with_index_and_id():
+    out = io.StringIO()
+    stats = await cli.run_file(BatchClient(_Echo()), _input(), out, model="m", system="be brief")
+    rows = sorted((json.loads(line) for line in out.getvalue().splitlines()), key=lambda r: r["index"])
+    assert stats == {"done": 4, "errors": 0, "skipped": 1, "resumed": 0}
+    assert [(r["index"], r["id"]) for r in rows] == [(0, "a"), (1, None), (3, None), (4, None), (5, 7)]
+    assert rows[0]["content"] == "ONE" and rows[0]["usage"]["total_tokens"] == 2
+    assert rows[2]["error"].startswith("bad input line")
+
+
+@pytest.mark.asyncio
+async def test_shards_split_the_file():
+    seen = []
+    for i in range(2):
+        out = io.StringIO()
+        await cli.run_file(BatchClient(_Echo()), _input(), out, model="m", shard=(i, 2))
+        seen += [json.loads(line)["index"] for line in out.getvalue().splitlines()]
+    assert sorted(seen) == [0, 1, 3, 4, 5]
+
+
+def test_shard_argument():
+    assert cli.parse_shard("1/4") == (1, 4)
+    for bad in ("4/4", "x", "1/0"):
+        with pytest.raises(Exception):
+            cli.parse_shard(bad)
+    args = cli._parser().parse_args(["run", "in.jsonl", "--model", "m", "--shard", "2/3"])
+    assert args.shard == (2, 3) and args.output == "-"
+
+
+def test_resume_with_journal_writes_each_line_once(tmp_path, monkeypatch):
+    import httpx
+    import openai_provider
+
+    calls = []
+
+    def handler(request):
+        if request.url.path.endswith("/models"):
+            return httpx.Response(200, json={"data": []})
+        calls.append(request)
+        text = json.loads(request.content)["input"][-1]["content"]
+        return httpx.Response(200, json={"output": [{"type": "message", "content": [{"type": "output_text", "text": text.upper()}]}]})
+
+    real = openai_provider.OpenAIProvider
+    monkeypatch.setattr(openai_provider, "OpenAIProvider", lambda **kw: real(api_key="k", base_url="http://mock/v1", transport=httpx.MockTransport(handler)))
+    src, out, journal = tmp_path / "in.jsonl", tmp_path / "out.jsonl", tmp_path / "run.journal"
+    src.write_text("".join(json.dumps({"id": i, "prompt": f"p{i}"}) + "\n" for i in range(5)))
+    argv = ["run", str(src), "-o", str(out), "--model", "m", "--journal", str(journal), "--progress-interval", "0"]
+    assert cli.main(argv) == 0
+    with pytest.raises(SystemExit):
+        cli.main(argv)  # refuses to add to existing results without --append
+    assert cli.main(argv + ["--append"]) == 0
+    rows = [json.loads(line) for line in out.read_text().splitlines()]
+    assert sorted(r["index"] for r in rows) == list(range(5)) and len(calls) == 5
@@ -0,0 +1,30 @@
+import asyncio
+import pytest
+from openai_provider import OpenAIProvider
+from msg import Msg
+from batchclient import BatchClient
+
+
+@pytest.mark.asyncio
+async def test_duplicates_share_one_call(patch_openai_post):
+    prov = OpenAIProvider()
+    calls = patch_openai_post(prov)
+    client = BatchClient(prov, max_concurrency=8)
+    prompts = [[Msg.user("dup")]] * 4 + [[Msg.user("other")]]
+    resps = await client.abatch(prompts, model="gpt-4.1-mini")
+    assert calls["count"] == 2 and client.coalesced == 3
+    assert all(r.content == "Hello World" for r in resps)
+    assert len({id(r) for r in resps}) == 5
+    assert not client._inflight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_acomplete_and_opt_out(patch_openai_post):
+    prov = OpenAIProvider()
+    calls = patch_openai_post(prov)
+    client = BatchClient(prov)
+    msgs = [Msg.user("hi")]
+    await asyncio.gather(*(client.acomplete(msgs, model="gpt-4.1-mini") for _ in range(3)))
+    assert calls["count"] == 1
+    await asyncio.gather(*(client.acomplete(msgs, model="gpt-4.1-mini", coalesce=False) for _ in range(3)))
+    assert calls["count"] == 4
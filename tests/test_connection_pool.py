@@ -0,0 +1,140 @@
+import asyncio
+import http.server
+import json
+import threading
+import time
+import httpx
+import pytest
+from msg import Msg
+from batchclient import BatchClient, run_one
+from hedging import HedgePolicy
+from openai_provider import OpenAIProvider
+
+
+class _Transport(httpx.AsyncBaseTransport):
+    def __init__(self):
+        self.paths = []
+        self.closed = False
+
+    async def handle_async_request(self, request):
+        self.paths.append(request.url.path)
+        if request.url.path.endswith("/models"):
+            return httpx.Response(200, json={"data": []})
+        return httpx.Response(200, json={"output": [{"type": "message", "content": [{"type": "output_text", "text": "ok"}]}]})
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_pool_is_sized_from_client_concurrency():
+    prov = OpenAIProvider(api_key="k")
+    BatchClient(prov, max_concurrency=48)
+    assert prov._pool_size == 48
+    BatchClient(prov, adaptive=True)
+    assert prov._pool_size == 256  # adaptive can grow to its max_limit
+    BatchClient(prov)
+    assert prov._pool_size == 256  # a smaller client does not shrink a shared provider's pool
+    hedged = OpenAIProvider(api_key="k")
+    BatchClient(hedged, max_concurrency=4, hedge=HedgePolicy(0.1))
+    assert hedged._pool_size == 8
+
+
+@pytest.mark.asyncio
+async def test_warmup_and_shared_transport_lifecycle():
+    shared = _Transport()
+    a = OpenAIProvider(api_key="k", base_url="http://mock/v1", transport=shared)
+    b = OpenAIProvider(api_key="k", base_url="http://mock/v1", transport=shared)
+    async with BatchClient(a, max_concurrency=4) as client:
+        assert await client.warmup() == 4
+        assert (await client.acomplete([Msg.user("hi")], model="m")).content == "ok"
+    assert a._http is None and not shared.closed  # b still uses it
+    assert (await BatchClient(b).acomplete([Msg.user("hi")], model="m")).content == "ok"
+    assert shared.paths.count("/v1/models") == 4
+
+
+@pytest.mark.asyncio
+async def test_owned_client_is_closed_and_rebuilt_on_use():
+    prov = OpenAIProvider(api_key="k")
+    http = prov._client
+    async with prov:
+        pass
+    assert http.is_closed and prov._http is None
+    assert prov._client is not http
+
+
+def test_http2_requires_h2():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        with pytest.raises(ImportError, match="batchcal\\[http2\\]"):
+            OpenAIProvider(api_key="k", http2=True)
+    else:
+        assert OpenAIProvider(api_key="k", http2=True)._client is not None
+
+
+def test_run_one_closes_its_pool_on_return():
+    prov = OpenAIProvider(api_key="k", base_url="http://mock/v1", transport=_Transport())
+    for _ in range(2):
+        assert run_one(prov, [Msg.user("hi")], model="m").content == "ok"
+        assert prov._http is None  # nothing left behind for the next loop
+
+
+
+def test_client_from_a_live_loop_is_closed_when_replaced():
+    prov = OpenAIProvider(api_key="k")
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever, daemon=True)
+    thread.start()
+
+    async def _grab():
+        return prov._client
+
+    try:
+        stale = asyncio.run_coroutine_threadsafe(_grab(), other).result()
+        assert asyncio.run(_grab()) is not stale
+        deadline = time.monotonic() + 1.0
+        while not stale.is_closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert stale.is_closed
+    finally:
+        other.call_soon_threadsafe(other.stop)
+        thread.join()
+        other.close()
+
+
+class _StallFirst(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    posts = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        type(self).posts += 1
+        if type(self).posts == 1:
+            time.sleep(1.0)
+        body = json.dumps({"output": [{"type": "message", "content": [{"type": "output_text", "text": str(self.posts)}]}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_hedge_gets_its_own_connection():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _StallFirst)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        hedge = HedgePolicy(0.1)
+        prov = OpenAIProvider(api_key="k", base_url=f"http://127.0.0.1:{server.server_port}")
+        async with BatchClient(prov, max_concurrency=1, hedge=hedge) as client:
+            start = time.monotonic()
+            resp = await client.acomplete([Msg.user("hi")], model="m")
+            assert time.monotonic() - start < 0.8
+        assert resp.content == "2" and hedge.wins == 1
+    finally:
+        server.shutdown()
+        server.server_close()
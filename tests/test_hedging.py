@@ -0,0 +1,100 @@
+import asyncio
+import time
+import pytest
+from msg import Msg
+from llm_response import LLMResponse
+from batchclient import BatchClient
+from hedging import HedgePolicy
+from tpm_limiter import TPMLimiter
+from usage import Usage
+
+
+class _Staller:
+    """First call stalls for a long time, later calls answer quickly."""
+    name = "staller"
+
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = 0
+
+    async def acomplete(self, req, *, timeout=60.0):
+        self.calls += 1
+        try:
+            await asyncio.sleep(5.0 if self.calls == 1 else 0.01)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return LLMResponse(provider=self.name, model=req.model, content=str(self.calls), raw={})
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_and_cancels_loser():
+    prov = _Staller()
+    hedge = HedgePolicy(0.05)
+    client = BatchClient(prov, hedge=hedge, qps=1000.0)
+    start = time.monotonic()
+    resp = await client.acomplete([Msg.user("x")], model="m")
+    assert time.monotonic() - start < 1.0
+    assert resp.content == "2" and hedge.hedges == 1 and hedge.wins == 1
+    await asyncio.sleep(0)
+    assert prov.cancelled == 1
+
+
+def test_adaptive_delay_from_percentile():
+    hedge = HedgePolicy(percentile=0.5, min_samples=3, max_delay=2.0)
+    assert hedge.delay() == 2.0  # not enough samples yet: fall back to max_delay
+    for x in (0.1, 0.2, 0.3, 10.0):
+        hedge.record(x)
+    assert hedge.delay() == 0.3
+    assert HedgePolicy(min_samples=3).delay() is None  # no samples and no max_delay: don't hedge
+    small = HedgePolicy(percentile=0.5, min_samples=1, window=3)
+    for x in (5.0, 0.1, 0.2, 0.3):  # 5.0 is evicted
+        small.record(x)
+    assert small._sorted == [0.1, 0.2, 0.3] and small.delay() == 0.2
+
+
+@pytest.mark.asyncio
+async def test_exhausted_budget_does_not_hedge():
+    class _Slow(_Staller):
+        async def acomplete(self, req, *, timeout=60.0):
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            return LLMResponse(provider=self.name, model=req.model, content=str(self.calls), raw={})
+
+    prov = _Slow()
+    hedge = HedgePolicy(0.01, budget=0.0, min_hedges=0)
+    resp = await BatchClient(prov, hedge=hedge).acomplete([Msg.user("x")], model="m")
+    assert resp.content == "1" and prov.calls == 1 and hedge.hedges == 0
+
+
+@pytest.mark.asyncio
+async def test_hedge_reservation_is_settled():
+    class _Metered(_Staller):
+        async def acomplete(self, req, *, timeout=60.0):
+            resp = await super().acomplete(req, timeout=timeout)
+            resp.usage = Usage(6, 4, 10)
+            return resp
+
+    limiter = TPMLimiter(tpm=60000)  # bucket of 1000 tokens
+    client = BatchClient(_Metered(), hedge=HedgePolicy(0.02), limiter=limiter)
+    resp = await client.acomplete([Msg.user("x" * 40)], model="m", max_output_tokens=400)
+    assert resp.content == "2"
+    # winner's 10 real tokens, plus the cancelled primary's 14-token prompt estimate
+    assert 970 < limiter.tokens.tokens <= 1000
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_when_primary_lands_while_waiting_for_the_limiter():
+    class _Slowish(_Staller):
+        async def acomplete(self, req, *, timeout=60.0):
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            return LLMResponse(provider=self.name, model=req.model, content="ok", raw={})
+
+    prov, hedge = _Slowish(), HedgePolicy(0.01)
+    client = BatchClient(prov, hedge=hedge, qps=5.0)  # next slot only after 0.2s
+    start = time.monotonic()
+    resp = await client.acomplete([Msg.user("x")], model="m")
+    assert resp.content == "ok" and time.monotonic() - start < 0.15
+    assert prov.calls == 1 and hedge.hedges == 0 and not client.rate_limiter._waiters
+    assert hedge.budget.retries == 0  # no hedge went out, so none was spent
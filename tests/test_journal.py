@@ -0,0 +1,66 @@
+import pytest
+from openai_provider import OpenAIProvider
+from msg import Msg
+from batchclient import BatchClient
+from journal import Journal
+
+
+@pytest.mark.asyncio
+async def test_rerun_skips_journaled_requests(tmp_path, patch_openai_post):
+    path = str(tmp_path / "run.jsonl")
+    prompts = [[Msg.user(f"Item {i}")] for i in range(6)]
+
+    prov = OpenAIProvider()
+    calls = patch_openai_post(prov)
+    with Journal(path, flush_every=4) as journal:
+        await BatchClient(prov, journal=journal).abatch(prompts[:4], model="gpt-4.1-mini")
+    assert calls["count"] == 4
+
+    prov = OpenAIProvider()
+    patch_openai_post(prov)  # shares the call counter with the first run
+    with Journal(path) as journal:
+        assert len(journal) == 4
+        resps = await BatchClient(prov, journal=journal).abatch(prompts, model="gpt-4.1-mini")
+    assert calls["count"] == 6
+    assert [r.content for r in resps] == ["Hello World"] * 6
+    assert resps[0].usage.total_tokens == 7
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    from llm_response import LLMResponse
+    path = tmp_path / "j.jsonl"
+    with Journal(str(path)) as j:
+        j.record("a", LLMResponse(provider="p", model="m", content="ok", raw={}))
+    with open(path, "ab") as fh:
+        fh.write(b'{"key": "b", "resp')
+    with Journal(str(path)) as j:
+        assert "a" in j and "b" not in j
+        j.record("c", LLMResponse(provider="p", model="m", content="later", raw={}))
+    with Journal(str(path)) as j:
+        assert j.get("c").content == "later"
+        assert j.get("a").content == "ok"
+
+
+@pytest.mark.asyncio
+async def test_uncoalesced_samples_bypass_the_journal(tmp_path):
+    import asyncio
+    from llm_response import LLMResponse
+
+    class _Sampler:
+        name = "sampler"
+        calls = 0
+
+        async def acomplete(self, req, *, timeout=60.0):
+            self.calls += 1
+            n = self.calls
+            await asyncio.sleep(0.01 * (5 - n))
+            return LLMResponse(provider=self.name, model=req.model, content=f"sample{n}", raw={})
+
+    prov = _Sampler()
+    with Journal(str(tmp_path / "j.jsonl")) as journal:
+        client = BatchClient(prov, journal=journal)
+        resps = await client.abatch([[Msg.user("same")]] * 4, model="m", coalesce=False)
+        assert prov.calls == 4 and len(journal) == 0
+        assert sorted(r.content for r in resps) == ["sample1", "sample2", "sample3", "sample4"]
+        journal.record("k", resps[0])
+        assert journal.get("k") is not journal.get("k")  # callers never share a response
@@ -0,0 +1,36 @@
+import pickle
+import sys
+import pytest
+from msg import Msg
+from batchclient import BatchClient
+from llm_response import LLMResponse
+from openai_provider import OpenAIProvider
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("retain, raw", [
+    ("full", None),
+    ("fields", {"id": "resp_123", "usage": {"input_tokens": 5, "output_tokens": 2, "total_tokens": 7}}),
+    ("none", {}),
+])
+async def test_retention_policy(patch_openai_post, mock_openai_success_payload, retain, raw):
+    prov = OpenAIProvider(api_key="k", retain=retain)
+    patch_openai_post(prov)
+    resp = await BatchClient(prov).acomplete([Msg.user("hi")], model="m")
+    assert resp.content == "Hello World" and resp.usage.total_tokens == 7
+    assert resp.raw == (mock_openai_success_payload if raw is None else raw)
+
+
+def test_retain_survives_pickle_and_rejects_typos():
+    prov = pickle.loads(pickle.dumps(OpenAIProvider(api_key="k", retain="none")))
+    assert prov.retain == "none"
+    with pytest.raises(ValueError):
+        OpenAIProvider(api_key="k", retain="some")
+
+
+@pytest.mark.skipif(sys.version_info < (3, 10), reason="slots=True needs 3.10")
+def test_core_dataclasses_are_slotted():
+    for obj in (Msg.user("x"), LLMResponse(provider="p", model="m", content="c", raw={})):
+        assert not hasattr(obj, "__dict__")
+    r = LLMResponse(provider="p", model="m", content="c", raw={})
+    assert pickle.loads(pickle.dumps(r)) == r
@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from msg import Msg
+from llm_response import LLMResponse
+from batchclient import BatchClient
+from errors import ServerError
+from observers import MetricsObserver, SpanObserver
+from retry import RetryPolicy
+from usage import Usage
+
+
+class _Flaky:
+    """Fails the first call with a 500, then answers after a short delay."""
+    name = "flaky"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def acomplete(self, req, *, timeout=60.0):
+        self.calls += 1
+        await asyncio.sleep(0.02)
+        if self.calls == 1:
+            exc = ServerError("500", status_code=500)
+            return LLMResponse(provider=self.name, model=req.model, content="", raw={}, error="500", status_code=500, exception=exc)
+        return LLMResponse(provider=self.name, model=req.model, content="ok", raw={}, usage=Usage(3, 2, 5))
+
+
+class _Span:
+    def __init__(self, name, attributes):
+        self.name, self.attributes, self.events, self.ended = name, dict(attributes or {}), [], False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def add_event(self, name, attributes=None):
+        self.events.append((name, attributes))
+
+    def end(self):
+        self.ended = True
+
+
+class _Tracer:
+    def __init__(self):
+        self.spans = []
+
+    def start_span(self, name, attributes=None):
+        self.spans.append(_Span(name, attributes))
+        return self.spans[-1]
+
+
+@pytest.mark.asyncio
+async def test_timing_breakdown_and_metrics():
+    metrics, tracer = MetricsObserver(), _Tracer()
+    client = BatchClient(
+        _Flaky(),
+        qps=1000,
+        retry=RetryPolicy(2, base=0.05, cap=0.05),
+        validate=lambda r: None,
+        observers=[metrics, SpanObserver(tracer)],
+    )
+    resp = await client.acomplete([Msg.user("hi")], model="m")
+    assert resp.content == "ok"
+    t = resp.timing
+    assert t.attempts == 2
+    assert t.backoff > 0
+    assert t.network >= 0.04
+    assert t.total >= t.network + t.backoff
+
+    assert metrics.counter("batchcal_attempts_total") == 2
+    assert metrics.counter("batchcal_errors_total", type="ServerError") == 1
+    assert metrics.counter("batchcal_requests_total", outcome="ok") == 1
+    assert metrics.counter("batchcal_tokens_total", kind="output") == 2
+    assert metrics.in_flight == 0
+    text = metrics.render_prometheus()
+    assert 'batchcal_request_seconds_bucket{provider="flaky",model="m",le="+Inf"} 1' in text
+    assert 'batchcal_requests_total{provider="flaky",model="m",outcome="ok"} 1' in text
+
+    (span,) = tracer.spans
+    assert span.ended and len(span.events) == 2
+    assert span.attributes["batchcal.attempts"] == 2
+
+
+@pytest.mark.asyncio
+async def test_openai_reports_parse_time(patch_openai_post):
+    from openai_provider import OpenAIProvider
+    prov = OpenAIProvider(api_key="test")
+    patch_openai_post(prov)
+    client = BatchClient(prov)
+    resp = await client.acomplete([Msg.user("hi")], model="m")
+    assert resp.timing is not None and resp.timing.attempts == 1
+    assert resp.timing.parse >= 0
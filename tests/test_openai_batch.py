@@ -0,0 +1,92 @@
+import json
+import httpx
+import pytest
+from openai_provider import OpenAIProvider
+from msg import Msg
+from batchclient import BatchClient
+
+
+def _batch_server(pending_polls=1):
+    """Minimal stand-in for the /files + /batches endpoints."""
+    state = {"files": {}, "batches": {}, "polls": {}}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if request.method == "POST" and path.endswith("/files"):
+            body = request.content
+            start = body.index(b"\r\n\r\n", body.index(b'name="file"')) + 4
+            data = body[start:body.index(b"\r\n--", start)]
+            fid = f"file-{len(state['files'])}"
+            state["files"][fid] = data
+            return httpx.Response(200, json={"id": fid})
+        if request.method == "POST" and path.endswith("/batches"):
+            bid = f"batch-{len(state['batches'])}"
+            state["batches"][bid] = json.loads(request.content)["input_file_id"]
+            return httpx.Response(200, json={"id": bid, "status": "validating"})
+        if request.method == "GET" and "/batches/" in path:
+            bid = path.rsplit("/", 1)[1]
+            state["polls"][bid] = state["polls"].get(bid, 0) + 1
+            if state["polls"][bid] <= pending_polls:
+                return httpx.Response(200, json={"id": bid, "status": "in_progress"})
+            return httpx.Response(200, json={"id": bid, "status": "completed", "output_file_id": "out-" + state["batches"][bid]})
+        if request.method == "GET" and path.endswith("/content"):
+            fid = path.split("/")[-2][len("out-"):]
+            lines = []
+            for raw in state["files"][fid].splitlines():
+                item = json.loads(raw)
+                text = item["body"]["input"][0]["content"]
+                if text == "Item 3":
+                    lines.append({"custom_id": item["custom_id"], "response": {"status_code": 400, "body": {"error": {"message": "bad"}}}})
+                    continue
+                body = {
+                    "model": item["body"]["model"],
+                    "output": [{"type": "message", "content": [{"type": "output_text", "text": text.upper()}]}],
+                    "usage": {"input_tokens": 1, "output_tokens": 1, "total_tokens": 2},
+                }
+                lines.append({"custom_id": item["custom_id"], "response": {"status_code": 200, "body": body}})
+            return httpx.Response(200, content="\n".join(json.dumps(l) for l in lines).encode())
+        return httpx.Response(404)
+
+    return state, httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_offline_batch_roundtrip_and_split():
+    state, transport = _batch_server()
+    prov = OpenAIProvider(transport=transport)
+    client = BatchClient(prov)
+    prompts = [[Msg.user(f"Item {i}")] for i in range(5)]
+    job = await prov.submit_batch(client._requests(prompts, "gpt-4.1-mini", 0.0, None, None), max_requests_per_file=2)
+    assert len(job.batch_ids) == 3 and job.offsets == [0, 2, 4]
+    resps = await prov.collect_batch(job, poll_interval=0.001)
+    assert [r.content for r in resps] == ["ITEM 0", "ITEM 1", "ITEM 2", "", "ITEM 4"]
+    assert resps[3].error == "bad"
+    assert resps[0].model == "gpt-4.1-mini" and resps[0].usage.total_tokens == 2
+
+
+@pytest.mark.asyncio
+async def test_abatch_offline_mode():
+    _, transport = _batch_server(pending_polls=0)
+    client = BatchClient(OpenAIProvider(transport=transport))
+    resps = await client.abatch([[Msg.user("a")], [Msg.user("b")]], model="gpt-4.1-mini", offline=True)
+    assert [r.content for r in resps] == ["A", "B"]
+
+
+@pytest.mark.asyncio
+async def test_failed_split_submit_cancels_created_batches():
+    state, inner = _batch_server()
+    seen = []
+
+    def handler(request):
+        seen.append((request.method, request.url.path))
+        if request.url.path.endswith("/files") and len(state["files"]) == 1:
+            return httpx.Response(500)  # the second file's upload fails
+        if request.url.path.endswith("/cancel"):
+            return httpx.Response(200, json={"status": "cancelling"})
+        return inner.handle_request(request)
+
+    prov = OpenAIProvider(transport=httpx.MockTransport(handler))
+    reqs = BatchClient(prov)._requests([[Msg.user(f"Item {i}")] for i in range(4)], "gpt-4.1-mini", 0.0, None, None)
+    with pytest.raises(httpx.HTTPStatusError):
+        await prov.submit_batch(reqs, max_requests_per_file=2)
+    assert ("POST", "/v1/batches/batch-0/cancel") in seen
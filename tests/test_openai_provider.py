@@ -2,6 +2,7 @@ import pytest
 from openai_provider import OpenAIProvider
 from msg import Msg
 from batchclient import BatchClient
+from llm_request import LLMRequest
 
 @pytest.mark.asyncio
 async def test_single_completion(patch_openai_post):
@@ -23,3 +24,27 @@ async def test_batch_completion_counts(patch_openai_post):
     assert len(resps) == 5
     assert all(r.content == "Hello World" for r in resps)
     assert calls["count"] == 5
+
+
+@pytest.mark.asyncio
+async def test_bad_replies_are_not_retried_but_dropped_connections_are():
+    import httpx
+    from errors import ResponseFormatError, ServerError
+    from retry import RetryPolicy
+
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("connection reset")
+        return httpx.Response(200, content=b"<html>not json</html>")
+
+    prov = OpenAIProvider(api_key="k", base_url="http://mock/v1", transport=httpx.MockTransport(handler))
+    client = BatchClient(prov, retry=RetryPolicy(3, base=0.001, cap=0.001))
+    resp = await client.acomplete([Msg.user("hi")], model="m")
+    # the reset is retried as a ServerError; the undecodable reply ends it
+    assert isinstance(resp.exception, ResponseFormatError) and len(calls) == 2
+    calls.clear()
+    reset = await prov.acomplete(LLMRequest(messages=[Msg.user("hi")], model="m"))
+    assert isinstance(reset.exception, ServerError)
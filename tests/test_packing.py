@@ -0,0 +1,122 @@
+import asyncio
+import json
+import pytest
+from msg import Msg
+from llm_response import LLMResponse
+from batchclient import BatchClient
+from packing import Packer
+from usage import Usage
+from errors import ClientError
+
+
+class _Packed:
+    """Answers packed calls with upper-cased inputs; item "bad" gets no answer."""
+    name = "packed"
+
+    def __init__(self):
+        self.calls = []
+
+    async def acomplete(self, req, *, timeout=60.0):
+        self.calls.append(req)
+        await asyncio.sleep(0.01)
+        user = req.messages[-1].content
+        if "JSON object that maps every item id" not in req.messages[0].content:
+            return LLMResponse(provider=self.name, model=req.model, content=user.upper(), raw={}, usage=Usage(5, 1, 6))
+        answers = {it["id"]: it["input"].upper() for it in json.loads(user) if it["input"] != "bad"}
+        return LLMResponse(provider=self.name, model=req.model, content="```json\n" + json.dumps(answers) + "\n```", raw={}, usage=Usage(100, 40, 140))
+
+
+@pytest.mark.asyncio
+async def test_packs_splits_and_redispatches():
+    prov, packer = _Packed(), Packer(max_items=5, linger=0.05)
+    client = BatchClient(prov, max_concurrency=2, pack=packer)
+    texts = [f"item {i}" for i in range(9)] + ["bad"]
+    prompts = [[Msg.system("Classify."), Msg.user(t)] for t in texts]
+    resps = await client.abatch(prompts, model="m", coalesce=False)
+    assert [r.content for r in resps] == [t.upper() for t in texts]
+    assert packer.calls == 2 and packer.items == 9 and packer.redispatched == 1
+    assert len(prov.calls) == 3  # two packs of 5, then "bad" on its own
+    packed = [r for r in resps if r.raw.get("packed")]
+    assert sum(r.usage.input_tokens for r in resps[:5]) == 100  # a full pack's shares add up
+    assert all(r.usage.total_tokens == r.usage.input_tokens + r.usage.output_tokens for r in packed)
+
+
+@pytest.mark.asyncio
+async def test_incompatible_requests_are_not_packed():
+    prov, packer = _Packed(), Packer(max_items=8, linger=0.01)
+    client = BatchClient(prov, pack=packer)
+    multi_turn = [Msg.user("a"), Msg.assistant("b"), Msg.user("c")]
+    r1, r2, r3 = await asyncio.gather(
+        client.acomplete(multi_turn, model="m"),
+        client.acomplete([Msg.user("x")], model="m", temperature=0.0),
+        client.acomplete([Msg.user("y")], model="m", temperature=1.0),
+    )
+    assert (r1.content, r2.content, r3.content) == ("C", "X", "Y")
+    assert packer.calls == 0 and len(prov.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_cancelled_pack_stops_calling_the_provider():
+    prov, packer = _Packed(), Packer(max_items=4, linger=0.01)
+    client = BatchClient(prov, pack=packer)
+    prompts = [[Msg.system("Classify."), Msg.user("bad")] for _ in range(4)]  # no usable answers: would be re-sent
+    batch = asyncio.ensure_future(client.abatch(prompts, model="m", coalesce=False))
+    while not prov.calls:
+        await asyncio.sleep(0.001)
+    batch.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await batch
+    await asyncio.sleep(0.05)
+    assert len(prov.calls) == 1 and not client._pack_tasks
+
+
+@pytest.mark.asyncio
+async def test_aclose_cancels_pending_packs():
+    prov, packer = _Packed(), Packer(max_items=4, linger=0.01)
+    client = BatchClient(prov, pack=packer)
+    item = asyncio.ensure_future(client.acomplete([Msg.user("x")], model="m"))
+    while not client._packs:
+        await asyncio.sleep(0)
+    await client.aclose()
+    with pytest.raises(asyncio.CancelledError):
+        await item
+    await asyncio.sleep(0.03)
+    assert not prov.calls
+
+
+class _RejectsPacks(_Packed):
+    """Packed calls are too long (400); single items are fine."""
+    async def acomplete(self, req, *, timeout=60.0):
+        if "JSON object that maps every item id" in req.messages[0].content:
+            self.calls.append(req)
+            e = ClientError("context length exceeded", status_code=400)
+            return LLMResponse(provider=self.name, model=req.model, content="", raw={}, error=str(e), exception=e)
+        return await super().acomplete(req, timeout=timeout)
+
+
+@pytest.mark.asyncio
+async def test_rejected_pack_falls_back_to_single_items():
+    prov, packer = _RejectsPacks(), Packer(max_items=3, linger=0.01)
+    resps = await BatchClient(prov, pack=packer).abatch([[Msg.user(f"i{k}")] for k in range(3)], model="m")
+    assert [r.content for r in resps] == ["I0", "I1", "I2"]
+    assert len(prov.calls) == 4 and packer.redispatched == 3
+
+
+@pytest.mark.asyncio
+async def test_stream_window_grows_only_for_packable_requests():
+    client = BatchClient(_Packed(), max_concurrency=2, pack=Packer(max_items=8, linger=0.01))
+    pulled = []
+
+    def prompts(msgs):
+        for k in range(20):
+            pulled.append(k)
+            yield msgs
+
+    async def pulled_before_first_result(msgs):
+        pulled.clear()
+        async for _ in client.astream(prompts(msgs), model="m", window=2, coalesce=False):
+            return len(pulled)
+
+    multi_turn = [Msg.user("a"), Msg.assistant("b"), Msg.user("c")]  # never packed
+    assert await pulled_before_first_result(multi_turn) <= 4  # max_concurrency + window
+    assert await pulled_before_first_result([Msg.user("x")]) == 20  # 8 per slot
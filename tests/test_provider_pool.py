@@ -0,0 +1,86 @@
+import asyncio
+import random
+import time
+import pytest
+from msg import Msg
+from llm_request import LLMRequest
+from llm_response import LLMResponse
+from errors import ClientError, RateLimitError, RequestTimeoutError
+from batchclient import BatchClient
+from provider_pool import PoolMember, ProviderPool
+from retry import RetryPolicy
+
+
+class _Fake:
+    def __init__(self, name, exception=None):
+        self.name = name
+        self.exception = exception
+        self.calls = 0
+
+    async def acomplete(self, req, *, timeout=60.0):
+        self.calls += 1
+        if self.exception is not None:
+            return LLMResponse(provider=self.name, model=req.model, content="", raw={}, error=str(self.exception), exception=self.exception)
+        return LLMResponse(provider=self.name, model=req.model, content=self.name, raw={})
+
+
+@pytest.mark.asyncio
+async def test_weighted_routing():
+    random.seed(7)
+    a, b = _Fake("a"), _Fake("b")
+    pool = ProviderPool([PoolMember(a, weight=3), PoolMember(b, weight=1)])
+    client = BatchClient(pool, max_concurrency=1)
+    await client.abatch([[Msg.user("x")]] * 400, model="m", coalesce=False)
+    assert 0.6 < a.calls / 400 < 0.9
+
+
+@pytest.mark.asyncio
+async def test_failover_and_cooldown():
+    limited = _Fake("limited", RateLimitError("429", status_code=429, retry_after=30))
+    ok = _Fake("ok")
+    pool = ProviderPool([PoolMember(limited, weight=100), ok])
+    client = BatchClient(pool, max_concurrency=pool.max_concurrency)
+    resps = await client.abatch([[Msg.user(str(i))] for i in range(20)], model="m")
+    assert all(r.content == "ok" for r in resps)
+    assert limited.calls == 1  # cooling down after its first 429
+
+
+@pytest.mark.asyncio
+async def test_client_errors_do_not_fail_over():
+    bad, ok = _Fake("bad", ClientError("400", status_code=400)), _Fake("ok")
+    pool = ProviderPool([PoolMember(bad, weight=1e9), ok])
+    resp = await pool.acomplete(LLMRequest(messages=[Msg.user("x")], model="m"))
+    assert isinstance(resp.exception, ClientError) and ok.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_all_members_limited_respects_cooldown():
+    a = _Fake("a", RateLimitError("429", status_code=429))
+    b = _Fake("b", RateLimitError("429", status_code=429))
+    pool = ProviderPool([PoolMember(a, cooldown=5.0), PoolMember(b, cooldown=5.0)])
+    retry = RetryPolicy(3, base=0.01, max_retry_after=0.01)  # retries land inside the cooldown
+    client = BatchClient(pool, max_concurrency=pool.max_concurrency, timeout=0.5, retry=retry)
+    resps = await client.abatch([[Msg.user(str(i))] for i in range(10)], model="m", coalesce=False)
+    assert all(isinstance(r.exception, RateLimitError) for r in resps)
+    # one 429 each starts the cooldown; nothing else reaches the members while it lasts
+    assert a.calls == b.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_failover_shares_one_timeout():
+    class _Timing:
+        name = "slow"
+
+        async def acomplete(self, req, *, timeout=60.0):
+            timeouts.append(timeout)
+            await asyncio.sleep(0.06)
+            e = RequestTimeoutError("timed out")
+            return LLMResponse(provider=self.name, model=req.model, content="", raw={}, error=str(e), exception=e)
+
+    timeouts = []
+    members = [_Timing() for _ in range(4)]
+    pool = ProviderPool(members)
+    start = time.monotonic()
+    resp = await pool.acomplete(LLMRequest(messages=[Msg.user("x")], model="m"), timeout=0.1)
+    assert time.monotonic() - start < 0.2 and isinstance(resp.exception, RequestTimeoutError)
+    assert len(timeouts) == 2 and timeouts[1] < 0.05  # the second member only got what was left
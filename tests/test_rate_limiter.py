@@ -13,3 +13,46 @@ async def test_token_bucket_limiter_basic():
     await limiter.acquire()
     elapsed = time.monotonic() - start
     assert elapsed >= 0.15
+
+@pytest.mark.asyncio
+async def test_token_bucket_fifo_and_wakeups():
+    import asyncio
+    limiter = TokenBucketLimiter(qps=500.0)
+    order = []
+    async def one(i):
+        await limiter.acquire()
+        order.append(i)
+    await asyncio.gather(*(one(i) for i in range(100)))
+    assert order == list(range(100))
+    # one timer per grant at most, not one per waiter per retry
+    assert limiter.wakeups <= 100
+
+@pytest.mark.asyncio
+async def test_token_bucket_cancelled_waiter_does_not_leak():
+    import asyncio
+    limiter = TokenBucketLimiter(qps=10.0, burst=1)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    start = time.monotonic()
+    await limiter.acquire(1)  # the cancelled waiter's token is still available
+    assert time.monotonic() - start < 0.12
+    assert not limiter._waiters
+
+@pytest.mark.asyncio
+async def test_token_bucket_waiter_cancelled_right_before_grant():
+    import asyncio
+    limiter = TokenBucketLimiter(qps=10.0, burst=1)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    loop = asyncio.get_running_loop()
+    # the timer's _grant drops the cancelled entry before the waiter task resumes
+    loop.call_at(limiter._timer.when() - 1e-9, waiter.cancel)
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert not limiter._waiters
+    await asyncio.wait_for(limiter.acquire(), 0.5)
@@ -0,0 +1,59 @@
+import time
+import httpx
+import pytest
+from openai_provider import OpenAIProvider
+from msg import Msg
+from batchclient import BatchClient
+from errors import CircuitOpenError, ClientError, ServerError
+from retry import CircuitBreaker, RetryBudget, RetryPolicy
+
+OK = {"output": [{"type": "message", "content": [{"type": "output_text", "text": "ok"}]}], "usage": {}}
+
+
+def _provider(*responses):
+    """OpenAIProvider over a scripted transport; the last response repeats."""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return responses[min(len(calls), len(responses)) - 1]
+
+    return OpenAIProvider(transport=httpx.MockTransport(handler)), calls
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    prov, calls = _provider(httpx.Response(400, json={"error": {"message": "bad"}}))
+    resp = await BatchClient(prov).acomplete([Msg.user("x")], model="m")
+    assert isinstance(resp.exception, ClientError) and resp.status_code == 400
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_honored():
+    prov, calls = _provider(httpx.Response(429, headers={"retry-after-ms": "50"}), httpx.Response(200, json=OK))
+    start = time.monotonic()
+    resp = await BatchClient(prov).acomplete([Msg.user("x")], model="m")
+    elapsed = time.monotonic() - start
+    assert resp.content == "ok" and len(calls) == 2
+    assert 0.05 <= elapsed < 0.4  # not the 0.5s+ exponential backoff
+
+
+@pytest.mark.asyncio
+async def test_retry_budget_caps_total_retries():
+    prov, calls = _provider(httpx.Response(503))
+    client = BatchClient(prov, retry=RetryPolicy(3, base=0.001, cap=0.001), retry_budget=RetryBudget(0.0, min_retries=2))
+    resps = await client.abatch([[Msg.user(str(i))] for i in range(5)], model="m")
+    assert all(isinstance(r.exception, ServerError) for r in resps)
+    assert len(calls) == 5 + 2
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast():
+    prov, calls = _provider(httpx.Response(500))
+    breaker = CircuitBreaker(failure_threshold=2, recovery_time=60, fail_fast=True)
+    client = BatchClient(prov, max_concurrency=1, retry=RetryPolicy(0), breaker=breaker)
+    resps = await client.abatch([[Msg.user(str(i))] for i in range(5)], model="m")
+    assert len(calls) == 2 and breaker.state == "open"
+    assert all(isinstance(r.exception, CircuitOpenError) for r in resps[2:])
+    assert isinstance(resps[0].exception, ServerError)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+import pytest
+from msg import Msg
+from llm_request import LLMRequest
+from llm_response import LLMResponse
+from batchclient import BatchClient
+from concurrency import AdaptiveConcurrency
+from errors import DeadlineExceededError
+from scheduler import PriorityScheduler
+
+
+class _Counting:
+    def __init__(self):
+        self.acquired = 0
+
+    async def acquire(self, n=1.0):
+        self.acquired += 1
+
+    def release(self, n=1.0):
+        pass
+
+
+async def _drain(client, prompts, **kw):
+    return [r async for _, r in client.astream(prompts, model="m", **kw)]
+
+
+class _Recorder:
+    name = "rec"
+
+    def __init__(self, latency=0.01):
+        self.latency = latency
+        self.order = []
+
+    async def acomplete(self, req, *, timeout=60.0):
+        self.order.append(req.messages[-1].content)
+        await asyncio.sleep(self.latency)
+        return LLMResponse(provider=self.name, model=req.model, content="ok", raw={})
+
+
+@pytest.mark.asyncio
+async def test_interactive_call_jumps_a_running_batch():
+    prov = _Recorder()
+    client = BatchClient(prov, max_concurrency=2, coalesce=False)
+    batch = asyncio.ensure_future(_drain(client, [[Msg.user(f"b{i}")] for i in range(40)], window=20))
+    await asyncio.sleep(0.025)
+    started = len(prov.order)
+    resp = await client.acomplete([Msg.user("urgent")], model="m", priority=10)
+    assert not resp.error
+    assert prov.order.index("urgent") <= started + 2  # next free slot, not after the queued backlog
+    await batch
+
+
+@pytest.mark.asyncio
+async def test_concurrent_batches_share_slots_by_weight():
+    prov = _Recorder(latency=0.005)
+    client = BatchClient(prov, max_concurrency=1, coalesce=False)
+    a = _drain(client, [[Msg.user("a")]] * 30, window=30, weight=2.0)
+    b = _drain(client, [[Msg.user("b")]] * 30, window=30)
+    await asyncio.gather(a, b)
+    head = prov.order[:30]
+    assert 17 <= head.count("a") <= 23  # ~2:1 while both are backlogged
+
+
+@pytest.mark.asyncio
+async def test_expired_requests_never_take_a_limiter_token():
+    prov = _Recorder(latency=0.05)
+    limiter = _Counting()
+    client = BatchClient(prov, max_concurrency=1, limiter=limiter, coalesce=False)
+    deadline = time.time() + 0.02
+    resps = await client.abatch([[Msg.user(str(i))] for i in range(5)], model="m", deadline=deadline)
+    assert not resps[0].error
+    assert all(isinstance(r.exception, DeadlineExceededError) for r in resps[1:])
+    assert prov.order == ["0"] and client.sema.expired == 4
+    assert limiter.acquired == 1
+
+    late = await client.acomplete([Msg.user("x")], model="m", deadline=time.time() - 1)
+    assert isinstance(late.exception, DeadlineExceededError)
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limit_drives_the_scheduler():
+    adaptive = AdaptiveConcurrency(3)
+    sched = PriorityScheduler(adaptive)
+    peak = 0
+
+    async def job(i):
+        nonlocal peak
+        async with sched.slot(LLMRequest(messages=[Msg.user(str(i))], model="m")):
+            peak = max(peak, adaptive.in_flight)
+            await asyncio.sleep(0.005)
+
+    await asyncio.gather(*(job(i) for i in range(12)))
+    assert peak == 3 and sched.in_flight == 0 and adaptive.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_coalescing_respects_deadline_and_priority():
+    prov = _Recorder(latency=0.02)
+    client = BatchClient(prov, max_concurrency=1)
+    blocker = asyncio.ensure_future(client.acomplete([Msg.user("blocker")], model="m"))
+    await asyncio.sleep(0)
+    # a queued twin whose deadline passes while waiting must not drag a deadline-free caller down
+    doomed = asyncio.ensure_future(client.acomplete([Msg.user("a")], model="m", deadline=time.time() + 0.005))
+    fillers = [asyncio.ensure_future(client.acomplete([Msg.user(f"f{i}")], model="m")) for i in range(3)]
+    low = asyncio.ensure_future(client.acomplete([Msg.user("b")], model="m"))
+    await asyncio.sleep(0)
+    free = asyncio.ensure_future(client.acomplete([Msg.user("a")], model="m"))
+    urgent = asyncio.ensure_future(client.acomplete([Msg.user("b")], model="m", priority=10))
+    await asyncio.gather(blocker, doomed, free, urgent, low, *fillers)
+    assert isinstance(doomed.result().exception, DeadlineExceededError)
+    assert not free.result().error and not urgent.result().error
+    assert prov.order[1] == "b"  # the urgent twin went next, not behind the fillers
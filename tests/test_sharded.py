@@ -0,0 +1,63 @@
+import functools
+import os
+import pickle
+import sys
+import time
+import pytest
+from msg import Msg
+from llm_response import LLMResponse
+from openai_provider import OpenAIProvider
+from batchclient import run_batch
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="uses the POSIX shared limiter")
+
+
+class PidEcho:
+    name = "echo"
+
+    async def acomplete(self, req, *, timeout=60.0):
+        return LLMResponse(provider=self.name, model=req.model, content=req.messages[0].content, raw={"pid": os.getpid()})
+
+
+def test_openai_provider_pickles():
+    prov = pickle.loads(pickle.dumps(OpenAIProvider(base_url="http://localhost:1/v1/")))
+    assert prov.base_url == "http://localhost:1/v1" and prov.api_key == "test-key"
+
+
+def test_sharded_run_keeps_order_and_global_qps():
+    prompts = [[Msg.user(str(i))] for i in range(40)]
+    start = time.monotonic()
+    resps = run_batch(PidEcho(), prompts, model="m", processes=2, qps=100.0)
+    elapsed = time.monotonic() - start
+    assert [r.content for r in resps] == [str(i) for i in range(40)]
+    assert len({r.raw["pid"] for r in resps}) == 2
+    assert elapsed >= 39 / 100.0 - 0.02  # one budget for both workers
+
+
+class Tracked(PidEcho):
+    """Leaves a marker file each time it is built or closed."""
+    def __init__(self, path):
+        self.path = path
+        open(os.path.join(self.path, f"built-{os.getpid()}-{time.monotonic_ns()}"), "w").close()
+
+    async def aclose(self):
+        open(os.path.join(self.path, f"closed-{os.getpid()}-{time.monotonic_ns()}"), "w").close()
+
+
+def test_workers_build_the_provider_once_and_close_it(tmp_path):
+    prompts = [[Msg.user(str(i))] for i in range(40)]
+    resps = run_batch(functools.partial(Tracked, str(tmp_path)), prompts, model="m", processes=2)
+    assert [r.content for r in resps] == [str(i) for i in range(40)]
+    markers = os.listdir(tmp_path)
+    built = [m for m in markers if m.startswith("built")]
+    closed = [m for m in markers if m.startswith("closed")]
+    assert len(built) == len(closed) == len({r.raw["pid"] for r in resps}) == 2
+
+
+def test_concurrency_is_split_without_losing_slots():
+    from sharded import _concurrency_shares
+    assert _concurrency_shares(8, 3) == [3, 3, 2]
+    assert _concurrency_shares(4, 4) == [1, 1, 1, 1]
+    # fewer slots than processes: only as many workers as slots
+    resps = run_batch(PidEcho(), [[Msg.user(str(i))] for i in range(20)], model="m", processes=3, max_concurrency=1)
+    assert len({r.raw["pid"] for r in resps}) == 1
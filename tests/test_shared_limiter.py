@@ -0,0 +1,45 @@
+import asyncio
+import multiprocessing
+import pickle
+import sys
+import time
+import pytest
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="POSIX only")
+
+
+def _worker(limiter, n):
+    async def run():
+        for _ in range(n):
+            await limiter.acquire()
+    asyncio.run(run())
+
+
+@pytest.mark.asyncio
+async def test_instances_share_one_bucket(tmp_path):
+    from shared_limiter import SharedTokenBucketLimiter
+    path = str(tmp_path / "bucket")
+    a = SharedTokenBucketLimiter(path, qps=10.0, burst=2)
+    b = pickle.loads(pickle.dumps(a))
+    start = time.monotonic()
+    await a.acquire()
+    await a.acquire()
+    await b.acquire()  # bucket drained by a
+    assert time.monotonic() - start >= 0.08
+    a.close()
+    b.close()
+
+
+def test_processes_share_qps(tmp_path):
+    from shared_limiter import SharedTokenBucketLimiter
+    limiter = SharedTokenBucketLimiter(str(tmp_path / "bucket"), qps=40.0)
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_worker, args=(limiter, 5)) for _ in range(3)]
+    start = time.monotonic()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    # 15 grants at 40/s from one shared bucket (first one free)
+    assert time.monotonic() - start >= 14 / 40.0 - 0.02
+    assert all(p.exitcode == 0 for p in procs)
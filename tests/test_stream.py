@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from msg import Msg
+from llm_response import LLMResponse
+from batchclient import BatchClient
+
+
+class _SlowEcho:
+    name = "echo"
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+
+    async def acomplete(self, req, *, timeout=60.0):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        n = int(req.messages[0].content)
+        await asyncio.sleep(0.001 * (n % 5))
+        self.in_flight -= 1
+        return LLMResponse(provider=self.name, model=req.model, content=str(n), raw={})
+
+
+def _prompts(n, pulled):
+    for i in range(n):
+        pulled.append(i)
+        yield [Msg.user(str(i))]
+
+
+@pytest.mark.asyncio
+async def test_astream_is_lazy_and_bounded():
+    prov = _SlowEcho()
+    client = BatchClient(prov, max_concurrency=4)
+    pulled, seen = [], []
+    async for i, resp in client.astream(_prompts(200, pulled), model="m", window=2):
+        assert resp.content == str(i)
+        # never more than max_concurrency + window prompts ahead of what we've consumed
+        assert len(pulled) - len(seen) <= 6
+        seen.append(i)
+    assert sorted(seen) == list(range(200))
+    assert prov.peak <= 4
+
+
+@pytest.mark.asyncio
+async def test_astream_ordered_from_async_iterable():
+    async def agen():
+        for i in range(50):
+            yield [Msg.user(str(i))]
+
+    client = BatchClient(_SlowEcho(), max_concurrency=8)
+    got = [i async for i, _ in client.astream(agen(), model="m", ordered=True, reorder_buffer=4)]
+    assert got == list(range(50))
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import httpx
+import pytest
+from msg import Msg
+from batchclient import BatchClient
+from errors import StreamAbortedError
+from llm_request import LLMRequest
+from openai_provider import OpenAIProvider
+from streaming import require_json_prefix
+
+
+def _sse(*events):
+    return "".join(f"event: {e['type']}\ndata: {json.dumps(e)}\n\n" for e in events).encode()
+
+
+def _completed(text):
+    return {
+        "type": "response.completed",
+        "response": {
+            "id": "resp_1",
+            "output": [{"type": "message", "content": [{"type": "output_text", "text": text}]}],
+            "usage": {"input_tokens": 3, "output_tokens": 2, "total_tokens": 5},
+        },
+    }
+
+
+def _provider(handler):
+    return OpenAIProvider(api_key="k", base_url="http://mock/v1", transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_deltas_and_assembles_response():
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        body = _sse(
+            {"type": "response.output_text.delta", "delta": '{"a"'},
+            {"type": "response.output_text.delta", "delta": ": 1}"},
+            _completed('{"a": 1}'),
+        )
+        return httpx.Response(200, content=body, headers={"content-type": "text/event-stream"})
+
+    prov = _provider(handler)
+    async with prov.astream(LLMRequest(messages=[Msg.user("hi")], model="m")) as stream:
+        deltas = [d async for d in stream]
+    assert deltas == ['{"a"', ": 1}"]
+    assert stream.ttft is not None
+    assert stream.response.content == '{"a": 1}' and stream.response.usage.total_tokens == 5
+
+    resp = await BatchClient(prov, stream=True).acomplete([Msg.user("hi")], model="m")
+    assert resp.content == '{"a": 1}' and resp.timing.ttft is not None
+
+
+class _Slow(httpx.AsyncByteStream):
+    """Sends a non-JSON opening, then would keep generating for a long time."""
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        yield _sse({"type": "response.output_text.delta", "delta": "Sure! Here"})
+        await asyncio.sleep(5)
+        yield _sse(_completed("Sure! Here is the JSON"))
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_incremental_validator_aborts_mid_stream():
+    bodies = []
+
+    def handler(request):
+        bodies.append(_Slow())
+        return httpx.Response(200, stream=bodies[-1])
+
+    client = BatchClient(_provider(handler), validate_stream=require_json_prefix, max_retries=1)
+    resp = await asyncio.wait_for(client.acomplete([Msg.user("hi")], model="m"), timeout=2)
+    assert isinstance(resp.exception, StreamAbortedError)
+    assert resp.content == "Sure! Here"
+    assert len(bodies) == 2 and all(b.closed for b in bodies)  # aborted, then retried once
+
+
+@pytest.mark.asyncio
+async def test_long_answers_are_checked_every_n_characters():
+    text = '{"a": "' + "x" * 1993 + '"}'
+
+    def handler(request):
+        deltas = [{"type": "response.output_text.delta", "delta": ch} for ch in text]
+        return httpx.Response(200, content=_sse(*deltas, _completed(text)), headers={"content-type": "text/event-stream"})
+
+    seen = []
+
+    def validator(so_far):
+        seen.append(len(so_far))
+        if so_far.endswith("}"):
+            raise ValueError("caught by the final check")
+
+    client = BatchClient(_provider(handler), validate_stream=validator, validate_stream_every=100, max_retries=0)
+    resp = await client.acomplete([Msg.user("hi")], model="m")
+    assert seen[:100] == list(range(1, 101))  # every delta at first
+    assert len(seen) < 130 and seen[-1] == len(text)
+    assert isinstance(resp.exception, StreamAbortedError)
+
+
+def test_require_json_prefix_looks_at_the_first_character_only():
+    require_json_prefix("  \n{" + "not json" * 1000)
+    require_json_prefix("   ")
+    with pytest.raises(ValueError, match="does not start with JSON"):
+        require_json_prefix("\nSure! Here")
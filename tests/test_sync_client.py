@@ -0,0 +1,52 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import httpx
+from msg import Msg
+from llm_request import LLMRequest
+from llm_response import LLMResponse
+from openai_provider import OpenAIProvider
+from sync_client import SyncBatchClient
+
+
+class _Echo:
+    name = "echo"
+
+    def __init__(self):
+        self.threads = set()
+        self.loops = set()
+
+    async def acomplete(self, req, *, timeout=60.0):
+        self.threads.add(threading.current_thread().name)
+        self.loops.add(id(asyncio.get_running_loop()))
+        await asyncio.sleep(0.001)
+        return LLMResponse(provider=self.name, model=req.model, content=req.messages[-1].content, raw={})
+
+
+def test_many_threads_share_one_loop_and_client():
+    prov = _Echo()
+    with SyncBatchClient(prov, max_concurrency=4, qps=1000, coalesce=False) as client:
+        fut = client.submit([Msg.user("a")], model="m")
+        assert isinstance(fut, Future) and fut.result().content == "a"
+        with ThreadPoolExecutor(8) as pool:
+            out = list(pool.map(lambda i: client.complete([Msg.user(str(i))], model="m").content, range(40)))
+        assert out == [str(i) for i in range(40)]
+        assert [r.content for r in client.batch([[Msg.user("x")], [Msg.user("y")]], model="m")] == ["x", "y"]
+    assert prov.threads == {"batchcal-loop"} and len(prov.loops) == 1
+    assert not client._thread.is_alive()
+
+
+def test_provider_reused_across_event_loops():
+    def handler(request):
+        return httpx.Response(200, json={"output": [{"type": "message", "content": [{"type": "output_text", "text": "ok"}]}]})
+
+    prov = OpenAIProvider(api_key="k", base_url="http://mock/v1", transport=httpx.MockTransport(handler))
+    clients = []
+
+    async def call():
+        clients.append(prov._client)
+        return (await prov.acomplete(LLMRequest(messages=[Msg.user("hi")], model="m"))).content
+
+    assert asyncio.run(call()) == "ok"
+    assert asyncio.run(call()) == "ok"
+    assert clients[0] is not clients[1]
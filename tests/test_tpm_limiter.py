@@ -0,0 +1,90 @@
+import asyncio
+import time
+import pytest
+from errors import RateLimitError
+from llm_response import LLMResponse
+from retry import RetryPolicy
+from openai_provider import OpenAIProvider
+from msg import Msg
+from batchclient import BatchClient
+from llm_request import LLMRequest
+from tpm_limiter import TPMLimiter
+
+
+@pytest.mark.asyncio
+async def test_tokens_per_minute_waits():
+    limiter = TPMLimiter(rpm=600, tpm=1200)  # 20 tokens/s, one second of burst
+    start = time.monotonic()
+    await limiter.acquire(20)
+    await limiter.acquire(6)
+    assert time.monotonic() - start >= 0.25
+
+
+@pytest.mark.asyncio
+async def test_reservation_settles_against_usage(patch_openai_post):
+    prov = OpenAIProvider()
+    patch_openai_post(prov)  # usage.total_tokens == 7
+    limiter = TPMLimiter(tpm=6000)  # bucket of 100 tokens
+    req = LLMRequest(messages=[Msg.user("x" * 40)], model="gpt-4.1-mini", max_output_tokens=50)
+    assert limiter.estimate(req) == 64
+    client = BatchClient(prov, limiter=limiter)
+    await client.acomplete(req.messages, model=req.model, max_output_tokens=50)
+    # 64 reserved, 57 refunded
+    assert 92 < limiter.tokens.tokens <= 100
+
+
+class _Failing:
+    name = "failing"
+
+    def __init__(self, exception=None, delay=0.0):
+        self.exception = exception
+        self.delay = delay
+        self.calls = 0
+
+    async def acomplete(self, req, *, timeout=60.0):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return LLMResponse(provider=self.name, model=req.model, content="", raw={}, error=str(self.exception), exception=self.exception)
+
+
+@pytest.mark.asyncio
+async def test_rejected_attempts_refund_their_reservation():
+    prov = _Failing(RateLimitError("429", status_code=429))
+    limiter = TPMLimiter(tpm=60000)  # bucket of 1000 tokens
+    client = BatchClient(prov, limiter=limiter, retry=RetryPolicy(3, base=0.001, cap=0.001))
+    resp = await client.acomplete([Msg.user("x" * 40)], model="m", max_output_tokens=200)
+    assert prov.calls == 4 and isinstance(resp.exception, RateLimitError)
+    assert limiter.tokens.tokens > 990  # nothing was spent upstream
+
+
+@pytest.mark.asyncio
+async def test_cancelled_attempt_keeps_only_the_prompt():
+    limiter = TPMLimiter(tpm=60000)
+    client = BatchClient(_Failing(delay=10), limiter=limiter)
+    req = LLMRequest(messages=[Msg.user("x" * 40)], model="m", max_output_tokens=500)
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(client.acomplete(req.messages, model="m", max_output_tokens=500), 0.05)
+    # 514 reserved, the 500 output tokens come back
+    assert 980 < limiter.tokens.tokens <= 1000
+
+
+@pytest.mark.asyncio
+async def test_unused_hedge_refunds_request_and_tokens():
+    limiter = TPMLimiter(rpm=60, tpm=60000)
+    client = BatchClient(_Failing(), limiter=limiter)
+    req = LLMRequest(messages=[Msg.user("x" * 40)], model="m", max_output_tokens=500)
+    await limiter.acquire(limiter.estimate(req))
+    client._refund(limiter.estimate(req))
+    assert limiter.requests.tokens > 0.99 and limiter.tokens.tokens > 999
+
+
+@pytest.mark.asyncio
+async def test_acquire_only_limiter_is_never_asked_to_give_back():
+    class _AcquireOnly:
+        async def acquire(self, n=1.0):
+            pass
+
+    client = BatchClient(_Failing(RateLimitError("429")), limiter=_AcquireOnly(), max_retries=0)
+    client._refund(None)  # an unused hedge slot
+    resp = await client.acomplete([Msg.user("x")], model="m")
+    assert isinstance(resp.exception, RateLimitError)
@@ -11,7 +11,7 @@ async def test_validation_failure(patch_openai_post, monkeypatch):
     def validator(resp):
         import json
         json.loads(resp.content)  # will raise
-    client = BatchClient(prov, validate=validator)
+    client = BatchClient(prov, validate=validator, max_retries=0)
     resp = await client.acomplete([Msg.user("Anything")], model="gpt-4.1-mini")
     assert resp.error and "validation_error" in resp.error
     assert calls["count"] == 1
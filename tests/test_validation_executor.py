@@ -0,0 +1,74 @@
+import asyncio
+import json
+import time
+import pytest
+from msg import Msg
+from llm_response import LLMResponse
+from batchclient import BatchClient
+from errors import ValidationError
+from retry import RetryPolicy
+from validation import SchemaValidator
+
+
+class _Counter:
+    """Answers with {"n": <call number>}."""
+    name = "counter"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def acomplete(self, req, *, timeout=60.0):
+        self.calls += 1
+        await asyncio.sleep(0.001)
+        return LLMResponse(provider=self.name, model=req.model, content=json.dumps({"n": self.calls}), raw={})
+
+
+@pytest.mark.asyncio
+async def test_async_validator_failures_are_retried():
+    async def even_only(resp):
+        await asyncio.sleep(0)
+        if json.loads(resp.content)["n"] % 2:
+            raise ValueError("odd")
+
+    prov = _Counter()
+    client = BatchClient(prov, validate=even_only, retry=RetryPolicy(2, base=0.001, cap=0.001))
+    resp = await client.acomplete([Msg.user("x")], model="m")
+    assert not resp.error and json.loads(resp.content)["n"] == 2 and prov.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_thread_offload_keeps_loop_responsive():
+    def slow(resp):
+        time.sleep(0.02)  # stands in for an expensive, GIL-releasing check
+
+    lags = []
+
+    async def monitor(stop):
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - t0 - 0.005)
+
+    client = BatchClient(_Counter(), max_concurrency=16, validate=slow, validate_executor="thread", validate_max_pending=8)
+    stop = asyncio.Event()
+    mon = asyncio.ensure_future(monitor(stop))
+    resps = await client.abatch([[Msg.user(str(i))] for i in range(40)], model="m", coalesce=False)
+    stop.set()
+    await mon
+    await client.aclose()
+    assert all(not r.error for r in resps)
+    assert max(lags) < 0.015  # inline, each validation would block the loop for 20ms
+
+
+@pytest.mark.asyncio
+async def test_schema_validator_in_process_pool():
+    pytest.importorskip("jsonschema")
+    check = SchemaValidator({"type": "object", "properties": {"n": {"type": "integer", "minimum": 2}}, "required": ["n"]})
+    client = BatchClient(_Counter(), validate=check, validate_executor="process", retry=RetryPolicy(0))
+    try:
+        bad = await client.acomplete([Msg.user("a")], model="m")
+        good = await client.acomplete([Msg.user("b")], model="m")
+    finally:
+        await client.aclose()
+    assert isinstance(bad.exception, ValidationError) and "minimum" in bad.error
+    assert not good.error
@@ -0,0 +1,27 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Optional
+from compat import SLOTS
+
+@dataclass(**SLOTS)
+class RequestTiming:
+    """
+    Where one request's wall time went, in seconds (summed over attempts).
+
+    queue_wait: waiting for a concurrency slot (and an open circuit breaker).
+    limiter_wait: waiting in the rate limiter.
+    network: inside the provider call, minus parsing (includes hedges).
+    parse: decoding the provider's reply, when the provider reports it.
+    validate: running the validate hook.
+    backoff: sleeping between retries.
+    ttft: time to first token of the last attempt (streaming only).
+    """
+    queue_wait: float = 0.0
+    limiter_wait: float = 0.0
+    network: float = 0.0
+    parse: float = 0.0
+    validate: float = 0.0
+    backoff: float = 0.0
+    attempts: int = 0
+    total: float = 0.0
+    ttft: Optional[float] = None
@@ -1,34 +1,122 @@
+from __future__ import annotations
 import time
 import asyncio
-from typing import Protocol
+from collections import deque
+from typing import TYPE_CHECKING, Deque, List, Optional, Protocol, runtime_checkable
+
+if TYPE_CHECKING:
+    from llm_request import LLMRequest
+
+# timers may fire up to the loop's clock resolution early
+_EPS = 1e-6
 
 class RateLimiter(Protocol):
-    async def acquire(self) -> None: ...
+    """
+    Only acquire() is required. BatchClient calls release() (and refund(), which also
+    returns any per-request slot of an acquire that was never used) when a limiter has them.
+    """
+    async def acquire(self, n: float = 1.0) -> None: ...
+    def release(self, n: float = 1.0) -> None:
+        """Give back n unused units (negative n charges extra). Optional."""
+        ...
+
+@runtime_checkable
+class WeightedRateLimiter(RateLimiter, Protocol):
+    """Limiter whose cost depends on the request (e.g. tokens/min)."""
+    def estimate(self, req: "LLMRequest") -> float: ...
 
 class TokenBucketLimiter:
     """
-    Simple token bucket rate limiter.
+    Token bucket rate limiter with a FIFO wait queue.
 
     qps: average tokens per second added.
     burst: max tokens accumulated (defaults to 1 token if not set).
+
+    Waiters are served strictly in arrival order. A single timer fires at the exact
+    moment the head of the queue can be served, so wakeups grow with grants, not with
+    the number of waiters. acquire(n) larger than burst waits for a full bucket and
+    leaves it in debt. A cancelled acquire never consumes tokens.
     """
-    def __init__(self, qps: float, burst: int | None = None):
+    def __init__(self, qps: float, burst: float | None = None):
         self.qps = max(0.1, qps)
         self.capacity = float(burst) if burst is not None else 1.0
         self.tokens = self.capacity
         self.last = time.monotonic()
+        self.wakeups = 0  # timer callbacks fired; see benchmarks/bench_limiter.py
+        self._waiters: Deque[List] = deque()  # [n, future]
+        self._timer: Optional[asyncio.TimerHandle] = None
 
-    async def acquire(self) -> None:
-        while True:
-            now = time.monotonic()
-            elapsed = now - self.last
-            self.last = now
-            self.tokens = min(self.capacity, self.tokens + elapsed * self.qps)
-            if self.tokens >= 1.0:
-                self.tokens -= 1.0
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.last
+        self.last = now
+        self.tokens += elapsed * self.qps
+        # while someone is queued the bucket is draining, so a late timer must not forfeit tokens
+        if not self._waiters:
+            self.tokens = min(self.capacity, self.tokens)
+
+    async def acquire(self, n: float = 1.0) -> None:
+        n = float(n)
+        if not self._waiters:
+            self._refill()
+            if self.tokens + _EPS >= min(n, self.capacity):
+                self.tokens -= n
                 return
-            need = (1.0 - self.tokens) / self.qps
-            await asyncio.sleep(max(need, 0.001))
+        fut = asyncio.get_running_loop().create_future()
+        entry = [n, fut]
+        self._waiters.append(entry)
+        if len(self._waiters) == 1:
+            self._schedule()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release(n)  # granted and cancelled in the same tick: give it back
+            elif entry in self._waiters:  # _grant may already have dropped it
+                head = self._waiters[0] is entry
+                self._waiters.remove(entry)
+                if head:
+                    self._schedule()
+            raise
+
+    def release(self, n: float = 1.0) -> None:
+        self._refill()
+        # a refund never lifts the bucket above capacity, but keeps credit a late timer left behind
+        self.tokens = max(min(self.tokens, self.capacity), min(self.capacity, self.tokens + n)) if n > 0 else self.tokens + n
+        if self._waiters and n > 0:
+            self._grant()
+
+    def _grant(self) -> None:
+        self._refill()
+        while self._waiters:
+            n, fut = self._waiters[0]
+            if fut.done():  # cancelled, removal pending
+                self._waiters.popleft()
+                continue
+            if self.tokens + _EPS < min(n, self.capacity):
+                break
+            self._waiters.popleft()
+            self.tokens -= n
+            fut.set_result(None)
+        if not self._waiters:
+            self.tokens = min(self.capacity, self.tokens)
+        self._schedule()
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self.wakeups += 1
+        self._grant()
+
+    def _schedule(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._waiters:
+            return
+        self._refill()
+        n = self._waiters[0][0]
+        delay = max(0.0, (min(n, self.capacity) - self.tokens) / self.qps)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
 
 # Backward compatibility alias (old name)
 _TokenBucket = TokenBucketLimiter
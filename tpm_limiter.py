@@ -0,0 +1,58 @@
+from __future__ import annotations
+import math
+from typing import Optional
+from llm_request import LLMRequest
+from token_bucket import TokenBucketLimiter
+
+class TPMLimiter:
+    """
+    Requests/min and tokens/min limits enforced together.
+
+    acquire(n) takes one request slot and n tokens. BatchClient reserves estimate(req)
+    tokens before dispatch and settles against the real Usage via release(reserved - used).
+
+    rpm / tpm: limits per minute (None disables that dimension).
+    burst_seconds: how many seconds of quota may be spent at once.
+    chars_per_token: rough prompt-size heuristic used by estimate().
+    default_output_tokens: reserved output when the request sets no max_output_tokens.
+    """
+    def __init__(
+        self,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        *,
+        burst_seconds: float = 1.0,
+        chars_per_token: float = 4.0,
+        default_output_tokens: int = 256,
+    ):
+        self.requests = TokenBucketLimiter(rpm / 60.0, burst=max(1.0, rpm / 60.0 * burst_seconds)) if rpm else None
+        self.tokens = TokenBucketLimiter(tpm / 60.0, burst=max(1.0, tpm / 60.0 * burst_seconds)) if tpm else None
+        self.chars_per_token = chars_per_token
+        self.default_output_tokens = default_output_tokens
+
+    def estimate(self, req: LLMRequest) -> float:
+        chars = sum(len(m.content) for m in req.messages)
+        prompt = math.ceil(chars / self.chars_per_token) + 4 * len(req.messages)
+        output = req.max_output_tokens if req.max_output_tokens is not None else self.default_output_tokens
+        return float(prompt + output)
+
+    async def acquire(self, n: float = 1.0) -> None:
+        if self.requests is not None:
+            await self.requests.acquire()
+        if self.tokens is not None:
+            try:
+                await self.tokens.acquire(n)
+            except BaseException:
+                self.refund(0.0)  # cancelled while waiting for tokens: give the request slot back
+                raise
+
+    def release(self, n: float = 1.0) -> None:
+        """Settle the token estimate of a request that was sent (the request slot stays spent)."""
+        if self.tokens is not None and n:
+            self.tokens.release(n)
+
+    def refund(self, n: float = 1.0) -> None:
+        """Undo a whole acquire(n) whose request was never sent: its request slot and its tokens."""
+        if self.requests is not None:
+            self.requests.release(1.0)
+        self.release(n)
@@ -1,8 +1,9 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from typing import Optional
+from compat import SLOTS
 
-@dataclass
+@dataclass(**SLOTS)
 class Usage:
     input_tokens: Optional[int] = None
     output_tokens: Optional[int] = None
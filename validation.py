@@ -0,0 +1,121 @@
+"""
+Running validate hooks without blocking the event loop: async validators, thread/process
+offload with a bounded queue, and JSON Schema validators compiled once per process.
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from compat import json_loads
+from llm_response import LLMResponse
+
+Validator = Callable[[LLMResponse], Union[None, Awaitable[None]]]
+ExecutorMode = Union[None, str, Executor]
+
+
+def _is_async(fn: Any) -> bool:
+    return inspect.iscoroutinefunction(fn) or inspect.iscoroutinefunction(getattr(fn, "__call__", None))
+
+
+class ValidationRunner:
+    """
+    Calls a validate hook (raise = reject) the way BatchClient's `validate_executor` asks:
+
+    None: inline on the event loop (cheap checks).
+    "thread": in a thread pool; for validators that release the GIL or do I/O.
+    "process": in a process pool; for CPU-heavy checks (validator and responses must be
+        picklable, and changes the validator makes to the response are not sent back).
+    an Executor: your own pool (not shut down by close()).
+
+    Async validators are always awaited on the loop. At most `max_pending` validations
+    are queued on the pool at once (default 4 x workers); further responses wait.
+    """
+    def __init__(
+        self,
+        validate: Validator,
+        executor: ExecutorMode = None,
+        *,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ):
+        if executor not in (None, "thread", "process") and not isinstance(executor, Executor):
+            raise ValueError(f"validate_executor must be None, 'thread', 'process' or an Executor, not {executor!r}")
+        self.validate = validate
+        self.is_async = _is_async(validate)
+        self.mode = executor
+        self.max_workers = max_workers
+        self._executor: Optional[Executor] = executor if isinstance(executor, Executor) else None
+        self._owned = False
+        workers = max_workers or getattr(self._executor, "_max_workers", None) or 4
+        self.max_pending = max_pending or 4 * workers
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            cls = ProcessPoolExecutor if self.mode == "process" else ThreadPoolExecutor
+            self._executor = cls(max_workers=self.max_workers)
+            self._owned = True
+        return self._executor
+
+    async def __call__(self, resp: LLMResponse) -> None:
+        if self.is_async:
+            await self.validate(resp)  # type: ignore[misc]
+            return
+        if self.mode is None:
+            self.validate(resp)
+            return
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            await asyncio.get_running_loop().run_in_executor(self._pool(), self.validate, resp)
+
+    def close(self) -> None:
+        if self._owned and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            self._owned = False
+
+
+@lru_cache(maxsize=64)
+def _compiled(schema_json: str) -> Any:
+    try:
+        import jsonschema
+    except ImportError:
+        raise ImportError("SchemaValidator needs jsonschema: pip install batchcal[schema]") from None
+    schema = json.loads(schema_json)
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema)
+
+
+class SchemaValidator:
+    """
+    validate hook: resp.content must be JSON matching `schema` (JSON Schema, via jsonschema).
+    The schema is compiled once per process and cached, and instances pickle cheaply,
+    so they work with validate_executor="process".
+    """
+    def __init__(self, schema: Dict[str, Any]):
+        self.schema = schema
+        self._key = json.dumps(schema, sort_keys=True)
+
+    def __call__(self, resp: LLMResponse) -> None:
+        checker = _compiled(self._key)
+        try:
+            data = json_loads(resp.content)
+        except (ValueError, TypeError) as e:
+            raise ValueError("response is not valid JSON") from e
+        error = next(iter(checker.iter_errors(data)), None)
+        if error is not None:
+            path = "/".join(str(p) for p in error.absolute_path)
+            raise ValueError(f"schema violation at /{path}: {error.message}")
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"schema": self.schema}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["schema"])